@@ -19,12 +19,76 @@
 
 import status
 
+# status -> position on status.ORDERED, used to sort the contacts
+STATUS_RANK = dict([(stat, rank) for (rank, stat) in
+    enumerate(status.ORDERED)])
+
+def keyed_attribute(name, indexed=False):
+    '''return a property for the attribute name of a contact that stores
+    the value on _name and drops the cached keys of the contact when it's
+    set, if indexed is True the indexes that have the contact are told
+    when it changes (see Contact.changed)'''
+    attr = '_' + name
+
+    def fget(self):
+        '''return the value of the attribute'''
+        return getattr(self, attr)
+
+    def fset(self, value):
+        '''set the value of the attribute'''
+        setattr(self, attr, value)
+        self._search_key = None
+        self._sort_key = None
+
+        if indexed:
+            self.changed()
+
+    return property(fget=fget, fset=fset)
+
+class GroupList(list):
+    '''the list of groups of a contact, the indexes that have the contact
+    are told when it changes (see Contact.changed)'''
+
+    def __init__(self, groups, contact):
+        '''constructor'''
+        list.__init__(self, groups)
+        self.contact = contact
+
+    def _changed(method):
+        '''return a method that calls method and tells the contact'''
+        def changed(self, *args):
+            '''call the method of list and tell the contact'''
+            result = method(self, *args)
+            self.contact.changed()
+            return result
+
+        changed.__doc__ = method.__doc__
+        return changed
+
+    append = _changed(list.append)
+    extend = _changed(list.extend)
+    insert = _changed(list.insert)
+    remove = _changed(list.remove)
+    pop = _changed(list.pop)
+    __setitem__ = _changed(list.__setitem__)
+    __delitem__ = _changed(list.__delitem__)
+    __setslice__ = _changed(list.__setslice__)
+    __delslice__ = _changed(list.__delslice__)
+    __iadd__ = _changed(list.__iadd__)
+
+    del _changed
+
 class Contact(object):
     '''a class that represent a contact'''
 
     def __init__(self, account, identifier=None, nick='', message=None,
         _status=status.OFFLINE, alias='', blocked=False):
         '''class contructor'''
+        # the objects that index the contact by status, groups or display
+        # name, see add_index
+        self._indexes = []
+        self._search_key = None
+        self._sort_key = None
         self.account = account
         self.identifier = identifier or '0'
         self.nick = nick or self.account
@@ -41,6 +105,23 @@ class Contact(object):
         # extra atributes (use contact.attrs.get("attr", "default"))
         self.attrs = {}
 
+    def add_index(self, index):
+        '''call index.contact_changed(contact) each time the status, the
+        groups or the display name of the contact change'''
+        if index not in self._indexes:
+            self._indexes.append(index)
+
+    def remove_index(self, index):
+        '''stop telling index about the changes of the contact'''
+        if index in self._indexes:
+            self._indexes.remove(index)
+
+    def changed(self):
+        '''tell the indexes that the status, the groups or the display
+        name of the contact changed'''
+        for index in list(self._indexes):
+            index.contact_changed(self)
+
     def dict(self):
         '''return a dict representing the object'''
         return dict(account = self.account,
@@ -61,6 +142,47 @@ class Contact(object):
 
     display_name = property(fget=_get_display_name)
 
+    account = keyed_attribute('account', True)
+    nick = keyed_attribute('nick', True)
+    message = keyed_attribute('message')
+    alias = keyed_attribute('alias', True)
+    status = keyed_attribute('status', True)
+
+    def _get_groups(self):
+        '''return the list of groups'''
+        return self._groups
+
+    def _set_groups(self, groups):
+        '''set the list of groups'''
+        self._groups = GroupList(groups, self)
+        self.changed()
+
+    groups = property(fget=_get_groups, fset=_set_groups)
+
+    def _get_sort_key(self):
+        '''return a tuple with the position of the status on status.ORDERED
+        and the display name, contacts are sorted comparing it, it's cached
+        until one of them changes'''
+        if self._sort_key is None:
+            self._sort_key = (STATUS_RANK.get(self.status, len(STATUS_RANK)),
+                self.display_name)
+
+        return self._sort_key
+
+    sort_key = property(fget=_get_sort_key)
+
+    def _get_search_key(self):
+        '''return the account, alias, nick and message in lowercase
+        separated by new lines, used to search the contacts, it's cached
+        until one of them changes'''
+        if self._search_key is None:
+            self._search_key = '\n'.join((self.account, self.alias,
+                self.nick, self.message)).lower()
+
+        return self._search_key
+
+    search_key = property(fget=_get_search_key)
+
     def _get_status_string(self):
         '''return a string representation of the status'''
         return status.STATUS.get(self.status, '?')
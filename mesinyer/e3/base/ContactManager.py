@@ -16,19 +16,164 @@
 #    You should have received a copy of the GNU General Public License
 #    along with emesene; if not, write to the Free Software
 #    Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+import bisect
+
 import status
 import validator
 
 from Contact import Contact
 
+class ContactDict(dict):
+    '''the dict of account -> contact of the manager, the contacts are
+    added to and removed from the indexes of the manager when it changes'''
+
+    def __init__(self, manager):
+        '''constructor'''
+        dict.__init__(self)
+        self.manager = manager
+
+    def __setitem__(self, account, contact):
+        '''set the contact of account'''
+        if account in self:
+            self.manager._unindex(self[account])
+
+        dict.__setitem__(self, account, contact)
+        self.manager._index(contact)
+
+    def __delitem__(self, account):
+        '''remove the contact of account'''
+        contact = self[account]
+        dict.__delitem__(self, account)
+        self.manager._unindex(contact)
+
+    def clear(self):
+        '''remove all the contacts'''
+        for contact in self.values():
+            self.manager._unindex(contact)
+
+        dict.clear(self)
+
+    def pop(self, account, *default):
+        '''remove the contact of account and return it'''
+        if account in self:
+            self.manager._unindex(self[account])
+
+        return dict.pop(self, account, *default)
+
+    def popitem(self):
+        '''remove a contact and return (account, contact)'''
+        (account, contact) = dict.popitem(self)
+        self.manager._unindex(contact)
+        return (account, contact)
+
+    def setdefault(self, account, contact=None):
+        '''return the contact of account, set it to contact if missing'''
+        if account not in self:
+            self[account] = contact
+
+        return self[account]
+
+    def update(self, *args, **kwargs):
+        '''set the contacts of the accounts from a dict or a list of
+        (account, contact) and from the keyword arguments'''
+        for (account, contact) in dict(*args, **kwargs).iteritems():
+            self[account] = contact
+
+def name_key(contact):
+    '''return the display name of contact from its cached sort key'''
+    return contact.sort_key[1]
+
+def insert_entry(entries, entry):
+    '''insert entry on the sorted list entries'''
+    bisect.insort(entries, entry)
+
+def remove_entry(entries, entry):
+    '''remove entry from the sorted list entries'''
+    index = bisect.bisect_left(entries, entry)
+
+    if index < len(entries) and entries[index] is entry:
+        del entries[index]
+
+def entry_contacts(entries):
+    '''return a list with the contacts of a list of entries'''
+    return [entry[2] for entry in entries]
+
 class ContactManager(object):
     def __init__(self, account):
-        self.contacts = {}
+        # the contacts on each status, on each group and the ones without
+        # groups, each one is a list of (display name, id, contact) sorted
+        # by display name, a contact is moved between them when it changes
+        self._by_status = {}
+        self._by_group = {}
+        self._no_group = []
+        # contact -> (status, groups, entry) where it is on the indexes
+        self._indexed = {}
+
+        self.contacts = ContactDict(self)
         self.reverse = {}
         self.pending = {}
 
         self.me = Contact(account)
 
+    def _index(self, contact):
+        '''add contact to the indexes'''
+        self._add_entries(contact)
+        contact.add_index(self)
+
+    def _unindex(self, contact):
+        '''remove contact from the indexes'''
+        self._remove_entries(contact)
+        contact.remove_index(self)
+
+    def contact_changed(self, contact):
+        '''called by contact when its status, groups or display name
+        change, move it to the indexes where it belongs now'''
+        (stat, groups, entry) = self._indexed.get(contact, (None, None, None))
+
+        if entry is None or (stat == contact.status and
+                groups == tuple(contact.groups) and
+                entry[0] == contact.display_name):
+            return
+
+        self._remove_entries(contact)
+        self._add_entries(contact)
+
+    def _add_entries(self, contact):
+        '''add the entries of contact to the indexes'''
+        if contact in self._indexed:
+            self._remove_entries(contact)
+
+        entry = (contact.display_name, id(contact), contact)
+        stat = contact.status
+        groups = tuple(contact.groups)
+
+        insert_entry(self._by_status.setdefault(stat, []), entry)
+
+        for group in groups:
+            insert_entry(self._by_group.setdefault(group, []), entry)
+
+        if not groups:
+            insert_entry(self._no_group, entry)
+
+        self._indexed[contact] = (stat, groups, entry)
+
+    def _remove_entries(self, contact):
+        '''remove the entries of contact from the indexes'''
+        if contact not in self._indexed:
+            return
+
+        (stat, groups, entry) = self._indexed.pop(contact)
+        remove_entry(self._by_status[stat], entry)
+
+        for group in groups:
+            remove_entry(self._by_group[group], entry)
+
+            if not self._by_group[group]:
+                del self._by_group[group]
+
+        if not groups:
+            remove_entry(self._no_group, entry)
+
     def exists(self, account):
         '''check if the account is on self.contacts, return True if exists'''
         if account in self.contacts:
@@ -43,8 +188,7 @@ class ContactManager(object):
     # actions on our contact
     def get_no_group(self):
         '''return a list of contacts that dont belong to any group'''
-        return [contact for contact in self.contacts.values() \
-            if not contact.groups]
+        return entry_contacts(self._no_group)
 
     def get_contacts(self, accounts):
         '''return a list of contact objects from a list of accounts
@@ -61,14 +205,20 @@ class ContactManager(object):
         if contacts is None, then use the internal list of contacts
         contacts should be a list of contact objects'''
         sorted_dict = {}
-        contacts = contacts or self.contacts.values()
+
+        if contacts is None:
+            for stat in status.ORDERED:
+                sorted_dict[stat] = entry_contacts(
+                    self._by_status.get(stat, ()))
+
+            return sorted_dict
 
         for stat in status.ORDERED:
-            sorted_dict[stat] = [contact for contact in contacts \
-                if contact.status == stat]
+            sorted_dict[stat] = []
 
-            sorted_dict[stat].sort(cmp=lambda x, y: cmp(x.display_name,
-                y.display_name))
+        for contact in sorted(contacts, key=name_key):
+            if contact.status in sorted_dict:
+                sorted_dict[contact.status].append(contact)
 
         return sorted_dict
 
@@ -81,14 +231,11 @@ class ContactManager(object):
         sorted_dict = {}
 
         for group in groups:
-            contacts = [contact for contact in self.contacts.values() \
-                if group in contact.groups]
+            contacts = entry_contacts(self._by_group.get(group, ()))
 
             if sort_by_status:
                 sorted_dict[group] = self.get_sorted_list_by_status(contacts)
             else:
-                contacts.sort(cmp=lambda x, y: cmp(x.display_name,
-                    y.display_name))
                 sorted_dict[group] = contacts
 
         return sorted_dict
@@ -195,7 +342,10 @@ class ContactManager(object):
 
     def get_online_list(self, contacts=None):
         '''return a list of non offline contacts'''
-        contacts = contacts or self.contacts.values()
+        if contacts is None:
+            return [entry[2] for stat in status.ORDERED if
+                stat != status.OFFLINE for entry in
+                self._by_status.get(stat, ())]
 
         return [contact for contact in contacts \
                 if contact.status != status.OFFLINE]
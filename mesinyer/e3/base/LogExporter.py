@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+'''write the chats from the history database to files in different formats'''
+
+#   This file is part of emesene.
+#
+#    Emesene is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    emesene is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with emesene; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import time
+import json
+import xml.sax.saxutils
+
+# size of the buffer of the exported file
+BUFFER_SIZE = 262144
+# number of rows written between calls to the progress callback
+PROGRESS_ROWS = 10000
+
+NUDGE_TEXT = '<<nudge>>'
+
+def get_message_text(payload):
+    '''return the text of a message payload without the MIME header, None
+    if it's not a text message'''
+    tokens = payload.split('\r\n', 3)
+
+    if tokens[0].find('text/plain;') == -1 or len(tokens) != 4:
+        return None
+
+    return tokens[3]
+
+def get_export_text(payload):
+    '''return the text to export for a message payload, None if the message
+    has no text to export'''
+    if payload.startswith('text/x-msnmsgr-datacast'):
+        return NUDGE_TEXT
+
+    return get_message_text(payload)
+
+class Exporter(object):
+    '''base class of the exporters, an exporter converts each row of
+    Logger.iter_chats to a line of the exported file'''
+
+    # the name used to select the exporter and the extension of the file
+    NAME = None
+
+    def __init__(self):
+        '''constructor'''
+        # the number of the day and the text of the date of the last row,
+        # the date is formatted once per day instead of once per row
+        self._day = None
+        self._date = None
+
+    def header(self):
+        '''return the text at the start of the file'''
+        return ''
+
+    def footer(self):
+        '''return the text at the end of the file'''
+        return ''
+
+    def format(self, status, timestamp, text, nick, src, dest):
+        '''return the encoded line for a message'''
+        raise NotImplementedError()
+
+    def format_time(self, timestamp):
+        '''return timestamp as 'YYYY-MM-DD HH:MM:SS' in UTC'''
+        seconds = int(timestamp)
+        (day, seconds) = divmod(seconds, 86400)
+
+        if day != self._day:
+            self._day = day
+            self._date = time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+
+        (hours, seconds) = divmod(seconds, 3600)
+        (minutes, seconds) = divmod(seconds, 60)
+
+        return '%s %02d:%02d:%02d' % (self._date, hours, minutes, seconds)
+
+class TxtExporter(Exporter):
+    '''export the chats as plain text, one line per message'''
+
+    NAME = 'txt'
+
+    def format(self, status, timestamp, text, nick, src, dest):
+        '''return the encoded line for a message'''
+        return (u'[%s] %s: %s\n' % (self.format_time(timestamp), nick,
+            text)).encode('utf-8')
+
+class HtmlExporter(Exporter):
+    '''export the chats as an html document'''
+
+    NAME = 'html'
+
+    HEADER = '''<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN"
+"http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+<title>emesene chat history</title>
+<style type="text/css">
+.time { color: #888; }
+.nick { font-weight: bold; }
+</style>
+</head>
+<body>
+'''
+
+    FOOTER = '''</body>
+</html>
+'''
+
+    def header(self):
+        '''return the text at the start of the file'''
+        return self.HEADER
+
+    def footer(self):
+        '''return the text at the end of the file'''
+        return self.FOOTER
+
+    def format(self, status, timestamp, text, nick, src, dest):
+        '''return the encoded line for a message'''
+        return (u'<p><span class="time">%s</span> <span class="nick">%s'
+            '</span>: %s</p>\n' % (self.format_time(timestamp),
+                xml.sax.saxutils.escape(nick),
+                xml.sax.saxutils.escape(text).replace('\n', '<br />'))
+            ).encode('utf-8')
+
+class CsvExporter(Exporter):
+    '''export the chats as comma separated values, with the time, the
+    account and nick of the sender, the account of the receiver and the
+    text of each message'''
+
+    NAME = 'csv'
+
+    def header(self):
+        '''return the text at the start of the file'''
+        return 'time,from,nick,to,text\r\n'
+
+    def format(self, status, timestamp, text, nick, src, dest):
+        '''return the encoded line for a message'''
+        return (u'%s,%s,%s,%s,%s\r\n' % (self.format_time(timestamp),
+            self.quote(src), self.quote(nick), self.quote(dest),
+            self.quote(text))).encode('utf-8')
+
+    def quote(self, value):
+        '''return value quoted if needed'''
+        if value is None:
+            return u''
+
+        for char in u',"\r\n':
+            if char in value:
+                return u'"%s"' % (value.replace(u'"', u'""'),)
+
+        return value
+
+class JsonExporter(Exporter):
+    '''export the chats as JSON Lines, an object per line with the same
+    fields than the csv format and the timestamp in seconds'''
+
+    NAME = 'jsonl'
+
+    def format(self, status, timestamp, text, nick, src, dest):
+        '''return the encoded line for a message'''
+        return json.dumps({'time': timestamp, 'from': src, 'nick': nick,
+            'to': dest, 'text': text}) + '\n'
+
+# name -> exporter class
+EXPORTERS = dict([(exporter.NAME, exporter) for exporter in
+    (TxtExporter, HtmlExporter, CsvExporter, JsonExporter)])
+
+def export(rows, path, format_, progress=None, total=None):
+    '''write the rows returned by Logger.iter_chats to path in format_ (one
+    of the keys of EXPORTERS) without keeping them in memory, progress is
+    called with the number of rows read and total every PROGRESS_ROWS
+    rows, return the number of rows read'''
+    exporter = EXPORTERS[format_]()
+    handle = file(path, 'wb', BUFFER_SIZE)
+    count = 0
+
+    try:
+        handle.write(exporter.header())
+        lines = []
+
+        for (status, timestamp, payload, nick, src, dest) in rows:
+            count += 1
+            text = get_export_text(payload)
+
+            if text is not None:
+                lines.append(exporter.format(status, timestamp, text, nick,
+                    src, dest))
+
+            if count % PROGRESS_ROWS == 0:
+                handle.write(''.join(lines))
+                lines = []
+
+                if progress is not None:
+                    progress(count, total)
+
+        handle.write(''.join(lines))
+        handle.write(exporter.footer())
+    finally:
+        handle.close()
+
+    if progress is not None:
+        progress(count, total)
+
+    return count
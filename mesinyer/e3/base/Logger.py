@@ -1,9 +1,16 @@
+import re
+import sys
 import time
 import Queue
+import struct
 import threading
+import collections
 import sqlite3.dbapi2 as sqlite
 
 import status as pstatus
+import LogExporter
+from LogExporter import get_message_text
+from e3.common.Mailbox import Mailbox
 from debugger import dbg
 
 class Account(object):
@@ -45,10 +52,74 @@ class Group(object):
         self.enabled = enabled
         self.accounts = []
 
+class RowCache(object):
+    '''a dict that remembers the order in which its keys were used, the
+    order is kept on a deque of (use, key), a key used again is appended
+    again and its older item is skipped when it reaches the start'''
+
+    def __init__(self):
+        '''constructor'''
+        # key -> (value, number of the last use)
+        self.items = {}
+        self.order = collections.deque()
+        self.uses = 0
+
+    def __len__(self):
+        '''return the number of keys'''
+        return len(self.items)
+
+    def __contains__(self, key):
+        '''return True if key is on the cache'''
+        return key in self.items
+
+    def get(self, key):
+        '''return the value of key marking it as the most recently used or
+        None if it's not on the cache'''
+        if key not in self.items:
+            return None
+
+        value = self.items[key][0]
+        self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        '''set the value of key and mark it as the most recently used'''
+        self.uses += 1
+        self.items[key] = (value, self.uses)
+        self.order.append((self.uses, key))
+
+        if len(self.order) > 2 * len(self.items) + 16:
+            # too many skipped items, keep only the last use of each key
+            self.order = collections.deque(sorted([(use, key_) for
+                (key_, (value_, use)) in self.items.iteritems()]))
+
+    def pop_oldest(self):
+        '''remove the least recently used key'''
+        while self.order:
+            (use, key) = self.order.popleft()
+
+            if key in self.items and self.items[key][1] == use:
+                del self.items[key]
+                return
+
+    def clear(self):
+        '''remove all the keys'''
+        self.items.clear()
+        self.order.clear()
+
 class Logger(object):
     '''a class to log activity on an IM'''
 
     COMMIT_LIMIT = 20
+    # seconds after which an open transaction is committed even if it has
+    # less than COMMIT_LIMIT statements
+    COMMIT_INTERVAL = 2.0
+
+    # statements that must be executed inside a transaction
+    WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP',
+        'ALTER')
+    # maximum number of entries on the d_info and d_time caches
+    CACHE_SIZE = 5000
 
     EVENTS = ('nick change', 'status change', 'message change', 'image change',
         'message', 'message-error')
@@ -239,14 +310,17 @@ class Logger(object):
         ORDER BY tmstp LIMIT ?;
     '''
 
+    # an union instead of an or so each side can use i_fact_event_chat
     SELECT_CHATS = '''
         SELECT f.status, f.tmstp, f.payload, i.nick
-        FROM fact_event f, d_info i
-        WHERE f.id_event=? and
-            ((f.id_src_acc=? and id_dest_acc=?) or
-            (f.id_dest_acc=? and id_src_acc=?)) and
-            f.id_src_info = i.id_info
-        ORDER BY tmstp LIMIT ?;
+        FROM (SELECT status, tmstp, payload, id_src_info FROM fact_event
+                WHERE id_event=? and id_src_acc=? and id_dest_acc=?
+            UNION ALL
+            SELECT status, tmstp, payload, id_src_info FROM fact_event
+                WHERE id_event=? and id_dest_acc=? and id_src_acc=?) f,
+            d_info i
+        WHERE f.id_src_info = i.id_info
+        ORDER BY f.tmstp LIMIT ?;
     '''
 
     SELECT_CHATS_BETWEEN = '''
@@ -260,6 +334,216 @@ class Logger(object):
         ORDER BY tmstp LIMIT ?;
     '''
 
+    # the queries that return pages select the rows older than a position,
+    # the newest first, the position of a row is (tmstp, id_fact) so rows
+    # with the same timestamp are not skipped or repeated between pages
+    SELECT_ACCOUNT_EVENT_PAGE = '''
+        SELECT status, tmstp, payload, id_fact FROM fact_event
+        WHERE id_event=? and id_src_acc=? and
+            (tmstp < ? or (tmstp = ? and id_fact < ?))
+        ORDER BY tmstp DESC, id_fact DESC LIMIT ?;
+    '''
+
+    # each side is limited so only the rows of one page are read from the
+    # index
+    SELECT_CHATS_PAGE = '''
+        SELECT f.status, f.tmstp, f.payload, i.nick, f.id_fact
+        FROM (SELECT * FROM (SELECT status, tmstp, payload, id_src_info,
+                    id_fact FROM fact_event
+                WHERE id_event=? and id_src_acc=? and id_dest_acc=? and
+                    tmstp >= ? and (tmstp < ? or (tmstp = ? and id_fact < ?))
+                ORDER BY tmstp DESC, id_fact DESC LIMIT ?)
+            UNION ALL
+            SELECT * FROM (SELECT status, tmstp, payload, id_src_info,
+                    id_fact FROM fact_event
+                WHERE id_event=? and id_dest_acc=? and id_src_acc=? and
+                    tmstp >= ? and (tmstp < ? or (tmstp = ? and id_fact < ?))
+                ORDER BY tmstp DESC, id_fact DESC LIMIT ?)) f,
+            d_info i
+        WHERE f.id_src_info = i.id_info
+        ORDER BY f.tmstp DESC, f.id_fact DESC LIMIT ?;
+    '''
+
+    # the messages to export from the oldest to the newest, see iter_chats,
+    # the + keeps i_fact_event_chat from being used so the rows are read in
+    # order from i_fact_event_tmstp instead of being sorted before the first
+    # one is returned
+    SELECT_EXPORT_ALL = '''
+        SELECT f.status, f.tmstp, f.payload, i.nick, s.account, d.account
+        FROM fact_event f
+            JOIN d_info i ON f.id_src_info = i.id_info
+            JOIN d_account s ON f.id_src_acc = s.id_account
+            LEFT JOIN d_account d ON f.id_dest_acc = d.id_account
+        WHERE +f.id_event=? and f.tmstp >= ? and f.tmstp <= ?
+        ORDER BY f.tmstp, f.id_fact;
+    '''
+
+    SELECT_EXPORT_CHATS = '''
+        SELECT f.status, f.tmstp, f.payload, i.nick, s.account, d.account
+        FROM fact_event f
+            JOIN d_info i ON f.id_src_info = i.id_info
+            JOIN d_account s ON f.id_src_acc = s.id_account
+            LEFT JOIN d_account d ON f.id_dest_acc = d.id_account
+        WHERE f.id_event=? and
+            ((f.id_src_acc=? and f.id_dest_acc=?) or
+            (f.id_dest_acc=? and f.id_src_acc=?)) and
+            f.tmstp >= ? and f.tmstp <= ?
+        ORDER BY f.tmstp, f.id_fact;
+    '''
+
+    COUNT_EXPORT_ALL = '''
+        SELECT COUNT(*) FROM fact_event
+        WHERE +id_event=? and tmstp >= ? and tmstp <= ?;
+    '''
+
+    COUNT_EXPORT_CHATS = '''
+        SELECT (SELECT COUNT(*) FROM fact_event
+                WHERE id_event=?1 and id_src_acc=?2 and id_dest_acc=?3 and
+                    tmstp >= ?6 and tmstp <= ?7) +
+            (SELECT COUNT(*) FROM fact_event
+                WHERE id_event=?1 and id_dest_acc=?4 and id_src_acc=?5 and
+                    tmstp >= ?6 and tmstp <= ?7);
+    '''
+
+    # number of rows fetched at a time by iter_chats
+    EXPORT_BATCH = 1000
+
+    # each item is a tuple of statements that update the schema from the
+    # version of its index to the next one, the version is stored on the
+    # user_version pragma of the database
+    MIGRATIONS = (
+        (
+            '''CREATE INDEX IF NOT EXISTS i_fact_event_src
+                ON fact_event(id_event, id_src_acc, tmstp);''',
+            '''CREATE INDEX IF NOT EXISTS i_fact_event_chat
+                ON fact_event(id_event, id_src_acc, id_dest_acc, tmstp);''',
+            '''CREATE INDEX IF NOT EXISTS i_fact_event_tmstp
+                ON fact_event(tmstp);''',
+        ),
+        # fact_event gets its own id so many events can share the same
+        # d_time row, d_info and d_time are indexed to find existing rows
+        (
+            '''CREATE TABLE fact_event_new
+            (
+              id_fact INTEGER PRIMARY KEY,
+              id_time INTEGER,
+              id_event INTEGER,
+              id_src_info INTEGER,
+              id_dest_info INTEGER,
+              id_src_acc INTEGER,
+              id_dest_acc INTEGER,
+
+              status INTEGER,
+              payload TEXT,
+              tmstp FLOAT
+            );''',
+            '''INSERT INTO fact_event_new
+                SELECT id_time, id_time, id_event, id_src_info, id_dest_info,
+                    id_src_acc, id_dest_acc, status, payload, tmstp
+                FROM fact_event;''',
+            '''DROP TABLE fact_event;''',
+            '''ALTER TABLE fact_event_new RENAME TO fact_event;''',
+            '''CREATE INDEX i_fact_event_src
+                ON fact_event(id_event, id_src_acc, tmstp);''',
+            '''CREATE INDEX i_fact_event_chat
+                ON fact_event(id_event, id_src_acc, id_dest_acc, tmstp);''',
+            '''CREATE INDEX i_fact_event_tmstp ON fact_event(tmstp);''',
+            '''CREATE INDEX i_d_info
+                ON d_info(id_account, nick, message, path);''',
+            '''CREATE INDEX i_d_time
+                ON d_time(year, month, day, hour, minute, seconds);''',
+        ),
+    )
+
+    SELECT_INFO_ID = '''
+        SELECT id_info FROM d_info
+        WHERE id_account=? AND nick=? AND message=? AND path=? LIMIT 1;
+    '''
+
+    SELECT_TIME_ID = '''
+        SELECT id_time FROM d_time
+        WHERE year=? AND month=? AND day=? AND hour=? AND minute=? AND
+            seconds=? LIMIT 1;
+    '''
+
+    # statements that collapse the duplicated rows of a dimension, %(table)s,
+    # %(id)s and %(fields)s are replaced with the table name, the name of the
+    # id and the condition that matches two equal rows of tables a and b
+    COMPACT_DIMENSION = (
+        '''CREATE TEMP TABLE dup_map (old INTEGER PRIMARY KEY, new INTEGER);''',
+        '''INSERT INTO dup_map
+            SELECT a.%(id)s, (SELECT MIN(b.%(id)s) FROM %(table)s b
+                WHERE %(fields)s)
+            FROM %(table)s a;''',
+        '''DELETE FROM dup_map WHERE old = new;''',
+    )
+
+    COMPACT_INFO = (
+        '''UPDATE fact_event SET id_src_info =
+            (SELECT new FROM dup_map WHERE old = id_src_info)
+            WHERE id_src_info IN (SELECT old FROM dup_map);''',
+        '''UPDATE fact_event SET id_dest_info =
+            (SELECT new FROM dup_map WHERE old = id_dest_info)
+            WHERE id_dest_info IN (SELECT old FROM dup_map);''',
+        '''UPDATE last_account SET id_info =
+            (SELECT new FROM dup_map WHERE old = id_info)
+            WHERE id_info IN (SELECT old FROM dup_map);''',
+        '''DELETE FROM d_info WHERE id_info IN (SELECT old FROM dup_map);''',
+        '''DROP TABLE dup_map;''',
+    )
+
+    COMPACT_TIME = (
+        '''UPDATE fact_event SET id_time =
+            (SELECT new FROM dup_map WHERE old = id_time)
+            WHERE id_time IN (SELECT old FROM dup_map);''',
+        '''DELETE FROM d_time WHERE id_time IN (SELECT old FROM dup_map);''',
+        '''DROP TABLE dup_map;''',
+    )
+
+    # the full text index of the messages, the docid of each row is the
+    # id_fact of the event, the first module available is used
+    CREATE_SEARCH = (
+        '''CREATE VIRTUAL TABLE search_event
+            USING fts4(body, tokenize=unicode61);''',
+        '''CREATE VIRTUAL TABLE search_event USING fts4(body);''',
+        '''CREATE VIRTUAL TABLE search_event USING fts3(body);''',
+    )
+
+    # the id_fact of the last event that was added before the index existed
+    # and was not indexed yet, the events are indexed from the newest to the
+    # oldest, see index_events
+    CREATE_SEARCH_BACKFILL = (
+        '''CREATE TABLE IF NOT EXISTS search_backfill(id_fact INTEGER);''',
+        '''DELETE FROM search_backfill;''',
+        '''INSERT INTO search_backfill SELECT MAX(id_fact) FROM fact_event
+            WHERE id_fact IS NOT NULL;''',
+    )
+
+    SELECT_SEARCH_BACKFILL = '''SELECT id_fact FROM search_backfill;'''
+
+    UPDATE_SEARCH_BACKFILL = '''UPDATE search_backfill SET id_fact=?;'''
+
+    SELECT_BACKFILL_EVENTS = '''
+        SELECT id_fact, payload FROM fact_event
+        WHERE id_fact <= ? ORDER BY id_fact DESC LIMIT ?;
+    '''
+
+    INSERT_SEARCH = '''INSERT INTO search_event(docid, body) VALUES(?, ?);'''
+
+    SELECT_SEARCH = '''
+        SELECT f.status, f.tmstp, f.payload, i.nick
+        FROM search_event s, fact_event f, d_info i
+        WHERE search_event MATCH ? AND f.id_fact = s.docid AND
+            (f.id_src_acc=? or f.id_dest_acc=?) AND
+            f.id_src_info = i.id_info
+        ORDER BY search_rank(matchinfo(search_event, 'pcx')) DESC,
+            f.tmstp DESC
+        LIMIT ?;
+    '''
+
+    # number of old events indexed on each call to index_events
+    SEARCH_BATCH = 1000
+
     def __init__(self, path):
         '''constructor'''
         self.path = path
@@ -268,10 +552,21 @@ class Logger(object):
         self.groups = {}
         self.accounts = {}
 
-        self.connection = sqlite.connect(path)
+        # transactions are handled explicitly, see execute and commit
+        self.connection = sqlite.connect(path, isolation_level=None)
         self.cursor = self.connection.cursor()
 
         self._count = 0
+        self._transaction_start = None
+
+        # (id_account, nick, message, path) -> id_info and
+        # (year, month, day, hour, minute, seconds) -> id_time of the rows
+        # used recently, so the same row is not inserted many times, the
+        # least recently used entries are removed first
+        self.info_cache = RowCache()
+        self.time_cache = RowCache()
+
+        self._set_pragmas()
 
         try:
             self._create()
@@ -281,6 +576,98 @@ class Logger(object):
             self._load_accounts()
             self._load_account_by_group()
 
+        self._migrate()
+        self.commit()
+        self._setup_search()
+
+    def _setup_search(self):
+        '''create the full text index if it doesn't exist, set
+        self.searchable to False if sqlite has no full text support'''
+        self.connection.create_function('search_rank', 1, search_rank)
+        self.searchable = True
+        self.indexing = False
+
+        self.execute('SELECT name FROM sqlite_master WHERE name=?;',
+            ('search_event',))
+
+        if self.cursor.fetchone() is None:
+            for statement in Logger.CREATE_SEARCH:
+                try:
+                    self.execute(statement)
+                    break
+                except sqlite.OperationalError, error:
+                    dbg('can\'t create search index: ' + str(error),
+                        'logger', 1)
+            else:
+                self.searchable = False
+                self.commit()
+                return
+
+            for statement in Logger.CREATE_SEARCH_BACKFILL:
+                self.execute(statement)
+
+            self.commit()
+
+        self.execute('SELECT name FROM sqlite_master WHERE name=?;',
+            ('search_backfill',))
+        self.indexing = self.cursor.fetchone() is not None
+
+    def index_events(self):
+        '''add at most SEARCH_BATCH of the events that were logged before
+        the search index existed to it, return True if there are more
+        events to index'''
+        if not self.indexing:
+            return False
+
+        self.execute(Logger.SELECT_SEARCH_BACKFILL)
+        row = self.cursor.fetchone()
+
+        if row is not None and row[0] is not None:
+            self.execute(Logger.SELECT_BACKFILL_EVENTS,
+                (row[0], Logger.SEARCH_BATCH))
+            events = self.cursor.fetchall()
+        else:
+            events = []
+
+        for (id_fact, payload) in events:
+            self.insert_search(id_fact, payload)
+
+        if len(events) < Logger.SEARCH_BATCH:
+            self.execute('DROP TABLE search_backfill;')
+            self.indexing = False
+            dbg('search index complete', 'logger', 1)
+        else:
+            self.execute(Logger.UPDATE_SEARCH_BACKFILL, (events[-1][0] - 1,))
+
+        self.commit()
+
+        return self.indexing
+
+    def _set_pragmas(self):
+        '''use the write ahead log if available, it makes the commits cheaper
+        and allows to read while writing'''
+        try:
+            self.execute('PRAGMA journal_mode=WAL;')
+            self.execute('PRAGMA synchronous=NORMAL;')
+        except sqlite.OperationalError, error:
+            dbg('can\'t set WAL mode: ' + str(error), 'logger', 1)
+
+    def _migrate(self):
+        '''update the schema to the last version'''
+        self.execute('PRAGMA user_version;')
+        version = self.cursor.fetchone()[0]
+
+        for statements in Logger.MIGRATIONS[version:]:
+            dbg('migrating log database to version ' + str(version + 1),
+                'logger', 1)
+
+            for statement in statements:
+                self.execute(statement)
+
+            version += 1
+            # pragmas don't accept parameters
+            self.execute('PRAGMA user_version=%d;' % (version,))
+
     def _create(self):
         '''create the database'''
         self.execute(Logger.CREATE_D_TIME)
@@ -337,13 +724,23 @@ class Logger(object):
             self.groups[gid] = Group(id_, name, gid, enabled)
 
     def insert_time(self, year, month, day, wday, hour, minute, seconds):
-        '''insert a row into the d_time table, returns the id'''
+        '''insert a row into the d_time table if it doesn't exist, returns
+        the id'''
+        key = (year, month, day, hour, minute, seconds)
+        id_time = self._get_cached(self.time_cache, key,
+            Logger.SELECT_TIME_ID)
+
+        if id_time is not None:
+            return id_time
+
         self.execute(Logger.INSERT_TIME,
             (year, month, day, wday, hour, minute, seconds))
+        id_time = self.cursor.lastrowid
+        self._set_cached(self.time_cache, key, id_time)
 
         self._stat()
 
-        return self.cursor.lastrowid
+        return id_time
 
     def insert_time_now(self):
         '''insert a row into the d_time table with the time information of
@@ -367,11 +764,14 @@ class Logger(object):
                 return (acc.id, acc.id_account)
 
         id_account = self.insert_account(account, cid, True)
+        key = (id_account, unicode(nick), unicode(message), unicode(path))
+        id_info = self._get_cached(self.info_cache, key, Logger.SELECT_INFO_ID)
 
-        self.execute(Logger.INSERT_INFO,
-            (id_account, unicode(nick), unicode(message), unicode(path)))
+        if id_info is None:
+            self.execute(Logger.INSERT_INFO, key)
+            id_info = self.cursor.lastrowid
+            self._set_cached(self.info_cache, key, id_info)
 
-        id_info = self.cursor.lastrowid
         self.accounts[account] = Account(id_info, id_account, account,
             status, nick, message, path)
 
@@ -386,6 +786,70 @@ class Logger(object):
 
         return (id_info, id_account)
 
+    def _get_cached(self, cache, key, query):
+        '''return the id of the row identified by key from the cache or from
+        the database using query, None if it doesn't exist'''
+        if key in cache:
+            return cache.get(key)
+
+        self.execute(query, key)
+        row = self.cursor.fetchone()
+
+        if row is None:
+            return None
+
+        self._set_cached(cache, key, row[0])
+        return row[0]
+
+    def _set_cached(self, cache, key, id_):
+        '''add the id of the row identified by key to cache, remove the
+        least recently used entry if it is full'''
+        if key not in cache and len(cache) >= Logger.CACHE_SIZE:
+            cache.pop_oldest()
+
+        cache.set(key, id_)
+
+    def compact(self):
+        '''collapse the duplicated rows of d_info and d_time and reclaim the
+        unused space of the database file, it takes a long time on big
+        databases'''
+        self._compact_dimension('d_info', 'id_info',
+            ('id_account', 'nick', 'message', 'path'), Logger.COMPACT_INFO)
+        self._compact_dimension('d_time', 'id_time',
+            ('year', 'month', 'day', 'hour', 'minute', 'seconds'),
+            Logger.COMPACT_TIME)
+        self.commit()
+
+        self.info_cache.clear()
+        self.time_cache.clear()
+
+        # the d_info rows of the accounts may have been replaced
+        self.execute(Logger.SELECT_LAST_ACCOUNTS)
+
+        for row in self.cursor.fetchall():
+            if row[2] in self.accounts:
+                self.accounts[row[2]].id = row[0]
+
+        # can't be done inside a transaction
+        self.execute('VACUUM;')
+
+    def _compact_dimension(self, table, id_, fields, statements):
+        '''collapse the duplicated rows of a dimension table, statements
+        update the references to the removed rows'''
+        condition = ' AND '.join(['a.%s IS b.%s' % (field, field)
+            for field in fields])
+        values = {'table': table, 'id': id_, 'fields': condition}
+
+        for statement in Logger.COMPACT_DIMENSION:
+            self.execute(statement % values)
+
+        self.execute('SELECT COUNT(*) FROM dup_map;')
+        dbg('removing %d duplicated rows from %s' % (self.cursor.fetchone()[0],
+            table), 'logger', 1)
+
+        for statement in statements:
+            self.execute(statement)
+
     def insert_account(self, account, cid, enabled=True):
         '''insert a row into the d_event table, returns the id'''
         if account in self.accounts and self.accounts[account].id_account:
@@ -490,18 +954,42 @@ class Logger(object):
     def _stat(self):
         '''called internally each time a transaction is made, here we control
         how often a commit is made'''
+        self._count += 1
 
-        if self._count >= Logger.COMMIT_LIMIT:
-            t1 = time.time()
-            self.connection.commit()
-            dbg('commit ' + str(time.time() - t1), 'logger', 4)
-            self._count = 0
+        if self._count >= Logger.COMMIT_LIMIT or self.commit_pending() == 0:
+            self.commit()
 
-        self._count += 1
+    def commit(self):
+        '''commit the open transaction if there is one'''
+        if self._transaction_start is None:
+            return
+
+        t1 = time.time()
+        self.cursor.execute('COMMIT;')
+        dbg('commit ' + str(time.time() - t1), 'logger', 4)
+        self._count = 0
+        self._transaction_start = None
+
+    def commit_pending(self):
+        '''return the number of seconds until the open transaction should be
+        committed, 0 if it should be committed now or None if there is no
+        open transaction'''
+        if self._transaction_start is None:
+            return None
+
+        return max(0, self._transaction_start + Logger.COMMIT_INTERVAL - \
+            time.time())
 
     def execute(self, query, args=()):
-        '''execute the query with optional args'''
+        '''execute the query with optional args, a transaction is started
+        before the first statement that writes'''
         dbg(query + str(args), 'logger', 5)
+
+        if self._transaction_start is None and \
+                query.split(None, 1)[0].upper() in Logger.WRITE_STATEMENTS:
+            self.cursor.execute('BEGIN;')
+            self._transaction_start = time.time()
+
         self.cursor.execute(query, args)
 
     # utility methods
@@ -522,12 +1010,45 @@ class Logger(object):
         id_time = self.insert_time_now()
         timestamp = time.time()
 
-        self.insert_fact_event(id_time, id_event, id_src_info, id_dest_info,
-            id_src_acc, id_dest_acc, status, payload, timestamp)
+        id_fact = self.insert_fact_event(id_time, id_event, id_src_info,
+            id_dest_info, id_src_acc, id_dest_acc, status, payload, timestamp)
+
+        self.insert_search(id_fact, payload)
+
+    def insert_search(self, id_fact, payload):
+        '''add the text of payload to the search index if it's a text
+        message'''
+        if not self.searchable:
+            return
+
+        text = get_message_text(payload)
+
+        if text:
+            self.execute(Logger.INSERT_SEARCH, (id_fact, unicode(text)))
+
+    def search(self, account, query, limit):
+        '''return the last # messages from or to account that contain all
+        the words on query sorted by relevance, where # is the limit value
+        '''
+        if account not in self.accounts or not self.searchable:
+            return None
+
+        id_account = self.accounts[account].id_account
+        words = re.findall(r'\w+', unicode(query), re.UNICODE)
+
+        if not words:
+            return []
+
+        # quote the words so the operators of the query syntax are ignored
+        match = ' '.join(['"%s"' % (word,) for word in words])
+        self.execute(Logger.SELECT_SEARCH,
+            (match, id_account, id_account, limit))
+
+        return self.cursor.fetchall()
 
     def close(self):
         '''call this method when you are closing the app'''
-        self.connection.commit()
+        self.commit()
         self.cursor.close()
         self.connection.close()
 
@@ -602,8 +1123,8 @@ class Logger(object):
         if id_event is None:
             return None
 
-        self.execute(Logger.SELECT_CHATS, (id_event, id_src, id_dest, id_src,
-            id_dest, limit))
+        self.execute(Logger.SELECT_CHATS, (id_event, id_src, id_dest, id_event,
+            id_src, id_dest, limit))
 
         return self.cursor.fetchall()
 
@@ -627,6 +1148,151 @@ class Logger(object):
 
         return self.cursor.fetchall()
 
+    def get_event_page(self, account, event, before, limit):
+        '''return a page with the # events of account older than before,
+        where # is the limit value, see _get_page'''
+        id_event = self.events.get(event, None)
+
+        if account not in self.accounts or id_event is None:
+            return None
+
+        id_account = self.accounts[account].id_account
+        (tmstp, id_fact) = self._get_position(before, None)
+
+        return self._get_page(Logger.SELECT_ACCOUNT_EVENT_PAGE,
+            (id_event, id_account, tmstp, tmstp, id_fact, limit))
+
+    def get_chats_page(self, src, dest, from_t, to_t, before, limit):
+        '''return a page with the # messages sent from src to dest or from
+        dest to src older than before, where # is the limit value, from_t
+        and to_t limit the timestamps if not None, see _get_page'''
+        id_event = self.events.get('message', None)
+
+        if src not in self.accounts or dest not in self.accounts or \
+                id_event is None:
+            return None
+
+        id_src = self.accounts[src].id_account
+        id_dest = self.accounts[dest].id_account
+        (tmstp, id_fact) = self._get_position(before, to_t)
+
+        if from_t is None:
+            from_t = 0
+
+        args = (id_event, id_src, id_dest, from_t, tmstp, tmstp, id_fact,
+            limit)
+
+        return self._get_page(Logger.SELECT_CHATS_PAGE, args + args + (limit,))
+
+    def _get_position(self, before, to_t):
+        '''return the position from where a page starts, before is the
+        position returned with the previous page or None for the first one,
+        to_t is the maximum timestamp or None'''
+        if before is not None:
+            return before
+
+        if to_t is None:
+            to_t = float('inf')
+
+        # the rows with timestamp to_t are included
+        return (to_t, sys.maxint)
+
+    def _get_page(self, query, args):
+        '''execute a page query and return a (rows, next) tuple, rows has the
+        same format than the rows of the non paginated query, the newest
+        first, next is the position to pass as before to get the next
+        page or None if this was the last one'''
+        self.execute(query, args)
+        rows = self.cursor.fetchall()
+
+        if rows and len(rows) == args[-1]:
+            last = rows[-1]
+            following = (last[1], last[-1])
+        else:
+            following = None
+
+        return ([row[:-1] for row in rows], following)
+
+    def iter_chats(self, src, dest, from_t=None, to_t=None):
+        '''return an iterator over the messages sent from src to dest or from
+        dest to src, or over all the messages if src is None, from the
+        oldest to the newest, from_t and to_t limit the timestamps if not
+        None, each item is a (status, timestamp, payload, nick, src account,
+        dest account) tuple, the rows are read as they are iterated'''
+        query = self._get_export_query(Logger.SELECT_EXPORT_ALL,
+            Logger.SELECT_EXPORT_CHATS, src, dest, from_t, to_t)
+
+        if query is None:
+            return iter(())
+
+        return self._iter_rows(*query)
+
+    def _iter_rows(self, query, args):
+        '''execute query on a new cursor and yield the rows, EXPORT_BATCH at
+        a time'''
+        cursor = self.connection.cursor()
+        cursor.execute(query, args)
+
+        try:
+            while True:
+                rows = cursor.fetchmany(Logger.EXPORT_BATCH)
+
+                if not rows:
+                    break
+
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+
+    def count_chats(self, src, dest, from_t=None, to_t=None):
+        '''return the number of messages iter_chats would return'''
+        query = self._get_export_query(Logger.COUNT_EXPORT_ALL,
+            Logger.COUNT_EXPORT_CHATS, src, dest, from_t, to_t)
+
+        if query is None:
+            return 0
+
+        self.execute(*query)
+
+        return self.cursor.fetchone()[0]
+
+    def _get_export_query(self, query_all, query_chats, src, dest, from_t,
+            to_t):
+        '''return the (query, args) tuple to select the messages of
+        iter_chats, None if there are no messages to select'''
+        id_event = self.events.get('message', None)
+
+        if id_event is None:
+            return None
+
+        if from_t is None:
+            from_t = 0
+
+        if to_t is None:
+            to_t = float('inf')
+
+        if src is None:
+            return (query_all, (id_event, from_t, to_t))
+
+        if src not in self.accounts or dest not in self.accounts:
+            return None
+
+        id_src = self.accounts[src].id_account
+        id_dest = self.accounts[dest].id_account
+
+        return (query_chats, (id_event, id_src, id_dest, id_src, id_dest,
+            from_t, to_t))
+
+    def export_chats(self, src, dest, from_t, to_t, path, format_,
+            progress=None):
+        '''export the messages of iter_chats to path in format_, see
+        LogExporter.export, return the number of messages exported'''
+        total = self.count_chats(src, dest, from_t, to_t)
+
+        return LogExporter.export(self.iter_chats(src, dest, from_t, to_t),
+            path, format_, progress, total)
+
     def add_groups(self, groups):
         '''add all groups to the database'''
         existing = set(self.groups.keys())
@@ -691,9 +1357,145 @@ class Logger(object):
                 local_account.groups.remove(gid)
                 self.delete_account_by_group(local_account.id_account, local_group.id)
 
+class ReadOnlyLogger(Logger):
+    '''a Logger with its own connection that can only be used to query the
+    database from other thread than the one that writes, it shares the
+    dimensions loaded by the writer'''
+
+    def __init__(self, writer):
+        '''constructor, writer is the Logger that writes to the database'''
+        self.path = writer.path
+
+        self.events = writer.events
+        self.groups = writer.groups
+        self.accounts = writer.accounts
+
+        self.connection = sqlite.connect(self.path, isolation_level=None)
+        self.cursor = self.connection.cursor()
+        self.connection.create_function('search_rank', 1, search_rank)
+        self.searchable = writer.searchable
+        self.indexing = False
+
+        self._count = 0
+        self._transaction_start = None
+
+        try:
+            self.execute('PRAGMA query_only=ON;')
+        except sqlite.OperationalError, error:
+            dbg('can\'t set query only mode: ' + str(error), 'logger', 1)
+
+class LoggerReader(threading.Thread):
+    '''a thread that handles the queries of a LoggerProcess with its own
+    connection'''
+
+    def __init__(self, process):
+        '''constructor'''
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+
+        self.process = process
+
+    def run(self):
+        '''main method'''
+        logger = ReadOnlyLogger(self.process.logger)
+        actions = {}
+
+        for action in LoggerProcess.READ_ACTIONS:
+            actions[action] = getattr(logger, action)
+
+        while True:
+            data = self.process.reads.get()
+
+            if data is None:
+                logger.close()
+                break
+
+            (action, args) = data
+
+            if action == 'stream':
+                self._stream(actions, *args)
+            elif action in actions:
+                self._call(action, actions[action], args[:-1], args[-1])
+
+    def _call(self, action, function, args, callback):
+        '''call function with args, put the result on the output of the
+        process and return it'''
+        start = time.time()
+
+        try:
+            result = function(*args)
+        except Exception, e:
+            dbg('error calling action ' + action + ' on LoggerProcess',
+                'logger', 1)
+            dbg(str(e), 'logger', 1)
+            result = None
+
+        self.process.add_timing(action, time.time() - start)
+
+        if callback:
+            self.process.output.put(action, (result, callback))
+
+        return result
+
+    def _stream(self, actions, stream, before):
+        '''read the page of stream that starts at before and put it on the
+        output, the stream asks for the following page once it's handled'''
+        if stream.cancelled:
+            return
+
+        self._call(stream.action, actions[stream.action],
+            stream.args + (before, stream.limit), stream._on_page)
+
+class LoggerStream(object):
+    '''the pages of a paginated query read one after another, a page is
+    only read after the callback handled the previous one, so the pages
+    don't pile up on the output if they are handled slowly'''
+
+    def __init__(self, process, action, args, limit, callback):
+        '''constructor, action is the name of the page query and args its
+        arguments without the position and the limit'''
+        self.process = process
+        self.action = action
+        self.args = args
+        self.limit = limit
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        '''stop reading pages, the callback is not called again'''
+        self.cancelled = True
+
+    def _request(self, before):
+        '''ask the readers for the page that starts at before'''
+        if not self.cancelled:
+            self.process._read(('stream', (self, before)))
+
+    def _on_page(self, result):
+        '''called from LoggerProcess.check with a page, pass it to the
+        callback and ask for the next one'''
+        if self.cancelled:
+            return
+
+        self.callback(result)
+
+        if result is not None and result[1] is not None:
+            self._request(result[1])
+
 class LoggerProcess(threading.Thread):
     '''a process that exposes a thread safe api to log events of a session'''
 
+    # maximum number of callbacks called on each call to check
+    BATCH_SIZE = 50
+    # number of threads that handle the queries, see LoggerReader
+    READERS = 2
+    # the queries that take more seconds than this are logged
+    SLOW_QUERY = 0.5
+    # the actions that only read, they are handled by the readers so the
+    # events are logged while a long query runs
+    READ_ACTIONS = ('get_event', 'get_nicks', 'get_messages', 'get_status',
+        'get_images', 'get_sent_messages', 'get_chats', 'get_chats_between',
+        'get_event_page', 'get_chats_page', 'search', 'export_chats')
+
     def __init__(self, path):
         '''constructor'''
         threading.Thread.__init__(self)
@@ -702,7 +1504,17 @@ class LoggerProcess(threading.Thread):
         self.path = path
         self.logger = None
         self.input = Queue.Queue()
-        self.output = Queue.Queue()
+        # the results are added tagged with the action name, the gui can
+        # watch it to know when there are results to handle
+        self.output = Mailbox()
+        # the queries, handled by the readers
+        self.reads = Queue.Queue()
+        self.readers = []
+        self.max_reads = 0
+
+        # action -> [count, total seconds, maximum seconds]
+        self.timings = {}
+        self.timings_lock = threading.Lock()
 
         self.actions = {}
 
@@ -711,30 +1523,44 @@ class LoggerProcess(threading.Thread):
         data = None
         self.logger = Logger(self.path)
 
-        self.actions['get_event'] = self.logger.get_event
-        self.actions['get_nicks'] = self.logger.get_nicks
-        self.actions['get_messages'] = self.logger.get_messages
-        self.actions['get_status'] = self.logger.get_status
-        self.actions['get_images'] = self.logger.get_images
-        self.actions['get_sent_messages'] = self.logger.get_sent_messages
-        self.actions['get_chats'] = self.logger.get_chats
-        self.actions['get_chats_between'] = self.logger.get_chats_between
         self.actions['add_groups'] = self.logger.add_groups
         self.actions['add_contacts'] = self.logger.add_contacts
         self.actions['add_contact_by_group'] = self.logger.add_contact_by_group
+        self.actions['compact'] = self.logger.compact
+
+        for index in xrange(self.READERS):
+            reader = LoggerReader(self)
+            reader.start()
+            self.readers.append(reader)
 
         while True:
+            # wake up to commit the open transaction if nothing arrives,
+            # don't wait while there are old events to add to the index
+            if self.logger.indexing:
+                timeout = 0
+            else:
+                timeout = self.logger.commit_pending()
+
             try:
-                data = self.input.get(True)
+                data = self.input.get(True, timeout)
                 quit = self._process(data)
 
                 if quit:
+                    for reader in self.readers:
+                        self.reads.put(None)
+
+                    for reader in self.readers:
+                        reader.join()
+
                     self.logger.close()
                     dbg('closing logger thread', 'logger', 1)
                     break
 
             except Queue.Empty:
-                pass
+                if self.logger.indexing:
+                    self.logger.index_events()
+                else:
+                    self.logger.commit()
 
     def _process(self, data):
         '''process the received data'''
@@ -745,6 +1571,12 @@ class LoggerProcess(threading.Thread):
             self.logger.add_event(event, status, payload, src, dest)
         elif action == 'quit':
             return True
+        elif action == 'read':
+            # the readers only see what is committed, commit the events
+            # logged before the query so it sees them
+            self.logger.commit()
+            self.reads.put(args)
+            self.max_reads = max(self.max_reads, self.reads.qsize())
         elif action in self.actions:
             try:
                 f_args = args[:-1]
@@ -752,7 +1584,7 @@ class LoggerProcess(threading.Thread):
                 result = self.actions[action](*f_args)
 
                 if callback:
-                    self.output.put((action, result, callback))
+                    self.output.put(action, (result, callback))
             except Exception, e:
                 dbg('error calling action ' + action + ' on LoggerProcess',
                     'logger', 1)
@@ -760,20 +1592,71 @@ class LoggerProcess(threading.Thread):
 
         return False
 
-    def check(self):
+    def _read(self, data):
+        '''add a query for the readers to the input, it's handed to them
+        after the events logged before it are committed'''
+        self.input.put(('read', data))
+
+    def add_timing(self, action, elapsed):
+        '''add the time in seconds that took a query to the timings, called
+        from the readers'''
+        if elapsed > self.SLOW_QUERY:
+            dbg('slow query %s: %.2f seconds' % (action, elapsed), 'logger', 2)
+
+        self.timings_lock.acquire()
+
+        try:
+            timing = self.timings.setdefault(action, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+        finally:
+            self.timings_lock.release()
+
+    def check(self, *args):
         '''call this method from the main thread if you dont want to have
         problems with threads, it will extract the results and call the
-        callback that was passed to the get_* call'''
+        callback that was passed to the get_* call, at most BATCH_SIZE
+        callbacks are called, args are ignored so it can be used as callback
+        of gobject.timeout_add and gobject.io_add_watch'''
+        for index in xrange(self.BATCH_SIZE):
+            try:
+                (action, (result, callback)) = self.output.get(False)
+            except Queue.Empty:
+                break
 
-        try:
-            while True:
-                (action, result, callback) = self.output.get(False)
-                callback(result)
-        except Queue.Empty:
-            pass
+            callback(result)
 
         return True
 
+    def fileno(self):
+        '''return a file descriptor that is readable while there are results
+        to handle, to be used with gobject.io_add_watch'''
+        return self.output.fileno()
+
+    def stats(self):
+        '''return a dict with the number of pending results and the time the
+        results waited to be handled (see e3.common.Mailbox.stats), the
+        number of pending writes, the number of pending and maximum number
+        of pending queries and a dict with the count, mean and maximum time
+        in seconds of each query'''
+        stats = self.output.stats()
+        stats['writes'] = self.input.qsize()
+        stats['reads'] = self.reads.qsize()
+        stats['max_reads'] = self.max_reads
+        stats['queries'] = {}
+
+        self.timings_lock.acquire()
+
+        try:
+            for (action, (count, total, maximum)) in self.timings.iteritems():
+                stats['queries'][action] = {'count': count,
+                    'mean': total / count, 'max': maximum}
+        finally:
+            self.timings_lock.release()
+
+        return stats
+
     def log(self, event, status, payload, src, dest=None):
         '''add an event to the log database'''
         self.input.put(('log', (event, status, payload, src, dest)))
@@ -785,43 +1668,80 @@ class LoggerProcess(threading.Thread):
     def get_event(self, account, event, limit, callback):
         '''return the last # events of account, if event or account doesnt
         exist return None'''
-        self.input.put(('get_event', (account, event, limit, callback)))
+        self._read(('get_event', (account, event, limit, callback)))
 
     def get_nicks(self, account, limit, callback):
         '''return the last # nicks from account, where # is the limit value'''
-        self.input.put(('get_nicks', (account, limit, callback)))
+        self._read(('get_nicks', (account, limit, callback)))
 
     def get_messages(self, account, limit, callback):
         '''return the last # messages from account, where # is the limit value
         '''
-        self.input.put(('get_messages', (account, limit, callback)))
+        self._read(('get_messages', (account, limit, callback)))
 
     def get_status(self, account, limit, callback):
         '''return the last # status from account, where # is the limit value
         '''
-        self.input.put(('get_status', (account, limit, callback)))
+        self._read(('get_status', (account, limit, callback)))
 
     def get_images(self, account, limit, callback):
         '''return the last # images from account, where # is the limit value
         '''
-        self.input.put(('get_images', (account, limit, callback)))
+        self._read(('get_images', (account, limit, callback)))
 
     def get_sent_messages(self, src, dest, limit, callback):
         '''return the last # sent from src to dest , where # is the limit value
         '''
-        self.input.put(('get_sent_messages', (src, dest, limit, callback)))
+        self._read(('get_sent_messages', (src, dest, limit, callback)))
 
     def get_chats(self, src, dest, limit, callback):
         '''return the last # sent from src to dest or from dest to src ,
         where # is the limit value
         '''
-        self.input.put(('get_chats', (src, dest, limit, callback)))
+        self._read(('get_chats', (src, dest, limit, callback)))
 
     def get_chats_between(self, src, dest, from_t, to_t, limit, callback):
         '''return the last # sent from src to dest or from dest to src ,
         between two timestamps from_t and to_t, where # is the limit value
         '''
-        self.input.put(('get_chats_between', (src, dest, from_t, to_t, limit, callback)))
+        self._read(('get_chats_between', (src, dest, from_t, to_t, limit, callback)))
+
+    def get_event_page(self, account, event, before, limit, callback):
+        '''return a (rows, next) tuple with the # events of account older
+        than the position before, the newest first, where # is the limit
+        value, before is None for the first page or the next value returned
+        with the previous page, next is None on the last page'''
+        self._read(('get_event_page', (account, event, before, limit,
+            callback)))
+
+    def get_chats_page(self, src, dest, from_t, to_t, before, limit,
+            callback):
+        '''return a (rows, next) tuple with the # messages sent from src to
+        dest or from dest to src older than the position before, the newest
+        first, where # is the limit value, from_t and to_t limit the
+        timestamps if not None, see get_event_page'''
+        self._read(('get_chats_page', (src, dest, from_t, to_t, before,
+            limit, callback)))
+
+    def stream_event(self, account, event, limit, callback):
+        '''call callback with each page of get_event_page, from the newest to
+        the oldest, until the last one (the one with next set to None), each
+        page is read after the previous one was handled, return a
+        LoggerStream that can be cancelled'''
+        stream = LoggerStream(self, 'get_event_page', (account, event), limit,
+            callback)
+        stream._request(None)
+
+        return stream
+
+    def stream_chats(self, src, dest, from_t, to_t, limit, callback):
+        '''call callback with each page of get_chats_page, from the newest to
+        the oldest, see stream_event'''
+        stream = LoggerStream(self, 'get_chats_page', (src, dest, from_t,
+            to_t), limit, callback)
+        stream._request(None)
+
+        return stream
 
     def add_groups(self, groups):
         '''add all groups to the database'''
@@ -835,6 +1755,56 @@ class LoggerProcess(threading.Thread):
         '''add all contacts, groups and relations to the database'''
         self.input.put(('add_contact_by_group', (contacts, groups, None)))
 
+    def compact(self, callback=None):
+        '''remove the duplicated rows from the database, callback is called
+        without meaningful result when it's done'''
+        self.input.put(('compact', (callback,)))
+
+    def search(self, account, query, limit, callback):
+        '''return the last # messages from or to account that contain the
+        words on query, the most relevant first, where # is the limit value
+        '''
+        self._read(('search', (account, query, limit, callback)))
+
+    def export_chats(self, src, dest, from_t, to_t, path, format_, progress,
+            callback):
+        '''export the messages between src and dest, or all the messages if
+        src is None, to path in format_ (see LogExporter.EXPORTERS),
+        progress is called with the number of exported and total messages
+        while exporting if not None, callback is called with the number of
+        exported messages'''
+        if progress is not None:
+            progress = self._get_progress_callback(progress)
+
+        self._read(('export_chats', (src, dest, from_t, to_t, path, format_,
+            progress, callback)))
+
+    def _get_progress_callback(self, progress):
+        '''return a function that calls progress with its arguments from the
+        thread that calls check'''
+        def put_progress(count, total):
+            '''put the call to progress on the output'''
+            self.output.put('export_progress', ((count, total),
+                lambda args: progress(*args)))
+
+        return put_progress
+
+def search_rank(matchinfo):
+    '''sqlite function that returns the relevance of a search result from
+    the output of matchinfo(table, 'pcx'), each occurrence of a word counts
+    more the less it appears on the other messages'''
+    values = struct.unpack('%dI' % (len(matchinfo) / 4,), str(matchinfo))
+    (phrases, columns) = values[:2]
+    score = 0.0
+
+    for index in xrange(phrases * columns):
+        (hits, total_hits) = values[2 + index * 3:4 + index * 3]
+
+        if hits:
+            score += float(hits) / total_hits
+
+    return score
+
 def save_logs_as_txt(results, path):
     '''save the chats in results (from get_chats or get_chats_between) as txt
     to path
@@ -849,13 +1819,14 @@ def save_logs_as_txt(results, path):
         if type_ == 'text/x-msnmsgr-datacast':
             handle.write(date_text + ' ' + nick + ': ' + '<<nudge>>\n')
         elif type_.find('text/plain;') != -1:
-            try:
-                (type_, format, empty, text) = tokens
-                handle.write("%s %s: %s\n" % \
-                    (date_text, nick, text))
-            except ValueError:
+            text = get_message_text(message)
+
+            if text is None:
                 dbg('Invalid number of tokens' + str(tokens),
                         'contactinfo', 1)
+            else:
+                handle.write("%s %s: %s\n" % \
+                    (date_text, nick, text))
         else:
             dbg('unknown message type on ContactInfo', 'contactinfo', 1)
 
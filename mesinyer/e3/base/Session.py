@@ -19,7 +19,6 @@
 
 import os
 import time
-import Queue
 
 from Worker import EVENTS
 from Event import Event
@@ -47,8 +46,13 @@ class Session(object):
         self.logger = None
         self.extras = {}
 
-        self.events = Queue.Queue()
-        self.actions = Queue.Queue()
+        # the events are added tagged as 'event', the gui can watch it
+        # to know when there are events to handle
+        self.events = e3.common.Mailbox()
+        # the worker waits on the inbox for actions and any other input
+        # it has, the actions are added to it tagged as 'action'
+        self.inbox = e3.common.Mailbox()
+        self.actions = self.inbox.slot('action')
 
         if account is not None:
             self.account = account
@@ -79,7 +83,7 @@ class Session(object):
 
     def add_event(self, id_, *args):
         '''add an event to the events queue'''
-        self.events.put(Event(id_, *args))
+        self.events.put('event', Event(id_, *args))
 
     def add_action(self, id_, *args):
         '''add an action to the action queue'''
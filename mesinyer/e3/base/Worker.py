@@ -1,6 +1,5 @@
 '''a thread that handles the connection with the main server'''
 
-import Queue
 import threading
 
 from Event import Event
@@ -75,8 +74,9 @@ class Worker(threading.Thread):
         self.in_login = False
         self.session = session
 
-        # this queue receives a Command object
-        self.command_queue = Queue.Queue()
+        # this queue receives a Command object, they are added to the
+        # session inbox tagged as 'command'
+        self.command_queue = session.inbox.slot('command')
 
         self.action_handlers = {}
         Worker._set_handlers(self)
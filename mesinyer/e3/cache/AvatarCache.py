@@ -4,7 +4,6 @@ from __future__ import with_statement
 import os
 import sys
 import time
-import shutil
 
 import Cache
 
@@ -20,38 +19,72 @@ class AvatarCache(Cache.Cache):
         Cache.Cache.__init__(self, os.path.join(config_path,
             user.strip().replace('@', '-at-')), 'avatars', True)
 
+        # the index, a list of (stamp, hash) in the order they were added
+        # and the number of entries of each hash
+        lines = self.read_info()
+        self.entries = self.parse_lines(lines)
+        self.hashes = {}
+
+        for (stamp, hash_) in self.entries:
+            self.hashes[hash_] = self.hashes.get(hash_, 0) + 1
+
+        self.obsolete = len(lines) - len(self.entries)
+        self.has_last = os.path.isfile(os.path.join(self.path, 'last'))
+
     def parse(self):
         '''parse the file that contains the dir information
         return a list of tuples containing (stamp, hash) in the order found
         on the file
         '''
-        lines = []
-        with file(self.info_path) as handle:
-            for line in handle.readlines():
+        return self.parse_lines(self.read_info())
+
+    def parse_lines(self, lines):
+        '''return a list of tuples (stamp, hash) from the lines of the
+        information file'''
+        entries = []
+
+        for line in lines:
+            if line.startswith(Cache.REMOVED_MARK):
+                removed = line[len(Cache.REMOVED_MARK):].strip()
+                entries = [entry for entry in entries if entry[1] != removed]
+            else:
                 stamp, hash_ = line.split(' ', 1)
-                lines.append((int(stamp), hash_.strip()))
+                entries.append((int(stamp), hash_.strip()))
+
+        return entries
+
+    def hash_list(self):
+        '''return a list of the hashes of the files on the cache'''
+        return self.hashes.keys()
 
-        return lines
+    def info_lines(self):
+        '''return the lines of the info file that describe the live
+        entries'''
+        return ['%s %s' % (str(stamp), hash_) for (stamp, hash_) in
+            self.entries]
 
     def list(self):
         '''return a list of tuples (stamp, hash) of the elements on cache
         '''
-        return self.parse()
+        self.lock.acquire()
+
+        try:
+            return list(self.entries)
+        finally:
+            self.lock.release()
 
     def insert(self, item):
         '''insert a new item into the cache
         return the information (stamp, hash) on success None otherwise
         item -- a path to an image
         '''
-        hash_ = Cache.get_file_path_hash(item)
+        hash_ = self.store_path(item)
 
         if hash_ is None:
             return None
 
-        path = os.path.join(self.path, hash_)
-        last_path = os.path.join(self.path, 'last')
-        shutil.copy2(item, path)
-        shutil.copy2(item, last_path)
+        self.link_file('last', hash_)
+        self.has_last = True
         return self.__add_entry(hash_)
 
     def insert_raw(self, item):
@@ -61,19 +94,9 @@ class AvatarCache(Cache.Cache):
         '''
         position = item.tell()
         item.seek(0)
-        hash_ = Cache.get_file_hash(item)
-
-        if hash_ is None:
-            return None
-
-        path = os.path.join(self.path, hash_)
-        last_path = os.path.join(self.path, 'last')
-        item.seek(0)
-        handle = file(path, 'w')
-        handle.write(item.read())
-        handle.close()
-
-        shutil.copy2(path, last_path)
+        hash_ = self.store(item)
+        self.link_file('last', hash_)
+        self.has_last = True
 
         item.seek(position)
         return self.__add_entry(hash_)
@@ -84,40 +107,66 @@ class AvatarCache(Cache.Cache):
         return (stamp, hash)
         '''
         time_info = int(time.time())
-        handle = file(self.info_path, 'a')
-        handle.write('%s %s\n' % (str(time_info), hash_))
-        handle.close()
+        self.lock.acquire()
 
+        try:
+            self.append_info('%s %s' % (str(time_info), hash_))
+            self.entries.append((time_info, hash_))
+            self.hashes[hash_] = self.hashes.get(hash_, 0) + 1
+        finally:
+            self.lock.release()
+
+        self.notify_added(hash_)
         return time_info, hash_
 
     def __remove_entry(self, hash_to_remove):
-        '''remove an entry from the information file
+        '''remove the entries of hash_to_remove from the index and mark them
+        as removed on the information file
         '''
-        entries = self.list()
-
-        handle = file(self.info_path, 'w')
+        self.lock.acquire()
 
-        for stamp, hash_ in entries:
-            if hash_ != hash_to_remove:
-                handle.write('%s %s\n' % (str(stamp), hash_))
+        try:
+            count = self.hashes.pop(hash_to_remove, 0)
+            self.entries = [entry for entry in self.entries
+                if entry[1] != hash_to_remove]
+            self.append_removed(hash_to_remove, count)
+        finally:
+            self.lock.release()
 
-        handle.close()
+        self.notify_removed(hash_to_remove)
 
     def remove(self, item):
         '''remove an item from cache
         return True on success False otherwise
         item -- the name of the image to remove
         '''
-        if item not in self:
+        if item == 'last':
+            found = self.has_last
+        else:
+            found = item in self.hashes
+
+        if not found:
             return False
 
-        os.remove(os.path.join(self.path, item))
-        self.__remove_entry(item)
+        # the file may be already gone, the index is updated anyway
+        Cache.remove_file(os.path.join(self.path, item))
+
+        if item == 'last':
+            self.has_last = False
+        else:
+            self.__remove_entry(item)
+
         return True
 
     def __contains__(self, name):
         '''return True if name is in cache, False otherwise
         this method is used to do something like
         if image_hash in cache: asd()
+        the answer comes from the index, the disk is not accessed
         '''
-        return os.path.isfile(os.path.join(self.path, name))
+        if name == 'last':
+            return self.has_last
+
+        found = name in self.hashes
+        self.notify_lookup(name, found)
+        return found
@@ -1,7 +1,27 @@
 '''a base module to manage cache subdirectories'''
 import os
 import abc
+import errno
+import shutil
 import hashlib
+import tempfile
+import threading
+
+# prefix of the lines of the info file that remove an entry
+REMOVED_MARK = '-'
+# size of the chunks read to hash and copy files
+BUFFER_SIZE = 65536
+
+def get_file_mode():
+    '''return the mode of the files created with open, mkstemp creates them
+    readable only by the user'''
+    # the umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+
+    return 0666 & ~umask
+
+FILE_MODE = get_file_mode()
 
 def directory_exists(path):
     '''return true if path exists and is a directory
@@ -16,8 +36,12 @@ def get_file_path_hash(file_path):
     if not os.access(file_path, os.R_OK):
         return None
 
-    handle = file(file_path)
-    return get_file_hash(handle)
+    handle = file(file_path, 'rb')
+
+    try:
+        return get_file_hash(handle)
+    finally:
+        handle.close()
 
 def get_file_hash(file_like_obj):
     '''return the hash (base64) of a file like object
@@ -29,17 +53,42 @@ def get_file_digest(file_like_obj):
     '''
     sha = hashlib.sha1()
 
-    chunk = file_like_obj.read(1024)
+    chunk = file_like_obj.read(BUFFER_SIZE)
     while chunk:
         sha.update(chunk)
-        chunk = file_like_obj.read(1024)
+        chunk = file_like_obj.read(BUFFER_SIZE)
     return sha.digest()
 
+def replace_file(source, target):
+    '''rename source to target replacing target if it exists'''
+    if os.name == 'nt' and os.path.exists(target):
+        # rename doesn't replace the file on windows
+        os.remove(target)
+
+    os.rename(source, target)
+
+def remove_file(path):
+    '''remove the file at path, do nothing if it doesn't exist'''
+    try:
+        os.remove(path)
+    except OSError, error:
+        if error.errno != errno.ENOENT:
+            raise
+
 class Cache(object):
     '''a base class to manage cache subdirectories
+
+    the information file is a journal, new entries are appended to it and
+    removed entries are marked with a line that starts with REMOVED_MARK,
+    it's read once and the subclasses keep the entries in memory, when the
+    journal has more obsolete lines than COMPACT_LINES and than live
+    entries it's rewritten on a background thread
     '''
     __metaclass__ = abc.ABCMeta
 
+    # minimum number of obsolete lines on the info file to compact it
+    COMPACT_LINES = 100
+
     def __init__(self, base_path, name='cache', init=True):
         '''constructor
         base_path -- the base path where the cache dir will be located
@@ -52,6 +101,17 @@ class Cache(object):
         self.info_path = os.path.join(self.path, self.info_name)
         self.name = name
 
+        # protects the in memory index and the info file
+        self.lock = threading.RLock()
+        # number of lines of the info file that don't add a live entry
+        self.obsolete = 0
+        # incremented each time the info file changes
+        self.revision = 0
+        self.compacting = False
+        # the CacheManager that shares and evicts the files of this cache,
+        # None if the cache is used alone
+        self.manager = None
+
         if init and not directory_exists(self.path):
             self.init()
 
@@ -62,6 +122,188 @@ class Cache(object):
         # just create the info file
         file(self.info_path, 'w').close()
 
+    def read_info(self):
+        '''return the lines of the info file, an empty list if it doesn't
+        exist'''
+        if not os.path.isfile(self.info_path):
+            return []
+
+        handle = file(self.info_path)
+
+        try:
+            return handle.readlines()
+        finally:
+            handle.close()
+
+    def append_info(self, line):
+        '''append line to the info file'''
+        self.lock.acquire()
+
+        try:
+            handle = file(self.info_path, 'a')
+            handle.write(line + '\n')
+            handle.close()
+            self.revision += 1
+        finally:
+            self.lock.release()
+
+    def append_removed(self, key, obsolete):
+        '''append a line that removes the entries identified by key to the
+        info file, obsolete is the number of lines that are not needed
+        anymore, compact the file in background if there are too many'''
+        self.lock.acquire()
+
+        try:
+            self.append_info(REMOVED_MARK + key)
+            self.obsolete += obsolete + 1
+            compact = not self.compacting and \
+                self.obsolete > self.COMPACT_LINES and \
+                self.obsolete > len(self.info_lines())
+
+            if compact:
+                self.compacting = True
+        finally:
+            self.lock.release()
+
+        if compact:
+            thread = threading.Thread(target=self.compact)
+            thread.setDaemon(True)
+            thread.start()
+
+    def compact(self):
+        '''rewrite the info file with the live entries only, the file is
+        written without holding the lock, if the entries changed meanwhile
+        it's written again holding it'''
+        temp_path = self.info_path + '.tmp'
+
+        self.lock.acquire()
+
+        try:
+            lines = self.info_lines()
+            revision = self.revision
+        finally:
+            self.lock.release()
+
+        self.write_lines(temp_path, lines)
+        self.lock.acquire()
+
+        try:
+            if revision != self.revision:
+                self.write_lines(temp_path, self.info_lines())
+
+            replace_file(temp_path, self.info_path)
+            self.obsolete = 0
+            self.revision += 1
+            self.compacting = False
+        finally:
+            self.lock.release()
+
+    def write_lines(self, path, lines):
+        '''write lines to path adding the line breaks'''
+        handle = file(path, 'w')
+        handle.write(''.join([line + '\n' for line in lines]))
+        handle.close()
+
+    def store(self, source):
+        '''write the content of the file like object source to the cache
+        with its hash as name, the content is hashed while it's written to a
+        temporary file that is renamed when complete, return the hash'''
+        (handle, temp_path) = tempfile.mkstemp(prefix='.', dir=self.path)
+        handle = os.fdopen(handle, 'wb')
+        sha = hashlib.sha1()
+
+        try:
+            try:
+                chunk = source.read(BUFFER_SIZE)
+
+                while chunk:
+                    sha.update(chunk)
+                    handle.write(chunk)
+                    chunk = source.read(BUFFER_SIZE)
+            finally:
+                handle.close()
+        except:
+            os.remove(temp_path)
+            raise
+
+        hash_ = sha.hexdigest()
+        path = os.path.join(self.path, hash_)
+
+        if self.link_stored(hash_, path):
+            os.remove(temp_path)
+        else:
+            os.chmod(temp_path, FILE_MODE)
+            replace_file(temp_path, path)
+
+        return hash_
+
+    def store_path(self, source_path):
+        '''store the file at source_path on the cache, see store, return the
+        hash or None if the file can't be read'''
+        if not os.access(source_path, os.R_OK):
+            return None
+
+        handle = file(source_path, 'rb')
+
+        try:
+            return self.store(handle)
+        finally:
+            handle.close()
+
+    def link_file(self, name, target):
+        '''make name on the cache point to the file named target on the
+        cache, a hard link is used if possible, a copy otherwise'''
+        path = os.path.join(self.path, name)
+        target_path = os.path.join(self.path, target)
+        temp_path = path + '.tmp'
+
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        try:
+            os.link(target_path, temp_path)
+        except (AttributeError, OSError):
+            shutil.copy2(target_path, temp_path)
+
+        replace_file(temp_path, path)
+
+    def link_stored(self, hash_, path):
+        '''create path as a link to the file with hash_ of other cache if the
+        manager has one, return True if path exists after the call, if False
+        the caller has to write the file'''
+        if os.path.exists(path):
+            return True
+
+        return self.manager is not None and self.manager.link(hash_, path)
+
+    def notify_added(self, hash_):
+        '''tell the manager that hash_ was added to this cache'''
+        if self.manager is not None:
+            self.manager.added(self, hash_)
+
+    def notify_removed(self, hash_):
+        '''tell the manager that hash_ was removed from this cache'''
+        if self.manager is not None:
+            self.manager.removed(self, hash_)
+
+    def notify_lookup(self, hash_, found):
+        '''tell the manager that hash_ was looked up on this cache'''
+        if self.manager is not None:
+            self.manager.accessed(hash_, found)
+
+    @abc.abstractmethod
+    def hash_list(self):
+        '''return a list of the hashes of the files on the cache
+        '''
+        pass
+
+    @abc.abstractmethod
+    def info_lines(self):
+        '''return the lines of the info file that describe the live
+        entries, without line breaks, used to compact the info file
+        '''
+        pass
+
     @abc.abstractmethod
     def parse(self):
         '''parse the file that contains the dir information and return it
@@ -1,23 +1,75 @@
 '''a module to handle caches for users'''
+import os
+import time
 
 from AvatarCache import AvatarCache
 from EmoticonCache import EmoticonCache
 
+class StoredFile(object):
+    '''the information the manager keeps about each file, a file with the
+    same hash on many caches is stored once and linked from each cache'''
+
+    def __init__(self, size, access):
+        '''constructor'''
+        self.size = size
+        # the time of the last access and the number of accesses, used to
+        # choose the files to evict
+        self.access = access
+        self.count = 0
+        # the caches that have the file
+        self.caches = set()
+
 class CacheManager(object):
     '''a cache manager class
+
+    the manager links the files with the same hash on different caches so
+    they are stored once, and removes the least recently used ('lru') or
+    least frequently used ('lfu') files from all the caches when the size
+    or the number of the stored files is over the budget
     '''
 
-    def __init__(self, base_path):
+    # default budget, None means no limit
+    MAX_BYTES = 100 * 1024 * 1024
+    MAX_FILES = 20000
+    # when the budget is exceeded files are evicted until the size and the
+    # number of files are below this fraction of the budget
+    LOW_WATER = 0.9
+
+    def __init__(self, base_path, max_bytes=MAX_BYTES, max_files=MAX_FILES,
+            policy='lru'):
         '''constructor
 
         base_path -- the base directory where the caches will be created
+        max_bytes -- the maximum size of the stored files, None for no limit
+        max_files -- the maximum number of stored files, None for no limit
+        policy -- 'lru' or 'lfu', how to choose the files to evict
         '''
 
         self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+        if policy == 'lfu':
+            self.eviction_key = lambda stored: (stored.count, stored.access)
+        elif policy == 'lru':
+            self.eviction_key = lambda stored: stored.access
+        else:
+            raise ValueError('unknown eviction policy: ' + str(policy))
 
         self.avatars = {}
         self.emoticons = {}
 
+        # hash -> StoredFile
+        self.files = {}
+        self.bytes = 0
+
+        # counters, see stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.linked = 0
+
     def get_avatar_cache(self, account):
         '''return an AvatarCache instance for account
         if account cache doesn't exist create it
@@ -26,6 +78,7 @@ class CacheManager(object):
             return self.avatars[account]
 
         self.avatars[account] = AvatarCache(self.base_path, account)
+        self.__register(self.avatars[account])
         return self.avatars[account]
 
     def get_emoticon_cache(self, account):
@@ -36,5 +89,134 @@ class CacheManager(object):
             return self.emoticons[account]
 
         self.emoticons[account] = EmoticonCache(self.base_path, account)
+        self.__register(self.emoticons[account])
         return self.emoticons[account]
 
+    def __register(self, cache):
+        '''add the files of a new cache to the stored files'''
+        cache.manager = self
+
+        for hash_ in cache.hash_list():
+            self.__add_file(cache, hash_, None)
+
+        self.__evict(None)
+
+    def __add_file(self, cache, hash_, access):
+        '''add cache to the caches that have the file with hash_, access is
+        the time of the access or None to use the modification time of the
+        file, return False if the file doesn't exist'''
+        stored = self.files.get(hash_, None)
+
+        if stored is None:
+            try:
+                stat = os.stat(os.path.join(cache.path, hash_))
+            except OSError:
+                return False
+
+            if access is None:
+                access = stat.st_mtime
+
+            stored = StoredFile(stat.st_size, access)
+            self.files[hash_] = stored
+            self.bytes += stored.size
+        elif access is not None:
+            stored.access = access
+
+        stored.caches.add(cache)
+        return True
+
+    def link(self, hash_, path):
+        '''create path as a link to the stored file with hash_, return True
+        on success'''
+        stored = self.files.get(hash_, None)
+
+        if stored is None or not hasattr(os, 'link'):
+            return False
+
+        for cache in stored.caches:
+            try:
+                os.link(os.path.join(cache.path, hash_), path)
+                self.linked += 1
+                return True
+            except OSError:
+                pass
+
+        return False
+
+    def added(self, cache, hash_):
+        '''called by the caches when a file is added'''
+        if self.__add_file(cache, hash_, time.time()):
+            self.__evict(hash_)
+
+    def removed(self, cache, hash_):
+        '''called by the caches when a file is removed'''
+        stored = self.files.get(hash_, None)
+
+        if stored is None:
+            return
+
+        stored.caches.discard(cache)
+
+        if not stored.caches:
+            del self.files[hash_]
+            self.bytes -= stored.size
+
+    def accessed(self, hash_, found):
+        '''called by the caches when a file is looked up'''
+        stored = self.files.get(hash_, None)
+
+        if found and stored is not None:
+            self.hits += 1
+            stored.access = time.time()
+            stored.count += 1
+        else:
+            self.misses += 1
+
+    def __over_budget(self, fraction):
+        '''return True if the stored files use more than fraction of the
+        budget'''
+        return (self.max_bytes is not None and
+                self.bytes > self.max_bytes * fraction) or \
+            (self.max_files is not None and
+                len(self.files) > self.max_files * fraction)
+
+    def __evict(self, keep):
+        '''remove files from all the caches until the budget is respected,
+        the file with hash keep is not removed'''
+        if not self.__over_budget(1.0):
+            return
+
+        candidates = [(self.eviction_key(stored), hash_) for
+            (hash_, stored) in self.files.iteritems() if hash_ != keep]
+        candidates.sort()
+
+        for (key, hash_) in candidates:
+            if not self.__over_budget(self.LOW_WATER):
+                break
+
+            stored = self.files[hash_]
+
+            for cache in list(stored.caches):
+                cache.remove(hash_)
+                # in case the cache didn't have it on its index
+                self.removed(cache, hash_)
+
+            self.evictions += 1
+            self.evicted_bytes += stored.size
+
+    def stats(self):
+        '''return a dict with the number of lookups that found the file
+        (hits) and that didn't (misses), the hit rate, the number and size
+        of the stored files, the number of files and bytes evicted and the
+        number of files that were linked instead of stored again'''
+        lookups = self.hits + self.misses
+
+        if lookups:
+            hit_rate = float(self.hits) / lookups
+        else:
+            hit_rate = 0.0
+
+        return {'hits': self.hits, 'misses': self.misses,
+            'hit_rate': hit_rate, 'files': len(self.files),
+            'bytes': self.bytes, 'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes, 'linked': self.linked}
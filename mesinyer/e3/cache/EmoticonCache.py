@@ -3,10 +3,19 @@
 import Cache
 
 import os
-import time
-import shutil
 import urllib
 
+def quote_shortcut(shortcut):
+    '''return shortcut quoted to be written on the info file, a leading
+    REMOVED_MARK is quoted too so the line isn't read as a removal'''
+    quoted = urllib.quote(shortcut, safe='')
+
+    if quoted.startswith(Cache.REMOVED_MARK):
+        quoted = '%%%02X' % ord(Cache.REMOVED_MARK) + \
+            quoted[len(Cache.REMOVED_MARK):]
+
+    return quoted
+
 class EmoticonCache(Cache.Cache):
     '''a class to maintain a cache of an user emoticons
     '''
@@ -19,26 +28,63 @@ class EmoticonCache(Cache.Cache):
         Cache.Cache.__init__(self, os.path.join(config_path,
             user.strip().replace('@', '-at-')), 'emoticons', True)
 
+        # the index, shortcut -> hash and hash -> set of shortcuts
+        lines = self.read_info()
+        self.emotes = self.parse_lines(lines)
+        self.hashes = {}
+
+        for (shortcut, hash_) in self.emotes.iteritems():
+            self.hashes.setdefault(hash_, set()).add(shortcut)
+
+        self.obsolete = len(lines) - len(self.emotes)
+
     def parse(self):
         '''parse the file that contains the dir information
         return a dictionary with the emoticon as key and the hash as value
         if an emoticon is more than once on the file the last will be returned
         '''
+        return self.parse_lines(self.read_info())
+
+    def parse_lines(self, lines):
+        '''return a dictionary with the emoticon as key and the hash as value
+        from the lines of the information file'''
         emotes = {}
-        with file(self.info_path) as handle:
-            for line in handle.readlines():
+
+        for line in lines:
+            if line.startswith(Cache.REMOVED_MARK):
+                removed = line[len(Cache.REMOVED_MARK):].strip()
+
+                for (shortcut, hash_) in emotes.items():
+                    if hash_ == removed:
+                        del emotes[shortcut]
+            else:
                 shortcut, hash_ = line.split(' ', 1)
                 shortcut = urllib.unquote(shortcut)
                 emotes[shortcut] = hash_.strip()
 
         return emotes
 
+    def hash_list(self):
+        '''return a list of the hashes of the files on the cache'''
+        return self.hashes.keys()
+
+    def info_lines(self):
+        '''return the lines of the info file that describe the live
+        entries'''
+        return ['%s %s' % (quote_shortcut(shortcut), hash_) for
+            (shortcut, hash_) in self.emotes.iteritems()]
+
     def list(self):
         '''return a list of the elements on the cache directory as tuples
         (emoticon, hash), duplicated shortcuts will be removed and the last
         appearance of the shortcut will be returned
         '''
-        return self.parse().items()
+        self.lock.acquire()
+
+        try:
+            return self.emotes.items()
+        finally:
+            self.lock.release()
 
     def insert(self, item):
         '''insert a new item into the cache
@@ -46,13 +92,11 @@ class EmoticonCache(Cache.Cache):
         item -- a tuple containing the shortcut and the path to an image
         '''
         shortcut, path = item
-        hash_ = Cache.get_file_path_hash(path)
+        hash_ = self.store_path(path)
 
         if hash_ is None:
             return None
 
-        new_path = os.path.join(self.path, hash_)
-        shutil.copy2(path, new_path)
         return self.__add_entry(shortcut, hash_)
 
     def insert_raw(self, item):
@@ -63,15 +107,7 @@ class EmoticonCache(Cache.Cache):
         shortcut, image = item
         position = image.tell()
         image.seek(0)
-        hash_ = Cache.get_file_hash(image)
-
-        if hash_ is None:
-            return None
-
-        path = os.path.join(self.path, hash_)
-        image.seek(0)
-        handle = file(path, 'w')
-        handle.write(image.read())
+        hash_ = self.store(image)
 
         image.seek(position)
         return self.__add_entry(shortcut, hash_)
@@ -80,37 +116,65 @@ class EmoticonCache(Cache.Cache):
         '''add an entry to the information file with the current timestamp
         and the hash_ of the file that was saved
         '''
-        time_info = int(time.time())
-        handle = file(self.info_path, 'a')
-        handle.write('%s %s\n' % (urllib.quote(shortcut), hash_))
-        handle.close()
+        # the hash the shortcut pointed to if no shortcut uses it anymore
+        unused_hash = None
+        self.lock.acquire()
+
+        try:
+            self.append_info('%s %s' % (quote_shortcut(shortcut), hash_))
+            old_hash = self.emotes.get(shortcut, None)
+
+            if old_hash is not None:
+                # the line that added the shortcut before is not needed
+                self.obsolete += 1
+
+            if old_hash is not None and old_hash != hash_:
+                self.hashes[old_hash].discard(shortcut)
+
+                if not self.hashes[old_hash]:
+                    del self.hashes[old_hash]
+                    unused_hash = old_hash
+                    Cache.remove_file(os.path.join(self.path, unused_hash))
+
+            self.emotes[shortcut] = hash_
+            self.hashes.setdefault(hash_, set()).add(shortcut)
+        finally:
+            self.lock.release()
+
+        self.notify_added(hash_)
+
+        if unused_hash is not None:
+            self.notify_removed(unused_hash)
 
         return shortcut, hash_
 
     def __remove_entry(self, hash_to_remove):
-        '''remove an entry from the information file
-        since self.list() removes duplicated shortcuts this will purge
-        duplicated shortcuts.
+        '''remove the shortcuts of hash_to_remove from the index and mark them
+        as removed on the information file
         '''
-        entries = self.list()
+        self.lock.acquire()
+
+        try:
+            shortcuts = self.hashes.pop(hash_to_remove, ())
 
-        handle = file(self.info_path, 'w')
+            for shortcut in shortcuts:
+                del self.emotes[shortcut]
 
-        for stamp, hash_ in entries:
-            if hash_ != hash_to_remove:
-                handle.write('%s %s\n' % (str(stamp), hash_))
+            self.append_removed(hash_to_remove, len(shortcuts))
+        finally:
+            self.lock.release()
 
-        handle.close()
+        self.notify_removed(hash_to_remove)
 
     def remove(self, item):
         '''remove an item from cache
         return True on success False otherwise
         item -- the name of the image to remove
         '''
-        if item not in self:
+        if item not in self.hashes:
             return False
 
-        os.remove(os.path.join(self.path, item))
+        Cache.remove_file(os.path.join(self.path, item))
         self.__remove_entry(item)
         return True
 
@@ -118,5 +182,8 @@ class EmoticonCache(Cache.Cache):
         '''return True if name is in cache, False otherwise
         this method is used to do something like
         if 'lolw00t' in cache: asd()
+        the answer comes from the index, the disk is not accessed
         '''
-        return os.path.isfile(os.path.join(self.path, name))
+        found = name in self.hashes
+        self.notify_lookup(name, found)
+        return found
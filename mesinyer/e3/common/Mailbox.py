@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+'''a queue of tagged items that can be waited on with select'''
+
+#   This file is part of emesene.
+#
+#    Emesene is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    emesene is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with emesene; if not, write to the Free Software
+#    Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import time
+import Queue
+import socket
+import threading
+import collections
+
+def socket_pair():
+    '''return a pair of connected non blocking sockets, used to wake up a
+    select call from other threads'''
+    if hasattr(socket, 'socketpair'):
+        reader, writer = socket.socketpair()
+    else:
+        # windows doesn't have socketpair and can't select on pipes
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        writer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        writer.connect(server.getsockname())
+        reader = server.accept()[0]
+        server.close()
+
+    reader.setblocking(False)
+    writer.setblocking(False)
+
+    return (reader, writer)
+
+class Mailbox(object):
+    '''a thread safe queue of (tag, item) tuples, it allows a thread to wait
+    on many sources at the same time instead of polling a queue for each one.
+
+    fileno() returns a socket that is readable while the mailbox is not
+    empty, so the mailbox can be passed to select or to gobject.io_add_watch
+    '''
+
+    def __init__(self):
+        '''class constructor'''
+        # (tag, item, time when it was added) tuples
+        self.items = collections.deque()
+        self.condition = threading.Condition(threading.Lock())
+
+        # counters, see stats
+        self.max_size = 0
+        self.delivered = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+        # created on the first call to fileno
+        self._reader = None
+        self._writer = None
+
+    def put(self, tag, item):
+        '''add item to the mailbox, tag identifies the source of the item'''
+        self.condition.acquire()
+
+        try:
+            self.items.append((tag, item, time.time()))
+            size = len(self.items)
+
+            if size > self.max_size:
+                self.max_size = size
+
+            if size == 1:
+                self.condition.notify()
+
+                if self._writer is not None:
+                    self._notify_fd()
+        finally:
+            self.condition.release()
+
+    def get(self, block=True, timeout=None):
+        '''remove and return a (tag, item) tuple from the mailbox, the
+        arguments have the same meaning than the ones on Queue.Queue.get'''
+        self.condition.acquire()
+
+        try:
+            if block and timeout is None:
+                while not self.items:
+                    self.condition.wait()
+            elif block:
+                end = time.time() + timeout
+
+                while not self.items:
+                    remaining = end - time.time()
+
+                    if remaining <= 0.0:
+                        break
+
+                    self.condition.wait(remaining)
+
+            if not self.items:
+                raise Queue.Empty()
+
+            (tag, item, stamp) = self.items.popleft()
+
+            if not self.items and self._reader is not None:
+                self._clear_fd()
+
+            wait = time.time() - stamp
+            self.delivered += 1
+            self.total_wait += wait
+
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+            return (tag, item)
+        finally:
+            self.condition.release()
+
+    def slot(self, tag):
+        '''return an object with a put method that adds items with tag to
+        this mailbox, it can be used where a Queue.Queue was used to send
+        items'''
+        return MailboxSlot(self, tag)
+
+    def qsize(self):
+        '''return the number of items on the mailbox'''
+        return len(self.items)
+
+    def empty(self):
+        '''return True if the mailbox is empty'''
+        return not self.items
+
+    def stats(self):
+        '''return a dict with the current number of items, the maximum number
+        of items, the number of items delivered and the mean and maximum time
+        in seconds that an item waited on the mailbox'''
+        if self.delivered:
+            mean_wait = self.total_wait / self.delivered
+        else:
+            mean_wait = 0.0
+
+        return {'size': len(self.items), 'max_size': self.max_size,
+            'delivered': self.delivered, 'mean_wait': mean_wait,
+            'max_wait': self.max_wait}
+
+    def fileno(self):
+        '''return a file descriptor that is readable while there are items
+        on the mailbox'''
+        self.condition.acquire()
+
+        try:
+            if self._reader is None:
+                self._reader, self._writer = socket_pair()
+
+                if self.items:
+                    self._notify_fd()
+
+            return self._reader.fileno()
+        finally:
+            self.condition.release()
+
+    def close(self):
+        '''close the sockets created by fileno, the mailbox can still be
+        used but it will create new ones if fileno is called again'''
+        self.condition.acquire()
+
+        try:
+            if self._reader is not None:
+                self._reader.close()
+                self._writer.close()
+                self._reader = None
+                self._writer = None
+        finally:
+            self.condition.release()
+
+    def _notify_fd(self):
+        '''make the reading side readable'''
+        try:
+            self._writer.send('x')
+        except socket.error:
+            pass
+
+    def _clear_fd(self):
+        '''make the reading side not readable'''
+        try:
+            while self._reader.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+class MailboxSlot(object):
+    '''an object that adds the items it receives to a Mailbox with a fixed
+    tag'''
+
+    def __init__(self, mailbox, tag):
+        '''class constructor'''
+        self.mailbox = mailbox
+        self.tag = tag
+
+    def put(self, item, block=True, timeout=None):
+        '''add the item to the mailbox, block and timeout are there for
+        compatibility with Queue.Queue'''
+        self.mailbox.put(self.tag, item)
+
+    put_nowait = put
@@ -5,7 +5,12 @@ import Signal
 class Signals(object):
     '''a class that conversats e3 signals into gui.Signal'''
 
+    # maximum number of events emitted on each call to _handle_events, so a
+    # burst of events doesn't block the main loop
+    BATCH_SIZE = 100
+
     def __init__(self, events, event_queue):
+        '''event_queue is a e3.common.Mailbox with the Event objects'''
         self.events = events
         self.event_queue = event_queue
         self.event_names = tuple(sorted(events))
@@ -14,16 +19,29 @@ class Signals(object):
             event = event.replace(' ', '_')
             setattr(self, event, Signal.Signal())
 
-    def _handle_events(self):
-        '''convert Event object on the queue to gui.Signal'''
-        while True:
-            try:
-                event = self.event_queue.get(False)
+    def fileno(self):
+        '''return a file descriptor that is readable while there are events
+        to handle, to be used with gobject.io_add_watch'''
+        return self.event_queue.fileno()
+
+    def stats(self):
+        '''return a dict with the number of pending events and the time the
+        events waited to be emitted, see e3.common.Mailbox.stats'''
+        return self.event_queue.stats()
 
-                if event.id_ < len(self.event_names):
-                    event_name = self.event_names[event.id_].replace(' ', '_')
-                    signal = getattr(self, event_name)
-                    signal.emit(*event.args)
+    def _handle_events(self, *args):
+        '''convert Event object on the queue to gui.Signal, at most BATCH_SIZE
+        events are handled, args are ignored so it can be used as callback of
+        gobject.timeout_add and gobject.io_add_watch'''
+        for index in xrange(self.BATCH_SIZE):
+            try:
+                event = self.event_queue.get(False)[1]
             except Queue.Empty:
                 break
+
+            if event.id_ < len(self.event_names):
+                event_name = self.event_names[event.id_].replace(' ', '_')
+                signal = getattr(self, event_name)
+                signal.emit(*event.args)
+
         return True
@@ -9,6 +9,7 @@ from utils import *
 from Config import Config
 from Signal import Signal
 from Signals import Signals
+from Mailbox import Mailbox
 from ConfigDir import ConfigDir
 from MessageFormatter import MessageFormatter
 
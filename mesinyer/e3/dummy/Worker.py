@@ -19,11 +19,9 @@ class Worker(e3.Worker):
     def run(self):
         '''main method, block waiting for data, process it, and send data back
         '''
-        data = None
-
         while True:
             try:
-                action = self.session.actions.get(True, 0.1)
+                action = self.session.inbox.get()[1]
 
                 if action.id_ == e3.Action.ACTION_QUIT:
                     dbg('closing thread', 'dworker', 1)
@@ -2,6 +2,8 @@ import sys
 import time
 import xmpp
 import Queue
+import socket
+import select
 
 import e3
 
@@ -39,14 +41,14 @@ class Worker(e3.Worker):
     def run(self):
         '''main method, block waiting for data, process it, and send data back
         '''
-        data = None
-
         while True:
-            if hasattr(self.client, 'Process'):
-                self.client.Process(1)
+            self._wait()
+
+            if self.client.isConnected():
+                self.client.Process(0)
 
             try:
-                action = self.session.actions.get(True, 0.1)
+                action = self.session.inbox.get(False)[1]
 
                 if action.id_ == e3.Action.ACTION_QUIT:
                     dbg('closing thread', 'yworker', 1)
@@ -57,6 +59,23 @@ class Worker(e3.Worker):
             except Queue.Empty:
                 pass
 
+    def _wait(self):
+        '''block until there is something on the session inbox or data to
+        read from the server'''
+        readers = [self.session.inbox]
+
+        if self.client.isConnected():
+            if self.client.Connection.pending_data(0):
+                return
+
+            readers.append(self.client.Connection._sock)
+
+        try:
+            select.select(readers, [], [])
+        except (select.error, socket.error):
+            # the connection was closed, Process will notice it
+            pass
+
     def _on_presence(self, client, presence):
         '''handle the reception of a presence message'''
         message = presence.getStatus() or ''
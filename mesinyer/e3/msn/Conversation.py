@@ -1,6 +1,3 @@
-import Queue
-import threading
-
 import e3
 import MsnMessage
 import p2p.Manager
@@ -9,18 +6,17 @@ from MsnHttpSocket import MsnHttpSocket
 
 from debugger import dbg
 
-class Conversation(threading.Thread):
-    '''a thread that handles a conversation'''
+class Conversation(object):
+    '''an object that handles a conversation, the commands received on the
+    switchboard socket are processed on the reactor thread'''
     (STATUS_PENDING, STATUS_CONNECTED, STATUS_ESTABLISHED, STATUS_CLOSED,
     STATUS_ERROR) = range(5)
 
     def __init__(self, session, cid, host, port, account,
-        session_id, p2p_input, auth_id=None, proxy=None, use_http=False):
+        session_id, p2p_input, auth_id=None, proxy=None, use_http=False,
+        reactor=None):
         '''class constructor, create a socket and connect it to the specified
-        server'''
-        threading.Thread.__init__(self)
-        self.setDaemon(True)
-
+        server, reactor is the Reactor that handles the switchboard socket'''
         self.use_http = use_http
         if proxy is None:
             self.proxy = e3.Proxy()
@@ -34,6 +30,7 @@ class Conversation(threading.Thread):
         self.account = account
         self.auth_id = auth_id
         self.session_id = session_id
+        self.reactor = reactor
         self.socket = self._get_socket(host, port)
 
         self.status = Conversation.STATUS_PENDING
@@ -48,9 +45,6 @@ class Conversation(threading.Thread):
 
         self.p2p_input = p2p_input
 
-        # this queue receives a Command object
-        self.command_queue = Queue.Queue()
-
         self._handlers = {}
         self.members = []
         # messages that are requested to be sent before we are ready to do it
@@ -85,37 +79,24 @@ class Conversation(threading.Thread):
         else:
             self._on_unknown_command(message)
 
-    def run(self):
-        '''the main method of the thread'''
+    def start(self):
+        '''start the connection with the switchboard'''
         self.socket.start()
-        data = None
-
-        while True:
-            try:
-                data = self.socket.output.get(True, 0.1)
 
-                if type(data) == int and data == 0:
-                    self._close()
-                    break
-                else:
-                    self._process(data)
-            except Queue.Empty:
-                pass
+    def quit(self):
+        '''close the conversation'''
+        self._close()
 
-            try:
-                cmd = self.command_queue.get(True, 0.1)
-
-                if cmd == 'quit':
-                    self._close()
-                    break
-
-                self.socket.send_command(cmd.command, cmd.params, cmd.payload)
-            except Queue.Empty:
-                pass
+    def _on_socket_output(self, data):
+        '''called with every command received on the socket'''
+        if type(data) == int and data == 0:
+            self._close()
+        else:
+            self._process(data)
 
     def _close(self):
         '''set all the attributes to reflect a closed conversation
-        caution: it doesn't stop the main thread'''
+        and close the socket'''
         dbg('closing conversation', 'conv', 1)
         self.status = Conversation.STATUS_CLOSED
         self.started = False
@@ -365,8 +346,10 @@ class Conversation(threading.Thread):
         return a socket according to the proxy settings
         """
         if self.proxy.use_proxy or self.use_http:
-            socket = MsnHttpSocket(host, port, dest_type='SB', proxy=self.proxy)
+            socket = MsnHttpSocket(host, port, dest_type='SB', proxy=self.proxy,
+                reactor=self.reactor)
         else:
-            socket = MsnSocket(host, port)
+            socket = MsnSocket(host, port, reactor=self.reactor)
 
+        socket.handler = self._on_socket_output
         return socket
@@ -14,9 +14,9 @@ class MsnHttpSocket(threading.Thread):
     output queue, the data to be sent is added to the input queue'''
 
     def __init__(self, dest_ip='messenger.hotmail.com', port_unused=1863,
-        dest_type='SB', proxy=None):
-        '''class contructor, port_unused is unused (duh!) but there for
-        API compatibility with MsnSocket'''
+        dest_type='SB', proxy=None, reactor=None):
+        '''class contructor, port_unused and reactor are unused (duh!) but
+        there for API compatibility with MsnSocket'''
         threading.Thread.__init__(self)
         self.setDaemon(True)
         self.tid = 1
@@ -54,12 +54,19 @@ class MsnHttpSocket(threading.Thread):
         
         self.input = Queue.Queue()
         self.output = Queue.Queue()
+        # if set, called with each received command instead of putting it
+        # on the output queue (see MsnSocket)
+        self.handler = None
         self.setDaemon(True)
 
     def send(self, data):
         '''add data to the input queue'''
         self.input.put(data)
 
+    def quit(self):
+        '''close the thread'''
+        self.send('quit')
+
     def send_command(self, command, params=None, payload=None):
         '''send command to the socket appending the tid and incrementing it, 
         append the parameters if not None'''
@@ -187,4 +194,7 @@ class MsnHttpSocket(threading.Thread):
 
                     command.payload, tail = tail[:size], tail[size:]
 
-                self.output.put(command)
+                if self.handler is None:
+                    self.output.put(command)
+                else:
+                    self.handler(command)
@@ -10,11 +10,15 @@ class MsnSocket(Socket.Socket):
     '''a socket object specialized to be used to connecto with the msn network
     '''
 
-    def __init__(self, host='messenger.hotmail.com', port=1863, *args, **kwds):
+    def __init__(self, host='messenger.hotmail.com', port=1863, reactor=None,
+            *args, **kwds):
         '''class constructor, args is there to be compatible with 
         MsnHttpSocket constructor'''
-        Socket.Socket.__init__(self, host, port)
+        Socket.Socket.__init__(self, host, port, reactor)
         self.tid = 1
+        # a command that is waiting for its payload to be received
+        self.pending_command = None
+        self.pending_size = 0
 
     def send_command(self, command, params=None, payload=None):
         '''send command to the socket appending the tid and incrementing it, 
@@ -37,10 +41,14 @@ class MsnSocket(Socket.Socket):
         self.tid += 1
     
     def _receive(self):
-        '''receive data from the socket'''
-        data = self._readline()
-        # if we got something add it to the output queue
-        if data:
+        '''get the next command from the received data, return True if there
+        was a complete one'''
+        if self.pending_command is None:
+            data = self._readline()
+
+            if not data:
+                return False
+
             command = Command.Command.parse(data)
 
             if command.command in common.PAYLOAD_CMDS:
@@ -51,12 +59,28 @@ class MsnSocket(Socket.Socket):
                         size = int(command.tid)
                     else:
                         size = int(command.params[position])
-                    command.payload = self.receive_fixed_size(size)
                 except ValueError:
                     # For commands such as ADL and RML
-                    pass
+                    size = None
+
+                if size:
+                    self.pending_command = command
+                    self.pending_size = size
+                elif size == 0:
+                    command.payload = ''
+            
+            if self.pending_command is None:
+                self._put(command)
+                return True
+
+        payload = self.receive_fixed_size(self.pending_size)
 
-            self.output.put(command)
-            return True
-        return False
+        if payload is None:
+            # wait until the whole payload is received
+            return False
 
+        command = self.pending_command
+        command.payload = payload
+        self.pending_command = None
+        self._put(command)
+        return True
@@ -0,0 +1,134 @@
+'''defines a thread that handles the input and output of many sockets using a
+single select call'''
+
+import errno
+import Queue
+import select
+import threading
+import traceback
+
+from e3.common.Mailbox import Mailbox
+from debugger import dbg
+
+class Reactor(threading.Thread):
+    '''a thread that waits until one of the registered sockets can be read or
+    written or until another thread wakes it up, and then calls the
+    handle_read, handle_write or handle_connect method of the socket.
+
+    the sockets must provide fileno(), writable(), connecting(),
+    handle_connect(), handle_read(), handle_write() and handle_close()'''
+
+    def __init__(self):
+        '''class constructor'''
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+
+        # fileno -> socket, only modified from the reactor thread
+        self.sockets = {}
+        # callables that must run on the reactor thread, it is readable
+        # by select while it is not empty
+        self.calls = Mailbox()
+        self._quit = False
+
+    def add(self, sock):
+        '''start handling sock, can be called from any thread'''
+        self.call(self._add, sock)
+
+    def remove(self, sock):
+        '''stop handling sock, can be called from any thread'''
+        self.call(self._remove, sock)
+
+    def call(self, function, *args):
+        '''run function(*args) on the reactor thread'''
+        self.calls.put('call', (function, args))
+
+    def wakeup(self):
+        '''wake up the reactor thread so it checks the sockets that have
+        something to write'''
+        if self.calls.empty():
+            self.calls.put('wakeup', None)
+
+    def quit(self):
+        '''stop the reactor once the sockets have sent all their data'''
+        self.call(self._set_quit)
+
+    def run(self):
+        '''the main method of the reactor, block until a socket is ready or
+        we are woken up and dispatch the events'''
+        while True:
+            self._run_calls()
+
+            if self._quit and not [sock for sock in self.sockets.values()
+                    if sock.writable()]:
+                break
+
+            readers = [self.calls]
+            writers = []
+
+            for sock in self.sockets.itervalues():
+                if sock.connecting() or sock.writable():
+                    writers.append(sock)
+
+                if not sock.connecting():
+                    readers.append(sock)
+
+            try:
+                (iwtd, owtd) = select.select(readers, writers, [])[:2]
+            except select.error, error:
+                if error.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for sock in owtd:
+                if self.sockets.get(sock.fileno()) is not sock:
+                    continue
+
+                if sock.connecting():
+                    self._dispatch(sock.handle_connect)
+                else:
+                    self._dispatch(sock.handle_write)
+
+            for sock in iwtd:
+                if sock is not self.calls and \
+                        self.sockets.get(sock.fileno()) is sock:
+                    self._dispatch(sock.handle_read)
+
+        dbg('closing reactor thread', 'reactor', 1)
+
+        for sock in self.sockets.values():
+            sock.handle_close()
+
+    def _run_calls(self):
+        '''run the callables added with call'''
+        while True:
+            try:
+                tag, call = self.calls.get(False)
+            except Queue.Empty:
+                break
+
+            if tag == 'call':
+                function, args = call
+                self._dispatch(function, *args)
+
+    def _dispatch(self, function, *args):
+        '''call function(*args), an error on a handler must not stop the
+        reactor since it would stop all the other sockets'''
+        try:
+            function(*args)
+        except Exception:
+            dbg('error on reactor handler: ' + traceback.format_exc(),
+                'reactor', 1)
+
+    def _add(self, sock):
+        '''start handling sock'''
+        self.sockets[sock.fileno()] = sock
+
+    def _remove(self, sock):
+        '''stop handling sock'''
+        for (fileno, value) in self.sockets.items():
+            if value is sock:
+                del self.sockets[fileno]
+
+    def _set_quit(self):
+        '''set the quit flag'''
+        self._quit = True
@@ -1,130 +1,190 @@
 '''defines a class that handles the send and receive operations of a socket
-in a thread'''
+from a Reactor thread'''
 
 import Queue
+import errno
 import socket
-import select
-import StringIO
-import threading
+import collections
 
 from debugger import dbg
+from Reactor import Reactor
+from SocketBuffer import SocketBuffer
 
-class Socket(threading.Thread):
-    '''a socket that runs on a thread, it reads the data and put it on the 
-    output queue, the data to be sent is added to the input queue'''
-
-    def __init__(self, host, port):
-        '''class constructor'''
-        threading.Thread.__init__(self)
+class Socket(object):
+    '''a non blocking socket handled by a Reactor, it reads the data and put
+    it on the output queue (or pass it to the handler if set), the data to be
+    sent is added to the input queue'''
 
+    def __init__(self, host, port, reactor=None):
+        '''class constructor, if reactor is None a reactor is created and
+        started for this socket alone'''
         self.host = host
         self.port = port
 
-        self.input = Queue.Queue()
+        if reactor is None:
+            reactor = Reactor()
+            reactor.start()
+
+        self.reactor = reactor
+        # if set, called with each received item on the reactor thread
+        # instead of putting it on the output queue
+        self.handler = None
+
+        self.input = collections.deque()
         self.output = Queue.Queue()
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.setDaemon(True)
+        self.buffer = SocketBuffer()
+
+        self._fileno = self.socket.fileno()
+        self._connecting = False
+        self._closing = False
+        self._closed = False
+        # the part of the first input item that was not sent yet
+        self._pending = None
+
+    def start(self):
+        '''start connecting to host:port and register on the reactor'''
+        self.socket.setblocking(False)
+
+        try:
+            result = self.socket.connect_ex((self.host, self.port))
+        except socket.error, error:
+            # socket.gaierror if the host name can't be resolved
+            dbg('error connecting to %s:%d: %s' % (self.host, self.port,
+                error), 'sock', 1)
+            self._on_socket_error()
+            return
+
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._on_socket_error()
+            return
+
+        self._connecting = True
+        self.reactor.add(self)
 
     def send(self, data):
         '''add data to the input queue'''
-        self.input.put(data)
+        self.input.append(data)
+        self.reactor.wakeup()
 
     def quit(self):
-        '''close the thread'''
-        self.send('quit')
-
-    def run(self):
-        '''the main method of the socket, wait until there is something to 
-        send or there is something to read, if there is something to send, get 
-        it from the input Queue, wait until we can send it and send it, if 
-        there is something to read, read it and put it on the output queue'''
-        self.socket.connect((self.host, self.port))
-        input_ = None
-
-        while True:
-            # see if we can send or read something
-            (iwtd, owtd) = select.select([self], [self], [])[:2]
-
-            # if we can read, we try to read
-            if iwtd:
-                if not self._receive():
-                    # nothing received, socket closed
-                    break
-                # do not write until everything is read
-                continue
-
-            try:
-                input_ = self.input.get(True, 0.3)
-
-                if input_ == 'quit':
-                    break
-            except Queue.Empty:
-                # nothing to send
-                continue
-
-            if owtd and input_:
-                # try to get something to send, wait 0.3 seconds
-                try:
-                    self.socket.send(input_)
-                    dbg('>>> ' + str(input_), 'sock', 2)
-                except socket.error:
-                    self._on_socket_error()
-                    break
-
-        dbg('closing socket thread', 'sock', 1)
-        self.socket.close()
+        '''close the socket once all the queued data is sent'''
+        self._closing = True
+        self.reactor.wakeup()
 
     def fileno(self):
         '''method that is used by select'''
-        return self.socket.fileno()
+        return self._fileno
+
+    def connecting(self):
+        '''return True if the connection was not established yet'''
+        return self._connecting
+
+    def writable(self):
+        '''return True if there is something to send or if the socket
+        should be closed'''
+        return bool(self.input) or self._pending is not None or \
+            self._closing
+
+    def handle_connect(self):
+        '''called by the reactor when the connection finished'''
+        self._connecting = False
+        error = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+
+        if error:
+            dbg('error connecting to %s:%d: %s' % (self.host, self.port,
+                errno.errorcode.get(error, error)), 'sock', 1)
+            self._on_socket_error()
 
-    def _receive(self):
-        '''receive data from the socket'''
-        data = self._readline()
-        # if we got something add it to the output queue
-        if data:
-            dbg('<<< ' + data, 'sock', 3)
-            self.output.put(data)
-            return True
-        return False
+    def handle_write(self):
+        '''called by the reactor when the socket can be written, send as much
+        as possible from the input queue'''
+        while self._pending is not None or self.input:
+            if self._pending is None:
+                self._pending = self.input.popleft()
+                dbg('>>> ' + str(self._pending), 'sock', 2)
 
-    def _readline(self):
-        '''read until new line'''
-        output = StringIO.StringIO()
+            try:
+                sent = self.socket.send(self._pending)
+            except socket.error, error:
+                if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
 
+                self._on_socket_error()
+                return
+
+            if sent < len(self._pending):
+                self._pending = self._pending[sent:]
+                return
+
+            self._pending = None
+
+        if self._closing:
+            self.handle_close()
+
+    def handle_read(self):
+        '''called by the reactor when the socket can be read, read a chunk
+        and handle all the complete items on it'''
         try:
-            chunk = self.socket.recv(1)
-        except socket.error:
+            size = self.buffer.fill(self.socket)
+        except socket.error, error:
+            if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return True
+
             self._on_socket_error()
-            return None
+            return False
 
-        while chunk != '\n' and chunk != '':
-            output.write(chunk)
-            try:
-                chunk = self.socket.recv(1)
-            except socket.error:
-                self._on_socket_error()
+        if not size:
+            # socket closed by the other side
+            self.handle_close()
+            return False
 
-        if chunk == '\n':
-            output.write(chunk)
+        while self._receive():
+            pass
 
-        output.seek(0)
-        return output.read()
+        return True
 
-    def receive_fixed_size(self, size):
-        '''receive a fixed size of bytes, return it as string'''
-        output = StringIO.StringIO()
+    def handle_close(self):
+        '''close the socket and stop handling it'''
+        if self._closed:
+            return
 
-        while output.len < size:
-            try:
-                output.write(self.socket.recv(size - output.len))
-            except socket.error:
-                self._on_socket_error()
+        dbg('closing socket', 'sock', 1)
+        self._closed = True
+        self.reactor.remove(self)
+        self.socket.close()
 
-        output.seek(0)
+    def _receive(self):
+        '''get the next item from the received data, return True if there
+        was one'''
+        data = self._readline()
+        # if we got something add it to the output queue
+        if data:
+            dbg('<<< ' + data, 'sock', 3)
+            self._put(data)
+            return True
+        return False
+
+    def _readline(self):
+        '''return the next line or None if there is no complete line yet'''
+        return self.buffer.readline()
 
-        return output.read()
+    def receive_fixed_size(self, size):
+        '''return size bytes as string or None if they were not received
+        yet'''
+        return self.buffer.read(size)
+
+    def _put(self, data):
+        '''pass the received data to the handler or put it on the output
+        queue'''
+        if self.handler is None:
+            self.output.put(data)
+        else:
+            self.handler(data)
 
     def _on_socket_error(self):
         '''send a message that the socket was closed'''
-        self.output.put(0)
+        if not self._closed:
+            self._put(0)
+
+        self.handle_close()
@@ -0,0 +1,95 @@
+'''defines a buffer that frames the data received from a socket in lines and
+fixed size payloads'''
+
+class SocketBuffer(object):
+    '''a receive buffer that reads big chunks from a socket and hands them
+    back as lines or as fixed size blocks, this avoids reading one byte
+    at a time from the socket'''
+
+    CHUNK_SIZE = 65536
+    # compact the buffer when the consumed prefix is bigger than this
+    COMPACT_SIZE = 65536
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        '''class constructor'''
+        self.data = bytearray()
+        # position of the first byte that was not consumed yet
+        self.start = 0
+        # position where the next delimiter search should resume
+        self.scan = 0
+
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        '''return the number of bytes available to be consumed'''
+        return len(self.data) - self.start
+
+    def fill(self, sock):
+        '''read a chunk from sock into the buffer, return the number of
+        bytes read, 0 means the socket was closed, socket.error is
+        propagated to the caller'''
+        chunk = sock.recv(self.chunk_size)
+        self.data.extend(chunk)
+
+        return len(chunk)
+
+    def feed(self, data):
+        '''add data to the buffer, used when the data doesn't come from
+        a socket'''
+        self.data.extend(data)
+
+    def has_line(self, delimiter='\n'):
+        '''return True if there is a complete line on the buffer'''
+        return self._find(delimiter) != -1
+
+    def readline(self, delimiter='\n'):
+        '''return the next line including the delimiter or None if there is
+        no complete line on the buffer'''
+        index = self._find(delimiter)
+
+        if index == -1:
+            return None
+
+        return self._consume(index + len(delimiter) - self.start)
+
+    def read(self, size):
+        '''return size bytes from the buffer or None if there are not enough
+        bytes available'''
+        if len(self) < size:
+            return None
+
+        return self._consume(size)
+
+    def read_all(self):
+        '''return all the bytes available on the buffer'''
+        return self._consume(len(self))
+
+    def _find(self, delimiter):
+        '''return the position of the next delimiter or -1, the search
+        resumes where the last unsuccessful one stopped'''
+        index = self.data.find(delimiter, max(self.start, self.scan))
+
+        if index == -1:
+            # the delimiter may be split between this and the next chunk
+            self.scan = max(self.start, len(self.data) - len(delimiter) + 1)
+
+        return index
+
+    def _consume(self, size):
+        '''remove size bytes from the start of the buffer and return them
+        as a string'''
+        end = self.start + size
+        output = str(self.data[self.start:end])
+        self.start = end
+
+        if self.start == len(self.data):
+            del self.data[:]
+            self.start = 0
+            self.scan = 0
+        elif self.start > self.COMPACT_SIZE and \
+                self.start * 2 > len(self.data):
+            del self.data[:self.start]
+            self.scan = max(0, self.scan - self.start)
+            self.start = 0
+
+        return output
@@ -7,6 +7,7 @@ import urllib
 import httplib
 import urlparse
 import threading
+import collections
 
 import e3
 import mbi
@@ -17,6 +18,7 @@ import challenge
 import Requester
 import XmlManager
 import Conversation
+from Reactor import Reactor
 from MsnSocket import MsnSocket
 from MsnHttpSocket import MsnHttpSocket
 
@@ -66,10 +68,16 @@ class Worker(e3.Worker):
             self.proxy = proxy
         self.use_http = use_http
 
+        # handles the notification and all the switchboard sockets
+        self.reactor = Reactor()
+        self.reactor.start()
+
         self.socket = self._get_socket()
         self.socket.start()
 
         self.in_login = False
+        # actions received while in login, processed when it finishes
+        self.pending_actions = collections.deque()
         # the class used to create the conversation sockets, since sockets
         # or http method can be used
 
@@ -100,9 +108,15 @@ class Worker(e3.Worker):
     def _get_socket(self, host='messenger.hotmail.com', port=1863):
         '''return a socket according to the proxy settings'''
         if self.proxy.use_proxy or self.use_http:
-            socket = MsnHttpSocket(host, port, dest_type='NS', proxy=self.proxy)
+            socket = MsnHttpSocket(host, port, dest_type='NS', proxy=self.proxy,
+                reactor=self.reactor)
         else:
-            socket = MsnSocket(host, port)
+            socket = MsnSocket(host, port, reactor=self.reactor)
+
+        # the received commands are added to the session inbox tagged
+        # with the socket, so the ones from a replaced socket are ignored
+        socket.handler = lambda data: self.session.inbox.put('socket',
+            (socket, data))
         return socket
 
     def _set_handlers(self):
@@ -143,13 +157,18 @@ class Worker(e3.Worker):
 
 
     def run(self):
-        '''main method, block waiting for data, process it, and send data back
+        '''main method, block waiting for data from the socket, commands or
+        actions on the session inbox, process them, and send data back
         to the socket or add a new event to the socket depending on the data'''
-        data = None
-
         while True:
-            try:
-                data = self.socket.output.get(True, 0.1)
+            tag, item = self.session.inbox.get()
+
+            if tag == 'socket':
+                (socket, data) = item
+
+                if socket is not self.socket:
+                    # data from a socket that was replaced (XFR)
+                    continue
 
                 if type(data) == int and data == 0:
                     self.session.add_event(e3.Event.EVENT_ERROR,
@@ -158,39 +177,36 @@ class Worker(e3.Worker):
                     break
 
                 self._process(data)
-                continue
-            except Queue.Empty:
-                pass
-
-            try:
-                cmd = self.command_queue.get(True, 0.1)
-                self.socket.send_command(cmd.command, cmd.params, cmd.payload)
-            except Queue.Empty:
-                pass
+            elif tag == 'command':
+                self.socket.send_command(item.command, item.params,
+                    item.payload)
+            elif tag == 'action':
+                self.pending_actions.append(item)
 
-            if self.in_login:
-                continue
-
-            try:
-                action = self.session.actions.get(True, 0.1)
+            # actions are not processed until the login finishes
+            while self.pending_actions and not self.in_login:
+                action = self.pending_actions.popleft()
 
                 if action.id_ == e3.Action.ACTION_QUIT:
-                    dbg('closing thread', 'worker')
-                    self.socket.input.put('quit')
-                    self.session.logger.quit()
-                    self.msg_manager.quit()
+                    self._quit()
+                    return
 
-                    for (cid, conversation) in self.conversations.iteritems():
-                        conversation.command_queue.put('quit')
+                self._process_action(action)
 
-                    for (pid, transfer) in self.transfers.iteritems():
-                        transfer.add_action(e3.Action.ACTION_QUIT)
+    def _quit(self):
+        '''close the sockets and the threads of the session'''
+        dbg('closing thread', 'worker')
+        self.socket.quit()
+        self.session.logger.quit()
+        self.msg_manager.quit()
 
-                    break
+        for (cid, conversation) in self.conversations.iteritems():
+            conversation.quit()
 
-                self._process_action(action)
-            except Queue.Empty:
-                pass
+        self.reactor.quit()
+
+        for (pid, transfer) in self.transfers.iteritems():
+            transfer.add_action(e3.Action.ACTION_QUIT)
 
     def _process(self, message):
         '''process the data'''
@@ -638,7 +654,8 @@ class Worker(e3.Worker):
 
         if cid not in self.conversations:
             con = Conversation.Conversation(self.session, cid,
-                host, int(port), account, session_id, self.p2p, self.proxy)
+                host, int(port), account, session_id, self.p2p, self.proxy,
+                reactor=self.reactor)
             self.conversations[cid] = con
             con.send_presentation()
             con.invite(account)
@@ -681,7 +698,8 @@ class Worker(e3.Worker):
 
         cid = time.time()
         con = Conversation.Conversation(self.session, cid,
-            host, int(port), user, session_id, self.p2p, auth_id)
+            host, int(port), user, session_id, self.p2p, auth_id,
+            reactor=self.reactor)
         self.conversations[cid] = con
         con.answer()
         con.start()
@@ -864,7 +882,7 @@ class Worker(e3.Worker):
         '''handle e3.Action.ACTION_CLOSE_CONVERSATION
         '''
         if cid in self.conversations:
-            self.conversations[cid].command_queue.put('quit')
+            self.conversations[cid].quit()
             del self.conversations[cid]
         else:
             dbg('conversation ' + cid + ' not found', 'worker', 4)
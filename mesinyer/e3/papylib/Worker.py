@@ -21,7 +21,6 @@
 import gobject
 import hashlib
 import os
-import Queue
 import random
 import shutil
 import sys
@@ -97,18 +96,24 @@ class Worker(e3.base.Worker, papyon.Client):
         '''
         self._mainloop = gobject.MainLoop(is_running=True)
         while self._mainloop.is_running():
-            try:
-                action = self.session.actions.get(True, 0.1)
-
-                if action.id_ == Action.ACTION_QUIT:
-                    dbg('closing thread', 'dworker', 1)
-                    self.logout()
-                    self.session.logger.quit()
-                    break
-
-                self._process_action(action)
-            except Queue.Empty:
-                pass
+            tag, action = self.session.inbox.get()
+
+            if tag == 'quit':
+                # added by quit once the mainloop was quit
+                break
+
+            if action.id_ == Action.ACTION_QUIT:
+                dbg('closing thread', 'dworker', 1)
+                self.logout()
+                self.session.logger.quit()
+                break
+
+            self._process_action(action)
+
+    def quit(self):
+        '''quit the mainloop and wake up the thread so it ends'''
+        self._mainloop.quit()
+        self.session.inbox.put('quit', None)
 
     # some useful methods
     def set_initial_infos(self):
@@ -27,7 +27,8 @@ class Example(object):
 
         self.session.login(account, password, status,
             proxy, use_http_method)
-        gobject.timeout_add(500, self.session.signals._handle_events)
+        gobject.io_add_watch(self.session.signals, gobject.IO_IN,
+            self.session.signals._handle_events)
 
         self.first_contact_list_ready = True
 
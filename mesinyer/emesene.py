@@ -72,6 +72,8 @@ class Controller(object):
             self.config.d_accounts = {}
 
         self.session = None
+        # ids of the gobject watches on the mailboxes of the session
+        self._watches = []
         self._setup()
 
     def _setup(self):
@@ -101,6 +103,7 @@ class Controller(object):
         '''create a new session object'''
 
         if self.session is not None:
+            self._remove_watches()
             self.session.quit()
 
         self.session = extension.get_and_instantiate('session')
@@ -123,6 +126,18 @@ class Controller(object):
         signals.conv_first_action.unsubscribe(self.on_new_conversation)
         signals.disconnected.unsubscribe(self.on_disconnected)
 
+    def _remove_watches(self):
+        '''remove the watches on the mailboxes of the session and close
+        their sockets'''
+        for watch in self._watches:
+            gobject.source_remove(watch)
+
+        self._watches = []
+        self.session.events.close()
+
+        if self.session.logger is not None:
+            self.session.logger.output.close()
+
     def save_extensions_config(self):
         '''save the state of the extensions to the config'''
         if self.session is None:
@@ -183,6 +198,7 @@ class Controller(object):
     def close_session(self, do_exit=True):
         '''close session'''
         if self.session is not None:
+            self._remove_watches()
             self.session.quit()
 
         self.save_extensions_config()
@@ -229,7 +245,7 @@ class Controller(object):
         '''create and populate the main screen
         '''
         # clear image cache
-        utils.pixbufs = {}
+        utils.pixbufs.clear()
         self.window.clear()
         self.tray_icon.set_main(self.session)
         image_name = self.session.config.get_or_set('image_theme', 'default')
@@ -272,7 +288,11 @@ class Controller(object):
             dialog = extension.get_default('dialog')
             dialog.contact_added_you(accounts, on_contact_added_you)
 
-        gobject.timeout_add(500, self.session.logger.check)
+        # the priority is lower than the redraws, so a burst of results
+        # handled in batches doesn't freeze the ui
+        self._watches.append(gobject.io_add_watch(self.session.logger,
+            gobject.IO_IN, self.session.logger.check,
+            priority=gobject.PRIORITY_DEFAULT_IDLE))
 
     def on_preferences_changed(self, use_http, proxy, session_id):
         '''called when the preferences on login change'''
@@ -339,7 +359,11 @@ class Controller(object):
         self.session.config.get_or_set('b_show_toolbar', True)
         self.session.login(account.account, account.password, account.status,
             proxy, use_http)
-        gobject.timeout_add(500, self.session.signals._handle_events)
+        # the priority is lower than the redraws, so a burst of events
+        # handled in batches doesn't freeze the ui
+        self._watches.append(gobject.io_add_watch(self.session.signals,
+            gobject.IO_IN, self.session.signals._handle_events,
+            priority=gobject.PRIORITY_DEFAULT_IDLE))
 
     def on_new_conversation(self, cid, members, other_started=True):
         '''callback called when the other user does an action that justify
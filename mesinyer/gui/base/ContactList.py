@@ -23,6 +23,12 @@ class ContactList(object):
     '''an abstract class that defines the api that the contact list should
     have'''
 
+    # milliseconds to collect the changes of the contacts before updating
+    # them, the changes of a contact on that time cause one update
+    UPDATE_DELAY = 40
+    # the list is frozen while updating more contacts than this
+    FREEZE_UPDATES = 20
+
     def __init__(self, session, dialog):
         '''class constructor'''
 
@@ -59,6 +65,24 @@ class ContactList(object):
         self._show_blocked = self.session.config.b_show_blocked
 
         self._filter_text = ''
+        # accounts of the contacts that matched the filter text, when the
+        # text is extended only these can match the new one, so while
+        # refiltering the others are hidden without searching them
+        self._filter_matches = set()
+        self._filter_candidates = None
+
+        # group name -> [online contacts, contacts] of the groups on the
+        # list and account -> [online, names of the groups that count it],
+        # updated when the contacts are added, removed and updated
+        self._group_counts = {}
+        self._counted = {}
+
+        # account -> contact, the contacts to update on the next flush
+        self._dirty_contacts = {}
+        # name -> group, the groups to update at the end of the flush, None
+        # if there is no flush running
+        self._dirty_groups = None
+        self._flush_scheduled = False
 
         # valid values:
         # + NICK
@@ -86,7 +110,71 @@ class ContactList(object):
         if not contact:
             return
 
-        self.update_contact(contact)
+        self.queue_update(contact)
+
+    def queue_update(self, contact):
+        '''update contact on the next flush, many changes of a contact
+        before the flush update it once'''
+        self._dirty_contacts[contact.account] = contact
+
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.schedule_flush(self.UPDATE_DELAY)
+
+    def flush_updates(self):
+        '''update the contacts queued with queue_update, the groups of the
+        contacts are updated once at the end, the list is frozen if there
+        are many contacts'''
+        self._flush_scheduled = False
+        contacts = self._dirty_contacts.values()
+        self._dirty_contacts = {}
+
+        if not contacts:
+            return
+
+        frozen = len(contacts) > self.FREEZE_UPDATES
+        self._dirty_groups = {}
+
+        if frozen:
+            self.freeze()
+
+        try:
+            for contact in contacts:
+                self.update_contact(contact)
+
+            groups = self._dirty_groups.values()
+            self._dirty_groups = None
+
+            for group in groups:
+                self.update_group(group)
+        finally:
+            self._dirty_groups = None
+
+            if frozen:
+                self.thaw()
+
+    def group_changed(self, group):
+        '''called by the implementations when the contacts of group change,
+        update the group now or at the end of the flush if there is one
+        running'''
+        if self._dirty_groups is None:
+            self.update_group(group)
+        else:
+            self._dirty_groups[group.name] = group
+
+    def schedule_flush(self, delay):
+        '''call flush_updates in delay milliseconds, the implementations
+        should use the timers of the toolkit, this one calls it now'''
+        self.flush_updates()
+
+    def freeze(self):
+        '''stop sorting the list until thaw is called, used while doing
+        many changes'''
+        pass
+
+    def thaw(self):
+        '''sort the list again after freeze'''
+        pass
 
     def _get_order_by_status(self):
         '''return the value of order by status'''
@@ -157,11 +245,98 @@ class ContactList(object):
 
     def _set_filter_text(self, value):
         '''set the filter_text value'''
+        value = value.lower()
+
+        if self._filter_text and value.startswith(self._filter_text):
+            self._filter_candidates = self._filter_matches
+        else:
+            self._filter_candidates = None
+
+        self._filter_matches = set()
         self._filter_text = value
-        self.refilter()
+
+        try:
+            self.refilter()
+        finally:
+            self._filter_candidates = None
 
     filter_text = property(fget=_get_filter_text, fset=_set_filter_text)
 
+    def filter_contact(self, contact):
+        '''return True if contact matches the filter text'''
+        if self._filter_candidates is not None and \
+                contact.account not in self._filter_candidates:
+            return False
+
+        if contact.search_key.find(self._filter_text) == -1:
+            return False
+
+        self._filter_matches.add(contact.account)
+        return True
+
+    def count_contact(self, contact, group):
+        '''add contact to the counters of group, called by the
+        implementations when contact is added to group'''
+        counted = self._counted.get(contact.account, None)
+
+        if counted is None:
+            counted = [contact.status != e3.status.OFFLINE, set()]
+            self._counted[contact.account] = counted
+        elif group.name in counted[1]:
+            return
+
+        counted[1].add(group.name)
+        counts = self._group_counts.setdefault(group.name, [0, 0])
+        counts[0] += counted[0]
+        counts[1] += 1
+
+    def uncount_contact(self, account, name):
+        '''remove the contact with account from the counters of the group
+        called name, called by the implementations when the contact is
+        removed from the group'''
+        counted = self._counted.get(account, None)
+
+        if counted is None or name not in counted[1]:
+            return
+
+        counted[1].discard(name)
+        counts = self._group_counts[name]
+        counts[0] -= counted[0]
+        counts[1] -= 1
+
+        if not counted[1]:
+            del self._counted[account]
+
+    def recount_contact(self, contact):
+        '''update the counters of the groups of contact if it changed from
+        or to offline, called by the implementations when contact is
+        updated'''
+        counted = self._counted.get(contact.account, None)
+
+        if counted is None:
+            return
+
+        online = contact.status != e3.status.OFFLINE
+
+        if online == counted[0]:
+            return
+
+        counted[0] = online
+        delta = online and 1 or -1
+
+        for name in counted[1]:
+            self._group_counts[name][0] += delta
+
+    def clear_counts(self):
+        '''reset the counters of the groups'''
+        self._group_counts = {}
+        self._counted = {}
+
+    def get_group_count(self, group):
+        '''return a tuple with the number of online contacts and the number
+        of contacts on group'''
+        return tuple(self._group_counts.get(group.name, (0, 0)))
+
     def format_nick(self, contact):
         '''replace the appearance of the template vars using the values of
         the contact
@@ -196,8 +371,7 @@ class ContactList(object):
         # + ONLINE_COUNT
         # + TOTAL_COUNT
         '''
-        contacts = self.contacts.get_contacts(group.contacts)
-        (online, total) = self.contacts.get_online_total_count(contacts)
+        (online, total) = self.get_group_count(group)
         template = self.group_template
         template = template.replace('%NAME%', group.name)
         template = template.replace('%ONLINE_COUNT%', str(online))
@@ -256,15 +430,30 @@ class ContactList(object):
         if clear:
             self.clear()
 
-        for group in self.groups.values():
-            # get a list of contact objects from a list of accounts
-            contacts = self.contacts.get_contacts(group.contacts)
-            self.add_group(group)
-            for contact in contacts:
-                self.add_contact(contact, group)
+        # the contacts are added with their current values
+        self._dirty_contacts = {}
+        self._dirty_groups = {}
+        self.freeze()
 
-        for contact in self.contacts.get_no_group():
-            self.add_contact(contact)
+        try:
+            for group in self.groups.values():
+                # get a list of contact objects from a list of accounts
+                contacts = self.contacts.get_contacts(group.contacts)
+                self.add_group(group)
+                for contact in contacts:
+                    self.add_contact(contact, group)
+
+            for contact in self.contacts.get_no_group():
+                self.add_contact(contact)
+
+            groups = self._dirty_groups.values()
+            self._dirty_groups = None
+
+            for group in groups:
+                self.update_group(group)
+        finally:
+            self._dirty_groups = None
+            self.thaw()
 
     def clear(self):
         '''clear the contact list'''
@@ -298,46 +487,38 @@ class ContactList(object):
         groups'''
         self.group_state.update({group.name:True})
 
+    def get_group_sort_key(self, group, order=0):
+        '''return the value to compare to sort group, the groups with higher
+        order go first and then they are sorted by name, the groups go
+        before the contacts'''
+        return (0, -order, group.name)
+
+    def get_contact_sort_key(self, contact, order=0):
+        '''return the value to compare to sort contact, the contacts with
+        higher order go first, then they are sorted by status, when they
+        are ordered by group the contacts without group go first, then
+        they are sorted by display name'''
+        (rank, name) = contact.sort_key
+
+        if self.order_by_status:
+            grouped = False
+        else:
+            grouped = len(contact.groups) != 0
+
+        return (1, -order, rank, grouped, name)
+
     def compare_groups(self, group1, group2, order1=0, order2=0):
         '''compare two groups and return 1 if group1 should go first, 0
         if equal, -1 if group2 should go first, use order1 and order2 to
         override the group sorting (the user can set the values on these to
         have custom ordering)'''
-
-        override = cmp(order2, order1)
-
-        if override != 0:
-            return override
-
-        return cmp(group1.name, group2.name)
+        return cmp(self.get_group_sort_key(group1, order1),
+            self.get_group_sort_key(group2, order2))
 
     def compare_contacts(self, contact1, contact2, order1=0, order2=0):
         '''compare two contacts and return 1 if contact1 should go first, 0
         if equal and -1 if contact2 should go first, use order1 and order2 to
         override the group sorting (the user can set the values on these to
         have custom ordering)'''
-
-        override = cmp(order2, order1)
-
-        if override != 0:
-            return override
-
-        result = cmp(e3.status.ORDERED.index(contact1.status),
-            e3.status.ORDERED.index(contact2.status))
-
-        if result != 0:
-            return result
-
-        if self.order_by_status:
-            return cmp(contact1.display_name, contact2.display_name)
-
-        if len(contact1.groups) == 0:
-            if len(contact2.groups) == 0:
-                return cmp(contact1.display_name, contact2.display_name)
-            else:
-                return -1
-        elif len(contact2.groups) == 0:
-            return 1
-        else:
-            return cmp(contact1.display_name, contact2.display_name)
-
+        return cmp(self.get_contact_sort_key(contact1, order1),
+            self.get_contact_sort_key(contact2, order2))
@@ -1,5 +1,6 @@
 # this module will include a parser for all the markups that will
 # convert it into a restricted subset of xhtml
+import re
 import xml.sax.saxutils
 
 import gui
@@ -22,39 +23,109 @@ def unescape(string_):
     '''replace the values on dic_inv keys with the values'''
     return xml.sax.saxutils.unescape(string_, dic_inv)
 
-def parse_emotes(message, cedict=None):
-    '''parser the emotes in a message, return a string with img tags
-    for the emotes acording to the theme'''
+# (revision of the emotes of the theme, custom emoticons) -> EmoteMatcher
+matchers = {}
+# the matchers are dropped when there are more than this
+MAX_MATCHERS = 32
+
+def trie_pattern(shortcuts):
+    '''return a regular expression that matches the longest of shortcuts
+    at each position, the alternatives are nested by common prefix so each
+    character of the message is compared with a few of them'''
+    trie = {}
+
+    for shortcut in shortcuts:
+        node = trie
+
+        for char in shortcut:
+            node = node.setdefault(char, {})
+
+        # the empty string marks the end of a shortcut
+        node[''] = None
+
+    def pattern(node):
+        '''return the pattern for the shortcuts below node'''
+        alternatives = [re.escape(char) + pattern(child)
+            for (char, child) in sorted(node.iteritems()) if char]
+
+        if not alternatives:
+            return ''
+
+        if len(alternatives) == 1:
+            group = alternatives[0]
+        else:
+            group = '(?:' + '|'.join(alternatives) + ')'
+
+        # the longer shortcuts are tried before ending on this one
+        if '' in node:
+            if len(alternatives) == 1 and len(group) > 1:
+                group = '(?:' + group + ')'
+
+            group += '?'
 
-    chunks = [message]
-    shortcuts = gui.Theme.EMOTES.keys()
-    if cedict is not None:
-        shortcuts.extend(cedict.keys())
-    temp = []
+        return group
 
-    while len(shortcuts) > 0:
-        shortcut = shortcuts.pop()
-        temp = []
+    return pattern(trie)
 
-        for chunk in chunks:
-            parts = chunk.split(shortcut)
+class EmoteMatcher(object):
+    '''replace the shortcuts of a set of emoticons on a message with img
+    tags in one pass'''
 
-            if len(parts) > 1:
-                if shortcut in gui.Theme.EMOTES.keys():
-                    path = gui.theme.emote_to_path(shortcut)
-                else:
-                    path = cedict[shortcut]
-                tag = '<img src="%s" alt="%s"/>' % (path, shortcut)
+    def __init__(self, paths):
+        '''constructor, paths is a dict of shortcut -> path of the image'''
+        self.tags = {}
 
-                for part in parts:
-                    temp.append(part)
-                    temp.append(tag)
+        for (shortcut, path) in paths.iteritems():
+            self.tags[shortcut] = '<img src="%s" alt="%s"/>' % (path,
+                escape(shortcut))
 
-                temp.pop()
-            else:
-                temp.append(chunk)
+        if self.tags:
+            self.regex = re.compile(trie_pattern(self.tags.keys()))
+        else:
+            self.regex = None
 
-        chunks = temp
+    def replace(self, match):
+        '''return the tag of the shortcut on match'''
+        return self.tags[match.group()]
 
-    return ''.join(chunks)
+    def parse(self, message):
+        '''return message with the shortcuts replaced by img tags'''
+        if self.regex is None:
+            return message
 
+        return self.regex.sub(self.replace, message)
+
+def get_emote_matcher(cedict=None):
+    '''return an EmoteMatcher for the emoticons of the theme and the custom
+    emoticons on cedict (shortcut -> path), the matcher is built once for
+    each theme and cedict'''
+    if cedict:
+        custom = tuple(sorted(cedict.iteritems()))
+    else:
+        custom = ()
+
+    key = (gui.theme.emotes_revision, custom)
+    matcher = matchers.get(key, None)
+
+    if matcher is None:
+        paths = dict(custom)
+
+        # the emoticons of the theme are used over the custom ones
+        for shortcut in gui.Theme.EMOTES:
+            path = gui.theme.emote_to_path(shortcut)
+
+            if path is not None:
+                paths[shortcut] = path
+
+        if len(matchers) >= MAX_MATCHERS:
+            matchers.clear()
+
+        matcher = EmoteMatcher(paths)
+        matchers[key] = matcher
+
+    return matcher
+
+def parse_emotes(message, cedict=None):
+    '''parser the emotes in a message, return a string with img tags
+    for the emotes acording to the theme'''
+    return get_emote_matcher(cedict).parse(message)
@@ -117,6 +117,8 @@ class Theme(object):
     def __init__(self, image_name="default", emote_name="default",
             sound_name="default"):
         '''class constructor'''
+        # incremented each time the emotes are loaded
+        self.emotes_revision = 0
         self.set_theme(image_name, emote_name, sound_name)
 
     def set_theme(self, image_name, emote_name, sound_name):
@@ -160,24 +162,49 @@ class Theme(object):
             os.path.join(self.theme_path, "idle.png")
 
         self.emote_path = os.path.join('themes', 'emotes', self.emote_name)
+        self.load_emotes()
 
-    def emote_to_path(self, shortcut, remove_protocol=False):
-        '''return a string representing the path to load the emote if it exist
-        None otherwise'''
+    def load_emotes(self):
+        '''look for the images of the emotes on the emote theme once,
+        emote_to_path returns the paths found here'''
+        emote_path = os.path.abspath(self.emote_path)
+
+        try:
+            names = set(os.listdir(emote_path))
+        except OSError:
+            names = set()
+
+        # file name -> path, None if it doesn't exist
+        files = {}
+        # shortcut -> path and uri of the image, the shortcuts without
+        # image are not included
+        self.emote_paths = {}
+        self.emote_uris = {}
+        self.emotes_revision += 1
 
-        if shortcut not in Theme.EMOTES:
-            return None
+        for (shortcut, name) in Theme.EMOTES.iteritems():
+            name += '.png'
 
-        path = os.path.join(self.emote_path, Theme.EMOTES[shortcut]) + '.png'
-        path = os.path.abspath(path)
+            if name not in files:
+                path = os.path.join(emote_path, name)
 
-        if os.access(path, os.R_OK) and os.path.isfile(path):
-            if remove_protocol:
-                return path
-            else:
-                return 'file://' + path
+                if name in names and os.path.isfile(path) and \
+                        os.access(path, os.R_OK):
+                    files[name] = path
+                else:
+                    files[name] = None
+
+            if files[name] is not None:
+                self.emote_paths[shortcut] = files[name]
+                self.emote_uris[shortcut] = 'file://' + files[name]
+
+    def emote_to_path(self, shortcut, remove_protocol=False):
+        '''return a string representing the path to load the emote if it exist
+        None otherwise'''
+        if remove_protocol:
+            return self.emote_paths.get(shortcut, None)
 
-        return None
+        return self.emote_uris.get(shortcut, None)
 
     def get_emotes_count(self):
         '''return the number of emoticons registered'''
@@ -188,6 +188,9 @@ extension.implements(CellRendererNoPlus, 'nick renderer')
 
 gobject.type_register(CellRendererPlus)
 
+# GTK_TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID, the rows are not sorted
+UNSORTED = -2
+
 class ContactList(gui.ContactList, gtk.TreeView):
     '''a gtk implementation of gui.ContactList'''
     NAME = 'Contact List'
@@ -213,15 +216,24 @@ class ContactList(gui.ContactList, gtk.TreeView):
         # the image (None for groups) the object (group or contact),
         # the string to display and a boolean indicating if the pixbuf should
         # be shown (False for groups, True for contacts), the status
-        # image, and an int that is used to allow ordering specified by the user
+        # image, an int that is used to allow ordering specified by the user
+        # and the sort key of the row (see get_contact_sort_key)
         self._model = gtk.TreeStore(gtk.gdk.Pixbuf, object, str, bool,
-            gtk.gdk.Pixbuf, int)
+            gtk.gdk.Pixbuf, int, object)
         self.model = self._model.filter_new(root=None)
         self.model.set_visible_func(self._visible_func)
 
         self._model.set_sort_func(1, self._sort_method)
         self._model.set_sort_column_id(1, gtk.SORT_ASCENDING)
 
+        # the rows of the groups and contacts on self._model, group name ->
+        # gtk.TreeRowReference and account -> {group name:
+        # gtk.TreeRowReference}, the group name is None for the row of a
+        # contact on the root, the references follow the rows when they
+        # are sorted
+        self._group_rows = {}
+        self._contact_rows = {}
+
         self.set_model(self.model)
 
         crt = extension.get_and_instantiate('nick renderer')
@@ -275,15 +287,69 @@ class ContactList(gui.ContactList, gtk.TreeView):
         '''try to return a pixbuf of the user picture or the default
         picture
         '''
+        size = (self.avatar_size, self.avatar_size)
+        picture = None
+
         if contact.picture:
-            picture = utils.safe_gtk_pixbuf_load(contact.picture,
-                    (self.avatar_size, self.avatar_size))
-        else:
-            picture = utils.safe_gtk_pixbuf_load(gui.theme.user,
-                    (self.avatar_size, self.avatar_size))
+            # decoded on other thread, the row is updated when it's ready
+            picture = utils.pixbufs.get_async(contact.picture, size,
+                lambda pixbuf: self.queue_update(contact))
+
+        if picture is None:
+            picture = utils.safe_gtk_pixbuf_load(gui.theme.user, size)
 
         return picture
 
+    def _get_iter(self, reference):
+        '''return the iter on self._model of the row of reference, None if
+        the row was removed'''
+        if reference is None or not reference.valid():
+            return None
+
+        return self._model.get_iter(reference.get_path())
+
+    def _get_group_iter(self, group):
+        '''return the iter of the row of group, None if it isn't on the
+        list'''
+        return self._get_iter(self._group_rows.get(group.name, None))
+
+    def _get_contact_iters(self, contact):
+        '''return a list of (group name, iter) with the rows of contact,
+        the group name is None for the row on the root'''
+        rows = self._contact_rows.get(contact.account, {})
+        iters = []
+
+        for (name, reference) in rows.items():
+            iter_ = self._get_iter(reference)
+
+            if iter_ is None:
+                del rows[name]
+            else:
+                iters.append((name, iter_))
+
+        return iters
+
+    def _add_contact_row(self, contact, name, parent, contact_data):
+        '''append a row for contact to parent (the iter of the group called
+        name or None for the root) and return its iter'''
+        iter_ = self._model.append(parent, contact_data)
+        self._contact_rows.setdefault(contact.account, {})[name] = \
+            gtk.TreeRowReference(self._model, self._model.get_path(iter_))
+
+        return iter_
+
+    def _remove_contact_row(self, account, name, iter_=None):
+        '''remove the row of account on the group called name (None for the
+        root) from the index and from the model if iter_ is not None'''
+        rows = self._contact_rows.get(account, {})
+        rows.pop(name, None)
+
+        if not rows:
+            self._contact_rows.pop(account, None)
+
+        if iter_ is not None:
+            del self._model[iter_]
+
     def _visible_func(self, model, _iter):
         '''return True if the row should be displayed according to the
         value of the config'''
@@ -294,22 +360,13 @@ class ContactList(gui.ContactList, gtk.TreeView):
 
         if type(obj) == e3.Group:
             if not self.show_empty_groups:
-                # get a list of contact objects from a list of accounts
-                contacts = self.contacts.get_contacts(obj.contacts)
-                if  self.contacts.get_online_total_count(contacts)[0] == 0:
+                if self.get_group_count(obj)[0] == 0:
                     return False
 
             return True
 
-        # i think joining all the text from a user with a new line between
-        # and searching on one string is faster (and the user cant add
-        # a new line to the entry so..)
         if self._filter_text:
-            if '\n'.join((obj.account, obj.alias, obj.nick, obj.message,
-                obj.account)).lower().find(self._filter_text) == -1:
-                return False
-            else:
-                return True
+            return self.filter_contact(obj)
 
         if not self.show_offline and obj.status == e3.status.OFFLINE:
             return False
@@ -321,20 +378,7 @@ class ContactList(gui.ContactList, gtk.TreeView):
 
     def _sort_method(self, model, iter1, iter2, user_data=None):
         '''callback called to decide the order of the contacts'''
-
-        obj1 = self._model[iter1][1]
-        obj2 = self._model[iter2][1]
-        order1 = self._model[iter1][5]
-        order2 = self._model[iter2][5]
-
-        if type(obj1) == e3.Group and type(obj2) == e3.Group:
-            return self.compare_groups(obj1, obj2, order1, order2)
-        elif type(obj1) == e3.Contact and type(obj2) == e3.Contact:
-            return self.compare_contacts(obj1, obj2, order1, order2)
-        elif type(obj1) == e3.Group and type(obj2) == e3.Contact:
-            return -1
-        else:
-            return 1
+        return cmp(model.get_value(iter1, 6), model.get_value(iter2, 6))
 
     def _get_selected(self):
         '''return the selected row or None'''
@@ -439,24 +483,34 @@ class ContactList(gui.ContactList, gtk.TreeView):
         self.session.config.d_weights[group.identifier] = weight
 
         group_data = (None, group, self.format_group(group), False, None,
-            weight)
+            weight, self.get_group_sort_key(group, weight))
+
+        group_iter = self._get_group_iter(group)
 
-        for row in self._model:
-            obj = row[1]
-            if type(obj) == e3.Group:
-                if obj.name == group.name:
-                    dbg('Trying to add an existing group! ' + obj.name,
-                        'contactlist', 1)
-                    return row.iter
+        if group_iter is not None:
+            dbg('Trying to add an existing group! ' + group.name,
+                'contactlist', 1)
+            return group_iter
 
-        return self._model.append(None, group_data)
+        group_iter = self._model.append(None, group_data)
+        self._group_rows[group.name] = gtk.TreeRowReference(self._model,
+            self._model.get_path(group_iter))
+
+        return group_iter
 
     def remove_group(self, group):
         '''remove a group from the contact list'''
-        for row in self._model:
-            obj = row[1]
-            if type(obj) == e3.Group and obj.name == group.name:
-                del self._model[row.iter]
+        group_iter = self._get_group_iter(group)
+
+        if group_iter is None:
+            return
+
+        for contact_row in self._model[group_iter].iterchildren():
+            self._remove_contact_row(contact_row[1].account, group.name)
+            self.uncount_contact(contact_row[1].account, group.name)
+
+        del self._group_rows[group.name]
+        del self._model[group_iter]
 
     def add_contact(self, contact, group=None):
         '''add a contact to the contact list, add it to the group if
@@ -471,88 +525,84 @@ class ContactList(gui.ContactList, gtk.TreeView):
         contact_data = (self._get_contact_pixbuf_or_default(contact), contact,
             self.format_nick(contact), True,
             utils.safe_gtk_pixbuf_load(gui.theme.status_icons[contact.status]),
-            weight)
+            weight, self.get_contact_sort_key(contact, weight))
+
+        contact_iters = self._get_contact_iters(contact)
 
         # if no group add it to the root, but check that it's not on a group
         # or in the root already
         if not group or self.order_by_status:
-            for row in self._model:
-                obj = row[1]
-                # check on group
-                if type(obj) == e3.Group:
-                    for contact_row in row.iterchildren():
-                        con = contact_row[1]
-                        if con.account == contact.account:
-                            return contact_row.iter
-                # check on the root
-                elif type(obj) == e3.Contact and obj.account == contact.account:
-                    return row.iter
-
-            return self._model.append(None, contact_data)
-
-        for row in self._model:
-            obj = row[1]
-            if type(obj) == e3.Group and obj.name == group.name:
-                # if the contact is already on the group, then dont add it
-                for contact_row in row.iterchildren():
-                    con = contact_row[1]
-                    if con.account == contact.account:
-                        return contact_row.iter
-
-                return_iter = self._model.append(row.iter, contact_data)
-                self.update_group(group)
-
-                # search the use on the root to remove it if it's there
-                # since we added him to a group
-                for irow in self._model:
-                    iobj = irow[1]
-                    if type(iobj) == e3.Contact and \
-                            iobj.account == contact.account:
-                        del self._model[irow.iter]
-
-                return return_iter
-        else:
+            if contact_iters:
+                return contact_iters[0][1]
+
+            return self._add_contact_row(contact, None, None, contact_data)
+
+        group_iter = self._get_group_iter(group)
+
+        if group_iter is None:
             self.add_group(group)
             return self.add_contact(contact, group)
 
-    def remove_contact(self, contact, group=None):
-        '''remove a contact from the specified group, if group is None
-        then remove him from all groups'''
-        if not group:
-            # go though the groups and the contacts without group
-            for row in self._model:
-                obj = row[1]
-                # if we get a group we go through the contacts
-                if type(obj) == e3.Group:
-                    for contact_row in row.iterchildren():
-                        con = contact_row[1]
-                        # if we find it, we remove it
-                        if con.account == contact.account:
-                            del self._model[contact_row.iter]
-                            self.update_group(obj)
+        root_iter = None
 
-                # if it's a contact without group (at the root)
-                elif type(obj) == e3.Contact and obj.account == contact.account:
-                    del self._model[row.iter]
+        for (name, iter_) in contact_iters:
+            # if the contact is already on the group, then dont add it
+            if name == group.name:
+                return iter_
+            elif name is None:
+                root_iter = iter_
 
-            return
+        return_iter = self._add_contact_row(contact, group.name, group_iter,
+            contact_data)
+        self.count_contact(contact, group)
+        self.group_changed(group)
 
-        # go though the groups
-        for row in self._model:
-            obj = row[1]
-            # if it's the group we are searching
-            if type(obj) == e3.Group and obj.name == group.name:
-                # go through all the contacts
-                for contact_row in row.iterchildren():
-                    con = contact_row[1]
-                    # if we find it, we remove it
-                    if con.account == contact.account:
-                        del self._model[contact_row.iter]
-                        self.update_group(group)
+        # remove the contact from the root if it's there since we added him
+        # to a group
+        if root_iter is not None:
+            self._remove_contact_row(contact.account, None, root_iter)
+
+        return return_iter
+
+    def remove_contact(self, contact, group=None):
+        '''remove a contact from the specified group, if group is None
+        then remove him from all groups'''
+        for (name, iter_) in self._get_contact_iters(contact):
+            if group and name != group.name:
+                continue
+
+            parent = self._model.iter_parent(iter_)
+            self._remove_contact_row(contact.account, name, iter_)
+            self.uncount_contact(contact.account, name)
+
+            # if it was on a group and not on the root
+            if parent is not None:
+                self.group_changed(self._model[parent][1])
+
+    def schedule_flush(self, delay):
+        '''call flush_updates in delay milliseconds'''
+        gobject.timeout_add(delay, self._on_flush_timeout)
+
+    def _on_flush_timeout(self):
+        '''called when it's time to update the queued contacts'''
+        self.flush_updates()
+        return False
+
+    def freeze(self):
+        '''stop sorting the list until thaw is called, used while doing
+        many changes'''
+        self._model.set_sort_column_id(UNSORTED, gtk.SORT_ASCENDING)
+
+    def thaw(self):
+        '''sort the list again after freeze'''
+        self._model.set_sort_column_id(1, gtk.SORT_ASCENDING)
 
     def clear(self):
         '''clear the contact list'''
         self._model.clear()
+        self._group_rows = {}
+        self._contact_rows = {}
+        self.clear_counts()
 
         # this is the best place to put this code without putting gtk code
         # on gui.ContactList
@@ -570,22 +620,16 @@ class ContactList(gui.ContactList, gtk.TreeView):
         contact_data = (self._get_contact_pixbuf_or_default(contact), contact,
             self.format_nick(contact), True,
             utils.safe_gtk_pixbuf_load(gui.theme.status_icons[contact.status]),
-            weight)
-
-        found = False
-
-        for row in self._model:
-            obj = row[1]
-            if type(obj) == e3.Group:
-                for contact_row in row.iterchildren():
-                    con = contact_row[1]
-                    if con.account == contact.account:
-                        found = True
-                        self._model[contact_row.iter] = contact_data
-                        self.update_group(obj)
-            elif type(obj) == e3.Contact and obj.account == contact.account:
-                found = True
-                self._model[row.iter] = contact_data
+            weight, self.get_contact_sort_key(contact, weight))
+
+        self.recount_contact(contact)
+
+        for (name, iter_) in self._get_contact_iters(contact):
+            self._model[iter_] = contact_data
+
+            if name is not None:
+                self.group_changed(self._model[self._model.iter_parent(
+                    iter_)][1])
 
     def update_group(self, group):
         '''update the data of group'''
@@ -597,24 +641,31 @@ class ContactList(gui.ContactList, gtk.TreeView):
         self.session.config.d_weights[group.identifier] = weight
 
         group_data = (None, group, self.format_group(group), False, None,
-            weight)
+            weight, self.get_group_sort_key(group, weight))
+
+        group_iter = self._get_group_iter(group)
 
-        for row in self._model:
-            obj = row[1]
-            if type(obj) == e3.Group and obj.name == group.name:
-                self._model[row.iter] = group_data
+        if group_iter is not None:
+            self._model[group_iter] = group_data
 
     def set_group_state(self, group, state):
         '''expand group id state is True, collapse it if False'''
-        for row in self._model:
-            obj = row[1]
-            if type(obj) == e3.Group and obj.name == group.name:
-                path = self._model.get_path()
+        group_iter = self._get_group_iter(group)
 
-                if state:
-                    self.expand_row(path, False)
-                else:
-                    self.collapse_row(path)
+        if group_iter is None:
+            return
+
+        # the view shows the filtered model
+        path = self.model.convert_child_path_to_path(
+            self._model.get_path(group_iter))
+
+        if path is None:
+            return
+
+        if state:
+            self.expand_row(path, False)
+        else:
+            self.collapse_row(path)
 
     def format_nick(self, contact):
         '''replace the appearance of the template vars using the values of
@@ -663,8 +714,7 @@ class ContactList(gui.ContactList, gtk.TreeView):
         name = gobject.markup_escape_text(group.name).replace('%NAME%',
             '% NAME %')
 
-        contacts = self.contacts.get_contacts(group.contacts)
-        (online, total) = self.contacts.get_online_total_count(contacts)
+        (online, total) = self.get_group_count(group)
         template = self.group_template
         template = template.replace('%ONLINE_COUNT%', str(online))
         template = template.replace('%TOTAL_COUNT%', str(total))
@@ -23,6 +23,8 @@ from papyon.gnet.resolver import *
 from abstract import AbstractClient
 
 import gobject
+import socket
+from collections import deque
 from errno import *
 
 __all__ = ['GIOChannelClient']
@@ -38,9 +40,20 @@ class OutgoingPacket(object):
 
     def read(self, size=2048):
         if size is not None:
-            return self.buffer[self._sent:][0:size]
+            return self.buffer[self._sent:self._sent + size]
         return self.buffer[self._sent:]
 
+    def view(self, size=2048):
+        """return a buffer object on the next size bytes to send, the
+        data is not copied"""
+        if not isinstance(self.buffer, str):
+            return self.read(size)
+        return buffer(self.buffer, self._sent, size)
+
+    def remaining(self):
+        """return how many bytes are left to send"""
+        return self.size - self._sent
+
     def sent(self, size):
         """update how many bytes have been sent"""
         self._sent += size
@@ -63,6 +76,11 @@ class GIOChannelClient(AbstractClient):
 
         @since: 0.1"""
 
+    # bounds of the size of each write, between them it follows the size of
+    # the send buffer of the socket
+    MIN_WRITE_SIZE = 2048
+    MAX_WRITE_SIZE = 262144
+
     def __init__(self, host, port, domain=AF_INET, type=SOCK_STREAM):
         AbstractClient.__init__(self, host, port, domain, type)
 
@@ -78,9 +96,53 @@ class GIOChannelClient(AbstractClient):
 
         self._source_id = None
         self._source_condition = 0
-        self._outgoing_queue = []
+        self._outgoing_queue = deque()
+        self._write_size = self._get_write_size(io_object)
         AbstractClient._pre_open(self)
 
+    def _get_write_size(self, io_object):
+        try:
+            size = io_object.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        except Exception:
+            return self.MIN_WRITE_SIZE
+        return max(self.MIN_WRITE_SIZE, min(size, self.MAX_WRITE_SIZE))
+
+    def _next_write(self):
+        """Return the data to write next: a window on the first queued
+        packet without copying it, or when it is smaller than the write
+        size the data of as many queued packets as fit, joined to be sent
+        with a single write"""
+        size = self._write_size
+        item = self._outgoing_queue[0]
+        if item.remaining() >= size or len(self._outgoing_queue) == 1:
+            return item.view(size)
+
+        chunks = []
+        length = 0
+        for item in self._outgoing_queue:
+            if length >= size:
+                break
+            chunk = item.read(size - length)
+            chunks.append(chunk)
+            length += len(chunk)
+        return "".join(chunks)
+
+    def _written(self, size):
+        """Account size written bytes to the queued packets, in order,
+        and emit the sent signal and run the callback of each completed
+        packet"""
+        queue = self._outgoing_queue
+        while len(queue) > 0:
+            item = queue[0]
+            count = min(size, item.remaining())
+            item.sent(count)
+            size -= count
+            if not item.is_complete():
+                break
+            queue.popleft()
+            self.emit("sent", item.buffer, item.size)
+            item.callback()
+
     def _post_open(self):
         AbstractClient._post_open(self)
         self._watch_remove()
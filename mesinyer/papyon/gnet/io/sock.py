@@ -23,6 +23,7 @@ from iochannel import GIOChannelClient
 
 import gobject
 import socket
+from errno import EAGAIN, EWOULDBLOCK, EINTR
 
 
 __all__ = ['SocketClient']
@@ -81,14 +82,15 @@ class SocketClient(GIOChannelClient):
             return False
 
         if cond & gobject.IO_OUT:
-            if len(self._outgoing_queue) > 0: # send next item
-                item = self._outgoing_queue[0]
-                item.sent(self._channel.write(item.read()))
-                if item.is_complete(): # sent item
-                    self.emit("sent", item.buffer, item.size)
-                    item.callback()
-                    del self._outgoing_queue[0]
-                    del item
+            if len(self._outgoing_queue) > 0: # send next items
+                try:
+                    written = self._transport.send(self._next_write())
+                except socket.error, err:
+                    if err.args[0] in (EAGAIN, EWOULDBLOCK, EINTR):
+                        return True
+                    self.close()
+                    return False
+                self._written(written)
                 if len(self._outgoing_queue) == 0:
                     self._watch_remove_cond(gobject.IO_OUT)
             else:
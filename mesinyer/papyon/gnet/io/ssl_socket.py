@@ -96,19 +96,16 @@ class SSLSocketClient(GIOChannelClient):
                 if len(self._outgoing_queue) > 0: # send next item
                     item = self._outgoing_queue[0]
                     try:
-                        ret = self._transport.send(item.read())
+                        # the same data must be passed again if the write
+                        # has to be retried, so packets aren't joined here
+                        ret = self._transport.send(item.read(self._write_size))
                     except (OpenSSL.WantX509LookupError,
                             OpenSSL.WantReadError, OpenSSL.WantWriteError):
                         return True
                     except (OpenSSL.ZeroReturnError, OpenSSL.SysCallError):
                         self.close()
                         return False
-                    item.sent(ret)
-                    if item.is_complete(): # sent item
-                        self.emit("sent", item.buffer, item.size)
-                        item.callback()
-                        del self._outgoing_queue[0]
-                        del item
+                    self._written(ret)
                     if len(self._outgoing_queue) == 0:
                         self._watch_remove_cond(gobject.IO_OUT)
                 else:
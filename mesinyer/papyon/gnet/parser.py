@@ -69,8 +69,17 @@ class DelimiterParser(AbstractParser):
 
     A chunk is defined by a delimiter which is either a string or an integer.
 
+    The received data is appended to a bytearray and the emitted chunks are
+    only marked as consumed by moving a read offset, the consumed prefix is
+    dropped once it is larger than the unread data, so the cost of
+    receiving is linear in the size of the stream whatever the size of the
+    reads.
+
     @since: 0.1"""
 
+    # the consumed prefix is not dropped until it's larger than this
+    COMPACT_SIZE = 65536
+
     def __init__(self, transport):
         """Initializer
 
@@ -80,41 +89,68 @@ class DelimiterParser(AbstractParser):
         self._chunk_delimiter = "\n"
 
     def _reset_state(self):
-        self._recv_cache = ""
+        self._recv_buffer = bytearray()
+        # start of the data not emitted yet
+        self._recv_offset = 0
+        # where to resume looking for a string delimiter
+        self._search_offset = 0
+
+    def _get_recv_cache(self):
+        return str(buffer(self._recv_buffer, self._recv_offset))
+    _recv_cache = property(_get_recv_cache,
+        doc="""The received data that wasn't emitted yet""")
 
     def _on_received(self, transport, buf, length):
-        self._recv_cache += buf
+        self._recv_buffer.extend(buf)
         self._process_recv_cache()
 
     def _process_recv_cache(self):
-        if len(self._recv_cache) == 0:
-            return
-        if self._chunk_delimiter is None or self._chunk_delimiter == "":
-            self.emit("received", self._recv_cache)
-            self._recv_cache = ""
-            return
-
-        previous_length = len(self._recv_cache)
-        while len(self._recv_cache) != 0:
-            if isinstance(self._chunk_delimiter, int):
-                available = len(self._recv_cache)
-                required = self._chunk_delimiter
-                if required <= available:
-                    self.emit ("received", self._recv_cache[:required])
-                    self._recv_cache = self._recv_cache[required:]
+        while self._recv_offset < len(self._recv_buffer):
+            recv_buffer = self._recv_buffer
+            delimiter = self._chunk_delimiter
+            start = self._recv_offset
+
+            if delimiter is None or delimiter == "":
+                end = next_offset = len(recv_buffer)
+            elif isinstance(delimiter, int):
+                end = next_offset = start + delimiter
+                if end > len(recv_buffer):
+                    break
             else:
-                s = self._recv_cache.split(self._chunk_delimiter, 1)
-                if len(s) > 1:
-                    self.emit("received", s[0])
-                    self._recv_cache = s[1]
-                else:
-                    self._recv_cache = s[0]
-            if len(self._recv_cache) == previous_length: # noting got consumed, exit
-                return
-            previous_length = len(self._recv_cache)
+                end = recv_buffer.find(delimiter,
+                        max(start, self._search_offset))
+                if end == -1:
+                    # the delimiter may start on the last bytes
+                    self._search_offset = max(start,
+                            len(recv_buffer) - len(delimiter) + 1)
+                    break
+                next_offset = end + len(delimiter)
+
+            self._recv_offset = next_offset
+            self._search_offset = next_offset
+            # the handlers may change the delimiter or reset the state
+            self.emit("received", str(buffer(recv_buffer, start, end - start)))
+            if next_offset == start: # nothing got consumed, exit
+                break
+        self._compact()
+
+    def _compact(self):
+        offset = self._recv_offset
+        if offset == 0:
+            return
+        if offset >= len(self._recv_buffer):
+            self._recv_buffer = bytearray()
+            self._recv_offset = 0
+            self._search_offset = 0
+        elif offset > self.COMPACT_SIZE and \
+                offset * 2 > len(self._recv_buffer):
+            del self._recv_buffer[:offset]
+            self._recv_offset = 0
+            self._search_offset = max(0, self._search_offset - offset)
 
     def _set_chunk_delimiter(self, delimiter):
         self._chunk_delimiter = delimiter
+        self._search_offset = 0
     def _get_chunk_delimiter(self):
         return self._chunk_delimiter
     delimiter = property(_get_chunk_delimiter,
@@ -32,6 +32,16 @@ __all__ = ['SLPMessage', 'SLPRequestMessage', 'SLPResponseMessage',
            'SLPTransferRequestBody', 'SLPTransferResponseBody']
 
 
+def _peek_header(raw_message, name):
+    start = raw_message.find("\r\n%s:" % name)
+    if start < 0:
+        return None
+    start += len(name) + 3
+    end = raw_message.find("\r\n", start)
+    if end < 0:
+        end = len(raw_message)
+    return raw_message[start:end].lstrip()
+
 class SLPMessage(HTTPMessage):
     STD_HEADERS = ["To", "From", "Via", "CSeq", "Call-ID", "Max-Forwards"]
 
@@ -121,6 +131,20 @@ class SLPMessage(HTTPMessage):
         
         return slp_message
 
+    @staticmethod
+    def peek(raw_message):
+        """Returns the Call-ID and the SessionID of a raw message without
+        building it, like the call_id and body.session_id properties would
+        do, so that it can be routed cheaply"""
+        if raw_message.find("MSNSLP/1.0") < 0:
+            raise ParseError("message doesn't seem to be an MSNSLP/1.0 message")
+        call_id = _peek_header(raw_message, "Call-ID") or ""
+        try:
+            session_id = int(_peek_header(raw_message, "SessionID"))
+        except (TypeError, ValueError):
+            session_id = 0
+        return call_id, session_id
+
 
 class SLPRequestMessage(SLPMessage):
     def __init__(self, method, resource, *args, **kwargs):
@@ -75,6 +75,7 @@ class P2PSession(gobject.GObject):
             self._branch = "{%s}" % uuid.uuid4()
             self._incoming = False
 
+        self._data_digest = None
         self._session_manager._register_session(self)
 
     def _generate_id(self, max=MAX_INT32):
@@ -102,6 +103,12 @@ class P2PSession(gobject.GObject):
     def peer(self):
         return self._peer
 
+    @property
+    def data_digest(self):
+        """The SHA-1 digest of the data received, None until it is
+        complete"""
+        return self._data_digest
+
     def set_receive_data_buffer(self, buffer, total_size):
         blob = MessageBlob(self._application_id, buffer, total_size, self.id)
         self._session_manager._transport_manager.register_writable_blob(blob)
@@ -203,17 +210,14 @@ class P2PSession(gobject.GObject):
         if blob.session_id == 0:
             # FIXME: handle the signaling correctly
             return
-        data = blob.read_data()
-        if blob.total_size == 4 and data == ('\x00' * 4):
+        if self._is_data_preparation_blob(blob):
             self._on_data_preparation_blob_sent(blob)
         else:
             self._on_data_blob_sent(blob)
 
     def _on_blob_received(self, blob):
-        data = blob.read_data()
-
         if blob.session_id == 0:
-            message = SLPMessage.build(data)
+            message = SLPMessage.build(blob.read_data())
             if isinstance(message, SLPRequestMessage):
                 if isinstance(message.body, SLPSessionRequestBody):
                     self._on_invite_received(message)
@@ -233,11 +237,16 @@ class P2PSession(gobject.GObject):
                     print "Unhandled response blob :", message
             return
 
-        if blob.total_size == 4 and data == ('\x00' * 4):
+        if self._is_data_preparation_blob(blob):
             self._on_data_preparation_blob_received(blob)
         else:
             self._on_data_blob_received(blob)
 
+    def _is_data_preparation_blob(self, blob):
+        # only read the data of the blobs that can be a data preparation,
+        # the others may be large files
+        return blob.total_size == 4 and blob.read_data() == ('\x00' * 4)
+
     def _on_data_chunk_transferred(self, chunk):
         if chunk.has_progressed():
             self.emit("progressed", len(chunk.body))
@@ -255,6 +264,7 @@ class P2PSession(gobject.GObject):
 
     def _on_data_blob_received(self, blob):
         logger.info("Session data transfer completed")
+        self._data_digest = blob.digest
         blob.data.seek(0, 0)
         self.emit("completed", blob.data)
         self._close()
@@ -47,6 +47,8 @@ class P2PSessionManager(gobject.GObject):
 
         self._client = client
         self._sessions = weakref.WeakValueDictionary() # session_id => session
+        self._sessions_by_call = weakref.WeakValueDictionary() # call_id => session
+        self._sessions_by_peer = {} # peer => WeakValueDictionary(session_id => session)
         self._handlers = []
         self._transport_manager = P2PTransportManager(self._client)
         self._transport_manager.connect("blob-received",
@@ -61,9 +63,20 @@ class P2PSessionManager(gobject.GObject):
 
     def _register_session(self, session):
         self._sessions[session.id] = session
+        self._sessions_by_call[session.call_id] = session
+        if session.peer not in self._sessions_by_peer:
+            self._sessions_by_peer[session.peer] = weakref.WeakValueDictionary()
+        self._sessions_by_peer[session.peer][session.id] = session
 
     def _unregister_session(self, session):
         del self._sessions[session.id]
+        if self._sessions_by_call.get(session.call_id) is session:
+            del self._sessions_by_call[session.call_id]
+        peer_sessions = self._sessions_by_peer.get(session.peer)
+        if peer_sessions is not None:
+            peer_sessions.pop(session.id, None)
+            if len(peer_sessions) == 0:
+                del self._sessions_by_peer[session.peer]
 
     def _on_chunk_transferred(self, chunk):
         session_id = chunk.header.session_id
@@ -81,29 +94,31 @@ class P2PSessionManager(gobject.GObject):
             return None
 
     def _search_session_by_call(self, call_id):
-        for session in self._sessions.itervalues():
-            if session.call_id == call_id:
-                return session
-        return None
+        return self._sessions_by_call.get(call_id, None)
+
+    def _search_sessions_by_peer(self, peer):
+        if peer not in self._sessions_by_peer:
+            return []
+        return self._sessions_by_peer[peer].values()
 
     def _blob_to_session(self, blob):
         session_id = blob.session_id
 
-        # Check to see if it's a signaling message
+        # Check to see if it's a signaling message, only its headers are
+        # needed to route it
         if session_id == 0:
             slp_data = blob.read_data()
             try:
-                message = SLPMessage.build(slp_data)
+                call_id, session_id = SLPMessage.peek(slp_data)
             except ParseError:
                 print slp_data
                 logger.warning('Received blob with SessionID=0 and non SLP data')
                 raise SLPError("Non SLP data for blob with null sessionID")
-            session_id = message.body.session_id
 
-        # Backward compatible with older clients that use the call-id
-        # for responses
-        if session_id == 0:
-            return self._search_session_by_call(message.call_id)
+            # Backward compatible with older clients that use the call-id
+            # for responses
+            if session_id == 0:
+                return self._search_session_by_call(call_id)
 
         return self._get_session(session_id)
 
@@ -20,9 +20,11 @@
 
 import papyon.util.string_io as StringIO
 
+import hashlib
 import struct
 import random
 import logging
+import tempfile
 
 __all__ = ['MessageBlob']
 
@@ -179,6 +181,8 @@ class MessageChunk(object):
 
 
 class MessageBlob(object):
+    SPOOL_SIZE = 1048576
+
     def __init__(self, application_id, data, total_size=None,
             session_id=None, blob_id=None, is_file=False):
         if data is not None:
@@ -186,6 +190,9 @@ class MessageBlob(object):
                 if len(data) > 0:
                     total_size = len(data)
                     data = StringIO.StringIO(data)
+                elif total_size > self.SPOOL_SIZE:
+                    # receive large blobs into a temporary file
+                    data = tempfile.NamedTemporaryFile(prefix="papyon-")
                 else:
                     data = StringIO.StringIO()
 
@@ -205,6 +212,8 @@ class MessageBlob(object):
         self.session_id = session_id
         self.id = blob_id or _generate_id()
         self.is_file = is_file
+        self._digest = hashlib.sha1()
+        self._digest_size = 0 # bytes hashed so far, from the beginning
 
     def __del__(self):
         #if self.data is not None:
@@ -232,6 +241,22 @@ class MessageBlob(object):
     def transferred(self):
         return self.current_size
 
+    @property
+    def digest(self):
+        """The SHA-1 digest of the data.
+
+        The chunks appended in order are hashed as they come, the rest of
+        the data is only read if some chunk came out of order."""
+        digest = self._digest.copy()
+        if self._digest_size < self.current_size:
+            self.data.seek(self._digest_size, 0)
+            data = self.data.read(65536)
+            while len(data) > 0:
+                digest.update(data)
+                data = self.data.read(65536)
+            self.data.seek(0, 0)
+        return digest.digest()
+
     def is_complete(self):
         return self.transferred == self.total_size
 
@@ -278,10 +303,13 @@ class MessageBlob(object):
         assert self.data is not None, "Trying to write to a Read Only blob"
         assert self.session_id == chunk.header.session_id, "Trying to append a chunk to the wrong blob"
         assert self.id == chunk.header.blob_id, "Trying to append a chunk to the wrong blob"
-        self.data.seek(chunk.header.blob_offset, 0)
+        offset = chunk.header.blob_offset
+        self.data.seek(offset, 0)
         self.data.write(chunk.body)
-        self.data.seek(0, 2)
-        self.current_size = self.data.tell()
+        if offset == self._digest_size:
+            self._digest.update(chunk.body)
+            self._digest_size += len(chunk.body)
+        self.current_size = max(self.current_size, offset + len(chunk.body))
 
 
 class ControlBlob(MessageBlob):
@@ -20,6 +20,8 @@
 
 from papyon.msnp2p.transport.TLP import TLPFlag, MessageChunk, ControlBlob
 
+from collections import deque
+
 import gobject
 import logging
 import weakref
@@ -39,11 +41,20 @@ class BaseP2PTransport(gobject.GObject):
                 (object,)),
             }
 
+    WINDOW = 8
+    RETRY_INTERVAL = 200
+    # True if the subclass calls _on_chunk_sent for the chunks it sends,
+    # otherwise they are taken out of the window from the main loop
+    REPORTS_SENT_CHUNKS = False
+
     def __init__(self, transport_manager, name):
         gobject.GObject.__init__(self)
         self._transport_manager = weakref.proxy(transport_manager)
         self._client = transport_manager._client
         self._name = name
+        self._window = self.WINDOW
+        self._sending = False
+        self._send_timer = None
 
         self._transport_manager._register_transport(self)
         self._reset()
@@ -64,15 +75,32 @@ class BaseP2PTransport(gobject.GObject):
     def max_chunk_size(self):
         raise NotImplementedError
 
+    def __get_window(self):
+        return self._window
+    def __set_window(self, window):
+        self._window = max(1, int(window))
+        self._process_send_queues()
+    window = property(__get_window, __set_window)
+
     def send(self, blob, callback=None, errback=None):
         if blob.is_control_blob():
             self._control_blob_queue.append((blob, callback, errback))
         else:
-            self._data_blob_queue.append((blob, callback, errback))
-        gobject.timeout_add(200, self._process_send_queues)
+            session_id = blob.session_id
+            if session_id not in self._data_blob_queues:
+                self._data_blob_queues[session_id] = deque()
+                self._data_sessions.append(session_id)
+            self._data_blob_queues[session_id].append((blob, callback, errback))
+        if self._send_timer is None:
+            self._send_timer = gobject.timeout_add(self.RETRY_INTERVAL,
+                    self._on_send_timeout)
         self._process_send_queues()
 
     def close(self):
+        if self._send_timer is not None:
+            gobject.source_remove(self._send_timer)
+            self._send_timer = None
+        self._reset()
         self._transport_manager._unregister_transport(self)
 
     def _send_chunk(self, chunk):
@@ -80,10 +108,14 @@ class BaseP2PTransport(gobject.GObject):
 
     # Helper methods
     def _reset(self):
-        self._control_blob_queue = []
-        self._data_blob_queue = []
+        self._control_blob_queue = deque()
+        self._data_blob_queues = {} # session_id : deque([(blob, callback, errback) ...])
+        self._data_sessions = deque() # session_ids of the data_blob_queues, in sending order
         self._pending_blob = {} # blob_id : (blob, callback, errback)
         self._pending_ack = {} # blob_id : [blob_offset1, blob_offset2 ...]
+        self._in_flight = 0 # chunks sent and not reported by _on_chunk_sent yet
+        self._in_flight_blobs = {} # blob_id : chunks of the blob in _in_flight
+        self._progress = False # a chunk was reported or acked since the last timeout
 
     def _add_pending_ack(self, blob_id, chunk_id=0):
         if blob_id not in self._pending_ack:
@@ -104,6 +136,9 @@ class BaseP2PTransport(gobject.GObject):
 
         if chunk.header.flags & TLPFlag.ACK:
             self._del_pending_ack(chunk.header.dw1, chunk.header.dw2)
+            # the peer has the whole blob, the reports of its chunks that
+            # didn't come are not waited for anymore
+            self._release_in_flight(chunk.header.dw1)
             if chunk.header.dw1 in self._pending_blob:
                 blob, callback, errback = self._pending_blob[chunk.header.dw1]
                 del self._pending_blob[blob.id]
@@ -118,30 +153,101 @@ class BaseP2PTransport(gobject.GObject):
         self._process_send_queues()
 
     def _on_chunk_sent(self, chunk):
+        self._release_in_flight(chunk.header.blob_id, 1)
         self.emit("chunk-sent", chunk)
         self._process_send_queues()
 
+    def _on_send_timeout(self):
+        # the underlying transport may lose or never send the reports of
+        # some chunks, if nothing was reported or acked since the last
+        # timeout the chunks in flight are not waited for anymore
+        if not self._progress:
+            self._in_flight = 0
+            self._in_flight_blobs.clear()
+        self._progress = False
+        self._process_send_queues()
+        if len(self._control_blob_queue) > 0 or len(self._data_sessions) > 0:
+            return True
+        self._send_timer = None
+        return False
+
+    def _add_in_flight(self, blob_id):
+        self._in_flight += 1
+        self._in_flight_blobs[blob_id] = \
+                self._in_flight_blobs.get(blob_id, 0) + 1
+
+    def _release_in_flight(self, blob_id, count=None):
+        """Remove count chunks of the blob from the window, all of them if
+        count is None."""
+        in_flight = self._in_flight_blobs.get(blob_id, 0)
+        if count is None or count > in_flight:
+            count = in_flight
+        if count == 0:
+            return
+        if count == in_flight:
+            del self._in_flight_blobs[blob_id]
+        else:
+            self._in_flight_blobs[blob_id] = in_flight - count
+        self._in_flight -= count
+        self._progress = True
+
     def _process_send_queues(self):
+        """Send chunks until the window is full or the queues are empty.
+
+        Control blobs go first, then the data blobs take turns chunk by
+        chunk, one session after another, the blobs of a session being
+        sent in order."""
+        if self._sending:
+            # called back from _send_chunk, the loop below goes on
+            return False
+
+        self._sending = True
+        sent = False
+        try:
+            while self._in_flight < self._window:
+                chunk = self._next_chunk()
+                if chunk is None:
+                    break
+                if chunk.require_ack():
+                    self._add_pending_ack(chunk.header.blob_id,
+                            chunk.header.dw1)
+                self._add_in_flight(chunk.header.blob_id)
+                sent = True
+                self._send_chunk(chunk)
+                if not self.REPORTS_SENT_CHUNKS:
+                    gobject.idle_add(self._on_chunk_sent, chunk)
+        finally:
+            self._sending = False
+        return sent
+
+    def _next_chunk(self):
         if len(self._control_blob_queue) > 0:
             queue = self._control_blob_queue
-        elif len(self._data_blob_queue) > 0:
-            queue = self._data_blob_queue
+            blob, callback, errback = queue[0]
+            chunk = blob.get_chunk(self.max_chunk_size)
+            if blob.is_complete():
+                queue.popleft()
+        elif len(self._data_sessions) > 0:
+            session_id = self._data_sessions[0]
+            queue = self._data_blob_queues[session_id]
+            blob, callback, errback = queue[0]
+            chunk = blob.get_chunk(self.max_chunk_size)
+            if blob.is_complete():
+                queue.popleft()
+            if len(queue) == 0:
+                self._data_sessions.popleft()
+                del self._data_blob_queues[session_id]
+            else:
+                self._data_sessions.rotate(-1)
         else:
-            return False
+            return None
 
-        blob, callback, errback = queue[0]
-        chunk = blob.get_chunk(self.max_chunk_size)
         if blob.is_complete():
-            queue.pop(0)
             if blob.is_data_blob():
                 self._pending_blob[blob.id] = (blob, callback, errback)
             elif callback:
                 callback[0](*callback[1:])
-
-        if chunk.require_ack() :
-            self._add_pending_ack(chunk.header.blob_id, chunk.header.dw1)
-        self._send_chunk(chunk)
-        return True
+        return chunk
 
     def _send_ack(self, received_chunk):
         flags = received_chunk.header.flags
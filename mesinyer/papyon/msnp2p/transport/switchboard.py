@@ -33,6 +33,8 @@ logger = logging.getLogger('papyon.msnp2p.transport')
 
 
 class SwitchboardP2PTransport(BaseP2PTransport, SwitchboardClient):
+    REPORTS_SENT_CHUNKS = True
+
     def __init__(self, client, contacts, transport_manager):
         SwitchboardClient.__init__(self, client, contacts)
         BaseP2PTransport.__init__(self, transport_manager, "switchboard")
@@ -89,7 +89,7 @@ class P2PTransportManager(gobject.GObject):
             if blob_id in self._signaling_blobs:
                 blob = self._signaling_blobs[blob_id]
             else:
-                # create an in-memory blob
+                # create a receive blob, large ones are kept on disk
                 blob = MessageBlob(chunk.application_id, "",
                     chunk.header.blob_size,
                     session_id, chunk.header.blob_id)
@@ -100,7 +100,7 @@ class P2PTransportManager(gobject.GObject):
                 if blob.transferred == 0:
                     blob.id = chunk.header.blob_id
             else:
-                # create an in-memory blob
+                # create a receive blob, large ones are kept on disk
                 blob = MessageBlob(chunk.application_id, "",
                         chunk.header.blob_size,
                         session_id, chunk.header.blob_id)
@@ -126,7 +126,12 @@ class MSNObject(object):
         return hash(str(self._type) + self._data_sha)
 
     def __set_data(self, data):
-        if self._data_sha != self.__compute_data_hash(data):
+        self._set_data(data)
+
+    def _set_data(self, data, digest=None):
+        if digest is None:
+            digest = self.__compute_data_hash(data)
+        if self._data_sha != digest:
             logger.warning("Received data doesn't match the MSNObject data hash.")
             return
 
@@ -263,7 +268,7 @@ class MSNObjectStore(object):
     def _outgoing_session_transfer_completed(self, session, data):
         handle_id, callback, errback, msn_object = self._outgoing_sessions[session]
         session.disconnect(handle_id)
-        msn_object._data = data
+        msn_object._set_data(data, session.data_digest)
 
         callback[0](msn_object, *callback[1:])
         del self._outgoing_sessions[session]
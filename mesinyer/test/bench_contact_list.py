@@ -0,0 +1,143 @@
+'''benchmark filling the gtk contact list and feeding it a storm of presence
+changes, finding the rows with the account index and scanning the model as
+the contact list used to do, and queueing the changes to update each contact
+once on a flush
+
+the widget is never shown, on a machine without a display run it with
+xvfb-run
+
+usage: python test/bench_contact_list.py [number of contacts] [updates]'''
+import os
+import sys
+import time
+import random
+sys.path.append(os.path.abspath('.'))
+
+import e3
+from e3.base.Worker import EVENTS
+from gui import gtkui
+from gui.gtkui import ContactList
+
+CONTACTS = 2000
+GROUPS = 20
+UPDATES = 10000
+
+class Session(object):
+    '''the parts of a session used by the contact list'''
+
+    def __init__(self):
+        '''constructor'''
+        self.contacts = e3.ContactManager('me@emesene.org')
+        self.groups = {}
+        self.config = e3.common.Config()
+        self.signals = e3.common.Signals(EVENTS, e3.common.Mailbox())
+
+class LinearContactList(ContactList.ContactList):
+    '''a contact list that finds the rows scanning the model'''
+
+    def _get_group_iter(self, group):
+        '''return the iter of the row of group, None if it isn't on the
+        list'''
+        for row in self._model:
+            obj = row[1]
+            if type(obj) == e3.Group and obj.name == group.name:
+                return row.iter
+
+        return None
+
+    def _get_contact_iters(self, contact):
+        '''return a list of (group name, iter) with the rows of contact'''
+        iters = []
+
+        for row in self._model:
+            obj = row[1]
+            if type(obj) == e3.Group:
+                for contact_row in row.iterchildren():
+                    if contact_row[1].account == contact.account:
+                        iters.append((obj.name, contact_row.iter))
+            elif obj.account == contact.account:
+                iters.append((None, row.iter))
+
+        return iters
+
+def create_session(contacts):
+    '''return a session with contacts on GROUPS groups, some contacts are
+    on two groups and some on none'''
+    session = Session()
+
+    for num in xrange(GROUPS):
+        group = e3.Group('group %d' % num, str(num))
+        session.groups[group.identifier] = group
+
+    groups = session.groups.values()
+
+    for num in xrange(contacts):
+        contact = e3.Contact('contact%d@emesene.org' % num, str(num),
+            'contact %d' % num, 'message %d' % num)
+        session.contacts.contacts[contact.account] = contact
+
+        if num % 10 == 0:
+            continue
+
+        for group in random.sample(groups, 1 + (num % 7 == 0)):
+            group.contacts.append(contact.account)
+            contact.groups.append(group.identifier)
+
+    return session
+
+def run(cls, session, updates, queued=False):
+    '''fill a contact list of class cls and update it, queue the updates and
+    flush them if queued is True, return the time to fill it and the time
+    per update in milliseconds'''
+    contact_list = cls(session)
+
+    start = time.time()
+    contact_list.fill()
+    fill_time = time.time() - start
+
+    contacts = session.contacts.contacts.values()
+    statuses = e3.status.ORDERED
+
+    start = time.time()
+
+    for num in xrange(updates):
+        contact = random.choice(contacts)
+        contact.status = random.choice(statuses)
+
+        if queued:
+            contact_list.queue_update(contact)
+        else:
+            contact_list.update_contact(contact)
+
+    # the flush is scheduled on the main loop, that isn't running here
+    contact_list.flush_updates()
+
+    update_time = (time.time() - start) / updates * 1000
+
+    contact_list.destroy()
+
+    return (fill_time, update_time)
+
+def main():
+    '''run the benchmark and print the results'''
+    contacts = CONTACTS
+    updates = UPDATES
+
+    if len(sys.argv) > 1:
+        contacts = int(sys.argv[1])
+
+    if len(sys.argv) > 2:
+        updates = int(sys.argv[2])
+
+    gtkui.setup()
+    session = create_session(contacts)
+
+    for (name, cls, queued) in (('queued', ContactList.ContactList, True),
+            ('index', ContactList.ContactList, False),
+            ('scan', LinearContactList, False)):
+        (fill_time, update_time) = run(cls, session, updates, queued)
+        print '%-6s fill %d contacts in %6.2f seconds, %7.3f ms per ' \
+            'update' % (name, contacts, fill_time, update_time)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''benchmark replacing the emoticons of long messages with
+MarkupParser.parse_emotes and with the previous implementation, that split
+the message on each shortcut
+
+usage: python test/bench_emotes.py [message length] [messages]'''
+import os
+import sys
+import time
+import random
+sys.path.append(os.path.abspath('.'))
+
+import gui
+from gui.base import MarkupParser
+
+LENGTH = 10000
+MESSAGES = 100
+
+WORDS = ('hello', 'world', 'how', 'are', 'you', '(see)', 'this:', 'a', 'b')
+
+def split_parse_emotes(message, cedict=None):
+    '''the previous implementation of MarkupParser.parse_emotes'''
+    chunks = [message]
+    shortcuts = gui.Theme.EMOTES.keys()
+    if cedict is not None:
+        shortcuts.extend(cedict.keys())
+    temp = []
+
+    while len(shortcuts) > 0:
+        shortcut = shortcuts.pop()
+        temp = []
+
+        for chunk in chunks:
+            parts = chunk.split(shortcut)
+
+            if len(parts) > 1:
+                if shortcut in gui.Theme.EMOTES.keys():
+                    path = gui.theme.emote_to_path(shortcut)
+                else:
+                    path = cedict[shortcut]
+                tag = '<img src="%s" alt="%s"/>' % (path, shortcut)
+
+                for part in parts:
+                    temp.append(part)
+                    temp.append(tag)
+
+                temp.pop()
+            else:
+                temp.append(chunk)
+
+        chunks = temp
+
+    return ''.join(chunks)
+
+def create_message(length):
+    '''return a message of about length characters with some emoticons'''
+    shortcuts = gui.Theme.EMOTES.keys()
+    words = []
+    size = 0
+
+    while size < length:
+        if random.random() < 0.05:
+            word = random.choice(shortcuts)
+        else:
+            word = random.choice(WORDS)
+
+        words.append(word)
+        size += len(word) + 1
+
+    return ' '.join(words)
+
+def main():
+    '''run the benchmark and print the results'''
+    length = LENGTH
+    count = MESSAGES
+
+    if len(sys.argv) > 1:
+        length = int(sys.argv[1])
+
+    if len(sys.argv) > 2:
+        count = int(sys.argv[2])
+
+    messages = [create_message(length) for num in xrange(count)]
+    cedict = {'(see)': '/tmp/see.png', 'this:': '/tmp/this.png'}
+
+    for (name, parse) in (('tokenizer', MarkupParser.parse_emotes),
+            ('split', split_parse_emotes)):
+        start = time.time()
+
+        for message in messages:
+            parse(message, cedict)
+
+        elapsed = time.time() - start
+        print '%-10s %d messages of %d characters in %6.2f seconds ' \
+            '(%.2f ms per message)' % (name, count, length, elapsed,
+                elapsed / count * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+'''benchmark the receive buffer of papyon.gnet.parser feeding multi megabyte
+streams in small reads through DelimiterParser and HTTPParser, and through
+the previous implementation that concatenated and split a string
+
+usage: python test/bench_gnet_parser.py [megabytes] [read size]'''
+import os
+import sys
+import time
+sys.path.append(os.path.abspath('.'))
+
+from papyon.gnet import io
+from papyon.gnet import parser
+
+MEGABYTES = 4
+READ_SIZE = 2048
+
+class StringDelimiterParser(parser.DelimiterParser):
+    '''the previous implementation of DelimiterParser'''
+
+    # hide the property of DelimiterParser
+    _recv_cache = None
+
+    def _reset_state(self):
+        self._recv_cache = ""
+
+    def _on_received(self, transport, buf, length):
+        self._recv_cache += buf
+        self._process_recv_cache()
+
+    def _process_recv_cache(self):
+        if len(self._recv_cache) == 0:
+            return
+        if self._chunk_delimiter is None or self._chunk_delimiter == "":
+            self.emit("received", self._recv_cache)
+            self._recv_cache = ""
+            return
+
+        previous_length = len(self._recv_cache)
+        while len(self._recv_cache) != 0:
+            if isinstance(self._chunk_delimiter, int):
+                available = len(self._recv_cache)
+                required = self._chunk_delimiter
+                if required <= available:
+                    self.emit ("received", self._recv_cache[:required])
+                    self._recv_cache = self._recv_cache[required:]
+            else:
+                s = self._recv_cache.split(self._chunk_delimiter, 1)
+                if len(s) > 1:
+                    self.emit("received", s[0])
+                    self._recv_cache = s[1]
+                else:
+                    self._recv_cache = s[0]
+            if len(self._recv_cache) == previous_length:
+                return
+            previous_length = len(self._recv_cache)
+
+class StringHTTPParser(parser.HTTPParser):
+    '''an HTTPParser using the previous implementation of DelimiterParser'''
+
+    def __init__(self, transport):
+        self._parser = StringDelimiterParser(transport)
+        self._parser.connect("received", self._on_chunk_received)
+        transport.connect("notify::status", self._on_status_change)
+        parser.AbstractParser.__init__(self, transport, connect_signals=False)
+
+def msnp_stream(size):
+    '''return a stream of commands and commands with payload (like MSG and
+    UBX) of about size bytes'''
+    commands = []
+    length = 0
+    num = 0
+
+    while length < size:
+        payload = 'MIME-Version: 1.0\r\n\r\n' + 'x' * (num % 1500)
+        command = 'NLN NLN contact%d@hotmail.com 1 nick 0\r\n' \
+            'MSG contact%d@hotmail.com nick %d\r\n%s' % (num, num,
+                len(payload), payload)
+        commands.append(command)
+        length += len(command)
+        num += 1
+
+    return ''.join(commands)
+
+def http_stream(size, body_size):
+    '''return a stream of http responses with bodies of body_size bytes of
+    about size bytes'''
+    body = 'x' * body_size
+    response = 'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n' \
+        'Content-Length: %d\r\n\r\n%s' % (len(body), body)
+
+    return response * max(1, size / len(response))
+
+def on_msnp_chunk(delimiter_parser, chunk, chunks):
+    '''switch between lines and payloads like papyon.transport does'''
+    chunks.append(len(chunk))
+
+    if isinstance(delimiter_parser.delimiter, int):
+        delimiter_parser.delimiter = '\r\n'
+    elif chunk.startswith('MSG'):
+        delimiter_parser.delimiter = int(chunk.rsplit(' ', 1)[1])
+
+def feed(transport, data, read_size):
+    '''emit data on transport in reads of read_size bytes, return the
+    elapsed time'''
+    start = time.time()
+
+    for offset in xrange(0, len(data), read_size):
+        chunk = data[offset:offset + read_size]
+        transport.emit('received', chunk, len(chunk))
+
+    return time.time() - start
+
+def run_delimiter(cls, data, read_size):
+    '''feed data to a delimiter parser of class cls, return the elapsed time
+    and the number of chunks'''
+    transport = io.AbstractClient('127.0.0.1', 1)
+    delimiter_parser = cls(transport)
+    delimiter_parser.delimiter = '\r\n'
+    chunks = []
+    delimiter_parser.connect('received', on_msnp_chunk, chunks)
+
+    return feed(transport, data, read_size), len(chunks)
+
+def run_http(cls, data, read_size):
+    '''feed data to an http parser of class cls, return the elapsed time and
+    the number of responses'''
+    transport = io.AbstractClient('127.0.0.1', 1)
+    http_parser = cls(transport)
+    responses = []
+    http_parser.connect('received',
+        lambda http_parser, response: responses.append(response))
+
+    return feed(transport, data, read_size), len(responses)
+
+def main():
+    '''run the benchmark and print the results'''
+    size = MEGABYTES * 1024 * 1024
+    read_size = READ_SIZE
+
+    if len(sys.argv) > 1:
+        size = int(float(sys.argv[1]) * 1024 * 1024)
+
+    if len(sys.argv) > 2:
+        read_size = int(sys.argv[2])
+
+    megabytes = size / 1048576.0
+    cases = (
+        ('msnp commands', msnp_stream(size), run_delimiter,
+            parser.DelimiterParser, StringDelimiterParser),
+        ('http 64 KB bodies', http_stream(size, 65536), run_http,
+            parser.HTTPParser, StringHTTPParser),
+        ('http one body', http_stream(size, size), run_http,
+            parser.HTTPParser, StringHTTPParser))
+
+    for (name, data, run, cls, string_cls) in cases:
+        for (kind, parser_cls) in (('buffer', cls), ('string', string_cls)):
+            elapsed, count = run(parser_cls, data, read_size)
+            print '%-18s %-6s %.1f MB in %d byte reads: %7.3f seconds ' \
+                '(%6.1f MB/s, %d chunks)' % (name, kind, megabytes,
+                    read_size, elapsed, megabytes / elapsed, count)
+
+if __name__ == '__main__':
+    main()
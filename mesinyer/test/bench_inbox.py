@@ -0,0 +1,109 @@
+'''benchmark the time from an action added to the session until the command
+it generates is written to the socket, with the old worker loop that polled
+three queues and with the loop that waits on the session inbox'''
+import os
+import sys
+import time
+import Queue
+import random
+import socket
+import threading
+sys.path.append(os.path.abspath('.'))
+
+from e3.common import Mailbox
+from e3.msn.Reactor import Reactor
+from e3.msn.MsnSocket import MsnSocket
+
+ACTIONS = 50
+
+def polling_loop(output, command_queue, actions, msn_socket):
+    '''the worker loop as it was before the inbox'''
+    while True:
+        try:
+            output.get(True, 0.1)
+            continue
+        except Queue.Empty:
+            pass
+
+        try:
+            command_queue.get(True, 0.1)
+        except Queue.Empty:
+            pass
+
+        try:
+            action = actions.get(True, 0.1)
+
+            if action is None:
+                break
+
+            msn_socket.send_command('PNG')
+        except Queue.Empty:
+            pass
+
+def inbox_loop(inbox, msn_socket):
+    '''the worker loop waiting on the session inbox'''
+    while True:
+        tag, action = inbox.get()
+
+        if action is None:
+            break
+
+        msn_socket.send_command('PNG')
+
+def measure(name, put, msn_socket, reader):
+    '''put ACTIONS actions with put and measure the time until the command
+    is read from reader'''
+    latencies = []
+
+    for num in xrange(ACTIONS):
+        # wait a random time so the action arrives at any point of the loop
+        time.sleep(random.random() * 0.05)
+        start = time.time()
+        put(num)
+        reader.recv(4096)
+        latencies.append(time.time() - start)
+
+    put(None)
+    latencies.sort()
+    print '%s: mean %.2f ms, median %.2f ms, max %.2f ms' % (name,
+        sum(latencies) / len(latencies) * 1000,
+        latencies[len(latencies) / 2] * 1000, latencies[-1] * 1000)
+
+def connected_socket(reactor):
+    '''return a MsnSocket connected to a socket pair and the other side
+    of the pair'''
+    reader, writer = socket.socketpair()
+    writer.setblocking(False)
+    msn_socket = MsnSocket(reactor=reactor)
+    msn_socket.socket.close()
+    msn_socket.socket = writer
+    msn_socket._fileno = writer.fileno()
+    reactor.add(msn_socket)
+
+    return msn_socket, reader
+
+def main():
+    '''run the benchmark and print the results'''
+    reactor = Reactor()
+    reactor.start()
+
+    msn_socket, reader = connected_socket(reactor)
+    actions = Queue.Queue()
+    thread = threading.Thread(target=polling_loop, args=(Queue.Queue(),
+        Queue.Queue(), actions, msn_socket))
+    thread.start()
+    measure('polling loop', actions.put, msn_socket, reader)
+    thread.join()
+
+    msn_socket, reader = connected_socket(reactor)
+    inbox = Mailbox()
+    thread = threading.Thread(target=inbox_loop, args=(inbox, msn_socket))
+    thread.start()
+    measure('inbox loop', inbox.slot('action').put, msn_socket, reader)
+    thread.join()
+
+    reactor.quit()
+    reactor.join(1)
+
+if __name__ == '__main__':
+    main()
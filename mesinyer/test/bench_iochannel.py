@@ -0,0 +1,94 @@
+'''benchmark sending large payloads and many small packets with
+papyon.gnet.io.SocketClient over a local socket pair, and with the previous
+send path, that copied the rest of the packet to write 2 KB of it on each
+write
+
+usage: python test/bench_iochannel.py [megabytes]'''
+import os
+import sys
+import time
+import socket
+import threading
+sys.path.append(os.path.abspath('.'))
+
+import gobject
+
+from papyon.gnet.io import SocketClient
+
+MEGABYTES = 5
+SMALL_PACKETS = 20000
+SMALL_SIZE = 100
+
+class SlicingSocketClient(SocketClient):
+    '''a client that writes like the previous implementation'''
+
+    def _next_write(self):
+        '''return 2 KB of the first packet copying the rest of it'''
+        item = self._outgoing_queue[0]
+        return item.buffer[item._sent:][0:2048]
+
+def receive(sock, total, loop):
+    '''read total bytes from sock and quit loop'''
+    received = 0
+
+    while received < total:
+        data = sock.recv(262144)
+
+        if not data:
+            break
+
+        received += len(data)
+
+    gobject.idle_add(loop.quit)
+
+def run(cls, packets):
+    '''send packets with a client of class cls, return the elapsed time'''
+    (local, remote) = socket.socketpair()
+    client = cls('127.0.0.1', 1)
+    client._pre_open(local)
+    client._post_open()
+
+    loop = gobject.MainLoop()
+    total = sum([len(packet) for packet in packets])
+    reader = threading.Thread(target=receive, args=(remote, total, loop))
+    reader.start()
+
+    start = time.time()
+
+    for packet in packets:
+        client.send(packet)
+
+    loop.run()
+    elapsed = time.time() - start
+
+    reader.join()
+    client.close()
+    remote.close()
+
+    return elapsed
+
+def main():
+    '''run the benchmark and print the results'''
+    megabytes = MEGABYTES
+
+    if len(sys.argv) > 1:
+        megabytes = float(sys.argv[1])
+
+    gobject.threads_init()
+    size = int(megabytes * 1024 * 1024)
+    cases = (
+        ('one %.1f MB packet' % megabytes, ['x' * size]),
+        ('%d packets of %d bytes' % (SMALL_PACKETS, SMALL_SIZE),
+            ['x' * SMALL_SIZE] * SMALL_PACKETS))
+
+    for (name, packets) in cases:
+        total = sum([len(packet) for packet in packets]) / 1048576.0
+
+        for (kind, cls) in (('window', SocketClient),
+                ('slicing', SlicingSocketClient)):
+            elapsed = run(cls, packets)
+            print '%-26s %-8s %7.3f seconds (%7.1f MB/s)' % (name, kind,
+                elapsed, total / elapsed)
+
+if __name__ == '__main__':
+    main()
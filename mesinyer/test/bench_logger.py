@@ -0,0 +1,104 @@
+'''benchmark the history queries of e3.base.Logger on a database with many
+synthetic events, with and without the indexes
+
+usage: python test/bench_logger.py [number of events]'''
+import os
+import sys
+import time
+import random
+import tempfile
+sys.path.append(os.path.abspath('.'))
+
+from e3.base import Logger
+
+EVENTS = 1000000
+CONTACTS = 200
+
+def fill(logger, events):
+    '''add events to logger, return the list of contact accounts'''
+    me = Logger.Account(None, None, 'me@emesene.org', 1, 'me', 'hi', '')
+    contacts = [Logger.Account(None, None, 'contact%d@emesene.org' % num, 1,
+        'contact %d' % num, 'message %d' % num, '') for num in xrange(CONTACTS)]
+    names = ('nick change', 'status change', 'message change')
+    payload = 'text/plain; charset=UTF-8\r\nX-MMS-IM-Format: FN=Arial\r\n' \
+        '\r\n%s'
+
+    start = time.time()
+
+    for num in xrange(events):
+        contact = random.choice(contacts)
+
+        if num % 10 == 0:
+            logger.add_event(random.choice(names), 1, str(num), contact)
+        elif num % 2:
+            logger.add_event('message', 1, payload % num, contact, me)
+        else:
+            logger.add_event('message', 1, payload % num, me, contact)
+
+    logger.commit()
+    elapsed = time.time() - start
+    print 'inserted %d events in %.1f seconds (%.0f events/second)' % \
+        (events, elapsed, events / elapsed)
+
+    return [contact.account for contact in contacts]
+
+def time_queries(logger, accounts):
+    '''time each get_* query over some contacts'''
+    queries = (
+        ('get_nicks', lambda acc: logger.get_nicks(acc, 1000)),
+        ('get_messages', lambda acc: logger.get_messages(acc, 1000)),
+        ('get_status', lambda acc: logger.get_status(acc, 1000)),
+        ('get_sent_messages', lambda acc: logger.get_sent_messages(
+            'me@emesene.org', acc, 1000)),
+        ('get_chats', lambda acc: logger.get_chats(acc, 'me@emesene.org',
+            1000)),
+        ('get_chats_between', lambda acc: logger.get_chats_between(acc,
+            'me@emesene.org', time.time() - 3600, time.time(), 1000)),
+        ('get_chats_page', lambda acc: logger.get_chats_page(acc,
+            'me@emesene.org', None, None, None, 100)),
+        ('search', lambda acc: logger.search(acc, '12345', 1000)),
+    )
+
+    for (name, query) in queries:
+        start = time.time()
+
+        for account in accounts:
+            query(account)
+
+        print '  %-20s %8.2f ms' % (name,
+            (time.time() - start) / len(accounts) * 1000)
+
+def main():
+    '''run the benchmark and print the results'''
+    if len(sys.argv) > 1:
+        events = int(sys.argv[1])
+    else:
+        events = EVENTS
+
+    path = tempfile.mktemp('.db')
+
+    try:
+        logger = Logger.Logger(path)
+        accounts = fill(logger, events)[:20]
+        print 'database size: %.1f MB' % (os.path.getsize(path) / 1048576.0)
+
+        print 'with indexes:'
+        time_queries(logger, accounts)
+
+        for statement in ('DROP INDEX i_fact_event_src;',
+                'DROP INDEX i_fact_event_chat;',
+                'DROP INDEX i_fact_event_tmstp;'):
+            logger.execute(statement)
+
+        logger.commit()
+
+        print 'without indexes:'
+        time_queries(logger, accounts)
+        logger.close()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+if __name__ == '__main__':
+    main()
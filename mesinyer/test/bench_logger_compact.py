@@ -0,0 +1,107 @@
+'''report the size and insert rate of the history database when a new d_info
+and d_time row is added for each event (as the logger used to do), after
+compacting it and when the rows are reused
+
+usage: python test/bench_logger_compact.py [number of events]'''
+import os
+import sys
+import time
+import tempfile
+sys.path.append(os.path.abspath('.'))
+
+from e3.base import Logger
+
+EVENTS = 100000
+CONTACTS = 200
+
+class DuplicatingLogger(Logger.Logger):
+    '''a logger that never finds the existing d_info and d_time rows'''
+
+    def _get_cached(self, cache, key, query):
+        '''always return None so a new row is inserted'''
+        return None
+
+def fill(logger, events):
+    '''add events to logger alternating the nick of the contacts, return the
+    number of events per second'''
+    me = Logger.Account(None, None, 'me@emesene.org', 1, 'me', 'hi', '')
+    contacts = [Logger.Account(None, None, 'contact%d@emesene.org' % num, 1,
+        'contact %d' % num, 'message %d' % num, '') for num in xrange(CONTACTS)]
+    payload = 'text/plain; charset=UTF-8\r\nX-MMS-IM-Format: FN=Arial\r\n' \
+        '\r\n%s'
+
+    start = time.time()
+
+    for num in xrange(events):
+        contact = contacts[num % CONTACTS]
+        # a contact that changes the nick back and forth creates a new
+        # d_info row on each change
+        contact.nick = 'contact %d %s' % (num % CONTACTS, 'ab'[num % 3 == 0])
+
+        if num % 2:
+            logger.add_event('message', 1, payload % num, contact, me)
+        else:
+            logger.add_event('message', 1, payload % num, me, contact)
+
+    logger.commit()
+
+    return events / (time.time() - start)
+
+def size(logger, path):
+    '''return the size of the database in MB and the rows on the dimensions'''
+    logger.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+    logger.execute('SELECT COUNT(*) FROM d_info;')
+    infos = logger.cursor.fetchone()[0]
+    logger.execute('SELECT COUNT(*) FROM d_time;')
+    times = logger.cursor.fetchone()[0]
+
+    return (os.path.getsize(path) / 1048576.0, infos, times)
+
+def report(name, logger, path, rate=None):
+    '''print the size of the database'''
+    (megabytes, infos, times) = size(logger, path)
+    line = '%-10s %7.1f MB %8d d_info rows %8d d_time rows' % (name,
+        megabytes, infos, times)
+
+    if rate is not None:
+        line += ' %8.0f events/second' % rate
+
+    print line
+
+def remove(path):
+    '''remove the database and its journal'''
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def main():
+    '''run the benchmark and print the results'''
+    if len(sys.argv) > 1:
+        events = int(sys.argv[1])
+    else:
+        events = EVENTS
+
+    path = tempfile.mktemp('.db')
+
+    try:
+        logger = DuplicatingLogger(path)
+        report('before', logger, path, fill(logger, events))
+
+        start = time.time()
+        logger.compact()
+        elapsed = time.time() - start
+        report('compacted', logger, path)
+        print 'compacted in %.1f seconds' % elapsed
+        logger.close()
+    finally:
+        remove(path)
+
+    try:
+        logger = Logger.Logger(path)
+        report('interned', logger, path, fill(logger, events))
+        logger.close()
+    finally:
+        remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''benchmark exporting all the messages of a history database with many rows
+on each format of e3.base.LogExporter, and with save_logs_as_txt over a
+fully fetched result list
+
+usage: python test/bench_logger_export.py [number of messages]'''
+import os
+import sys
+import time
+import random
+import tempfile
+sys.path.append(os.path.abspath('.'))
+
+from e3.base import Logger
+from e3.base import LogExporter
+
+ROWS = 1000000
+CONTACTS = 200
+
+def fill(logger, rows):
+    '''add rows messages to logger, the dimensions are created by add_event
+    and the facts are inserted directly to fill the database faster'''
+    me = Logger.Account(None, None, 'me@emesene.org', 1, 'me', 'hi', '')
+    contacts = [Logger.Account(None, None, 'contact%d@emesene.org' % num, 1,
+        'contact %d' % num, 'message %d' % num, '') for num in xrange(CONTACTS)]
+    payload = 'text/plain; charset=UTF-8\r\nX-MMS-IM-Format: FN=Arial\r\n' \
+        '\r\n%s'
+
+    for contact in contacts:
+        logger.add_event('message', 1, payload % 'hi', contact, me)
+
+    logger.commit()
+    me = logger.accounts['me@emesene.org']
+    infos = [logger.accounts[contact.account] for contact in contacts]
+    id_event = logger.events['message']
+    id_time = logger.insert_time_now()
+    timestamp = time.time() - rows
+    facts = []
+
+    for num in xrange(rows):
+        contact = random.choice(infos)
+
+        if num % 2:
+            (src, dest) = (contact, me)
+        else:
+            (src, dest) = (me, contact)
+
+        facts.append((id_time, id_event, src.id, dest.id, src.id_account,
+            dest.id_account, 1, payload % ('message, "number" %d' % num),
+            timestamp + num))
+
+        if len(facts) == 10000:
+            logger.cursor.executemany(Logger.Logger.INSERT_FACT_EVENT, facts)
+            facts = []
+
+    logger.cursor.executemany(Logger.Logger.INSERT_FACT_EVENT, facts)
+    logger.commit()
+
+def main():
+    '''run the benchmark and print the results'''
+    if len(sys.argv) > 1:
+        rows = int(sys.argv[1])
+    else:
+        rows = ROWS
+
+    path = tempfile.mktemp('.db')
+    output = tempfile.mktemp()
+
+    try:
+        logger = Logger.Logger(path)
+        fill(logger, rows)
+
+        for format_ in sorted(LogExporter.EXPORTERS):
+            start = time.time()
+            count = logger.export_chats(None, None, None, None, output,
+                format_)
+            elapsed = time.time() - start
+            print '%-6s %8d rows in %6.2f seconds (%7.0f rows/second, ' \
+                '%.1f MB)' % (format_, count, elapsed, count / elapsed,
+                os.path.getsize(output) / 1048576.0)
+
+        # the previous way, fetch everything and then write it
+        start = time.time()
+        results = logger.get_chats_between('contact0@emesene.org',
+            'me@emesene.org', 0, time.time(), rows)
+        Logger.save_logs_as_txt(results, output)
+        elapsed = time.time() - start
+        print 'save_logs_as_txt (one contact) %d rows in %.2f seconds ' \
+            '(%.0f rows/second)' % (len(results), elapsed,
+                len(results) / elapsed)
+
+        start = time.time()
+        count = logger.export_chats('contact0@emesene.org', 'me@emesene.org',
+            None, None, output, 'txt')
+        elapsed = time.time() - start
+        print 'export_chats (one contact) %d rows in %.2f seconds ' \
+            '(%.0f rows/second)' % (count, elapsed, count / elapsed)
+
+        logger.close()
+    finally:
+        for name in (path, path + '-wal', path + '-shm', output):
+            if os.path.exists(name):
+                os.remove(name)
+
+if __name__ == '__main__':
+    main()
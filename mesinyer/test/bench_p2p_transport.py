@@ -0,0 +1,135 @@
+'''benchmark papyon.msnp2p transfers between two transports joined by a
+loopback link with some latency, sending 1, 4 and 16 blobs at the same time
+with the default window of BaseP2PTransport and with a window of one chunk,
+the stop and wait of the previous implementation
+
+the link is simulated by a small scheduler, the gobject main loop isn't used
+
+usage: python test/bench_p2p_transport.py [megabytes] [latency in ms]'''
+import os
+import sys
+import time
+import heapq
+sys.path.append(os.path.abspath('.'))
+
+from papyon.msnp2p.transport.base import BaseP2PTransport
+from papyon.msnp2p.transport.TLP import MessageBlob, MessageChunk
+
+MEGABYTES = 1.0
+LATENCY = 1
+TRANSFERS = (1, 4, 16)
+
+class Scheduler(object):
+    '''run callbacks at a given time'''
+
+    def __init__(self):
+        '''constructor'''
+        self.events = []
+        self.count = 0
+
+    def call_later(self, delay, callback, *args):
+        '''call callback with args in delay seconds'''
+        self.count += 1
+        heapq.heappush(self.events, (time.time() + delay, self.count,
+            callback, args))
+
+    def run(self, done):
+        '''run the callbacks until done returns True'''
+        while self.events and not done():
+            (when, count, callback, args) = heapq.heappop(self.events)
+            delay = when - time.time()
+
+            if delay > 0:
+                time.sleep(delay)
+
+            callback(*args)
+
+class TransportManager(object):
+    '''the parts of a P2PTransportManager used by the transports'''
+
+    _client = None
+
+    def _register_transport(self, transport):
+        '''do nothing'''
+        pass
+
+class LoopbackTransport(BaseP2PTransport):
+    '''a transport that delivers the chunks to another one after latency
+    seconds and reports them as sent after a round trip, like the
+    switchboard does with the acknowledgements of the server'''
+
+    REPORTS_SENT_CHUNKS = True
+
+    def __init__(self, transport_manager, scheduler, latency):
+        '''constructor'''
+        BaseP2PTransport.__init__(self, transport_manager, 'loopback')
+        self.scheduler = scheduler
+        self.latency = latency
+        self.other = None
+
+    @property
+    def peer(self):
+        return None
+
+    @property
+    def rating(self):
+        return 0
+
+    @property
+    def max_chunk_size(self):
+        return 1250
+
+    def _send_chunk(self, chunk):
+        '''deliver chunk to the other transport'''
+        self.scheduler.call_later(self.latency, self.other._on_chunk_received,
+            MessageChunk.parse(str(chunk)))
+        self.scheduler.call_later(self.latency * 2, self._on_chunk_sent,
+            chunk)
+
+def run(transfers, size, latency, window):
+    '''send transfers blobs of size bytes at the same time, return the
+    elapsed time'''
+    manager = TransportManager()
+    scheduler = Scheduler()
+    sender = LoopbackTransport(manager, scheduler, latency)
+    receiver = LoopbackTransport(manager, scheduler, latency)
+    sender.other = receiver
+    receiver.other = sender
+    sender.window = window
+    receiver.window = window
+    completed = []
+
+    start = time.time()
+
+    for num in xrange(transfers):
+        blob = MessageBlob(2, 'x' * size, session_id=num + 1)
+        sender.send(blob, (completed.append, blob))
+
+    scheduler.run(lambda: len(completed) == transfers)
+
+    return time.time() - start
+
+def main():
+    '''run the benchmark and print the results'''
+    megabytes = MEGABYTES
+    latency = LATENCY
+
+    if len(sys.argv) > 1:
+        megabytes = float(sys.argv[1])
+
+    if len(sys.argv) > 2:
+        latency = float(sys.argv[2])
+
+    size = int(megabytes * 1024 * 1024)
+
+    for transfers in TRANSFERS:
+        for (kind, window) in (('window', BaseP2PTransport.WINDOW),
+                ('stop and wait', 1)):
+            elapsed = run(transfers, size / transfers, latency / 1000.0,
+                window)
+            print '%2d transfers of %.2f MB %-13s %7.3f seconds ' \
+                '(%6.2f MB/s)' % (transfers, megabytes / transfers, kind,
+                    elapsed, megabytes / elapsed)
+
+if __name__ == '__main__':
+    main()
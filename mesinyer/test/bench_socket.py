@@ -0,0 +1,73 @@
+'''benchmark the line framing of e3.msn.MsnSocket replaying a synthetic
+login stream (ILN/NLN/UBX bursts) through a local socket pair'''
+import os
+import sys
+import time
+import socket
+import threading
+sys.path.append(os.path.abspath('.'))
+
+from e3.msn.Reactor import Reactor
+from e3.msn.MsnSocket import MsnSocket
+
+CONTACTS = 5000
+
+def login_stream(contacts=CONTACTS):
+    '''return a string that looks like the contact list burst received
+    from the notification server on login and the number of commands on it'''
+    lines = []
+
+    for num in xrange(contacts):
+        account = 'contact%d@hotmail.com' % num
+        lines.append('ILN 9 NLN %s 1 contact%%20%d 2789003324 %%3Cmsnobj/%%3E'
+            '\r\n' % (account, num))
+        payload = '<Data><PSM>personal message %d</PSM><CurrentMedia>' \
+            '</CurrentMedia></Data>' % num
+        lines.append('UBX %s 1 %d\r\n%s' % (account, len(payload), payload))
+        lines.append('NLN BSY %s 1 contact%%20%d 2789003324 0\r\n' % \
+            (account, num))
+
+    return ''.join(lines), len(lines)
+
+def main():
+    '''run the benchmark and print the results'''
+    data, total = login_stream()
+    reader, writer = socket.socketpair()
+    reader.setblocking(False)
+    done = threading.Event()
+    received = []
+
+    def handler(command):
+        received.append(command)
+
+        if len(received) == total:
+            done.set()
+
+    reactor = Reactor()
+    reactor.start()
+    msn_socket = MsnSocket(reactor=reactor)
+    msn_socket.socket.close()
+    msn_socket.socket = reader
+    msn_socket._fileno = reader.fileno()
+    msn_socket.handler = handler
+
+    start = time.time()
+    reactor.add(msn_socket)
+    writer.sendall(data)
+    done.wait(60)
+    elapsed = time.time() - start
+
+    writer.close()
+    msn_socket.quit()
+    reactor.quit()
+    reactor.join(1)
+
+    count = len(received)
+    print '%d commands (%d bytes) in %.3f seconds: %.0f lines/second' % \
+        (count, len(data), elapsed, count / elapsed)
+
+    if count != total:
+        print 'error: expected %d commands, got %d' % (total, count)
+
+if __name__ == '__main__':
+    main()
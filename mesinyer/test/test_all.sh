@@ -5,3 +5,13 @@ echo "testing e3.cache.EmoticonCache.py"
 python test/test_emoticon_cache.py
 echo "testing e3.cache.CacheManager.py"
 python test/test_cache_manager.py
+echo "testing e3.base.Logger.py"
+python test/test_logger.py
+echo "testing e3.base.ContactManager.py"
+python test/test_contact_manager.py
+echo "testing gui.gtkui.ContactList.py"
+python test/test_contact_list.py
+echo "testing papyon.msnp2p.transport.TLP.py"
+python test/test_p2p_blob.py
+echo "testing papyon.msnp2p.session_manager.py"
+python test/test_p2p_session_manager.py
@@ -2,6 +2,9 @@ import unittest
 
 import os
 import sys
+import time
+import shutil
+import tempfile
 import cStringIO
 sys.path.append(os.path.abspath('.'))
 
@@ -10,9 +13,13 @@ import testutils
 
 class TestCreate(unittest.TestCase):
     def setUp(self):
-        self.cache = cache.AvatarCache('tmp', 'user@host.com')
+        self.path = tempfile.mkdtemp()
+        self.cache = cache.AvatarCache(self.path, 'user@host.com')
         self.image_path = testutils.create_binary_file(self.cache.path)
 
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
     def test_insert(self):
         response = self.cache.insert(self.image_path)
         self.assertNotEqual(response, None, 'cache.insert should return a tuple')
@@ -37,6 +44,12 @@ class TestCreate(unittest.TestCase):
         response = self.cache.insert_raw(image)
         self.assertNotEqual(response, None, 'cache.insert_raw should return a tuple')
         self.assertTrue('last' in self.cache, 'last should be in cache')
+        stamp, hash_ = response
+        last_path = os.path.join(self.cache.path, 'last')
+        self.assertEqual(file(last_path, 'rb').read(), image.getvalue())
+        if hasattr(os, 'link'):
+            self.assertEqual(os.stat(last_path).st_ino,
+                    os.stat(os.path.join(self.cache.path, hash_)).st_ino)
 
     def test_remove(self):
         new_image_path = testutils.create_binary_file(self.cache.path)
@@ -46,6 +59,103 @@ class TestCreate(unittest.TestCase):
         self.assertTrue((stamp, hash_) not in items,
                 str((stamp, hash_)) + ' should not be in cache.list(): ' + str(items))
 
+    def test_remove_missing_file(self):
+        new_image_path = testutils.create_binary_file(self.cache.path)
+        stamp, hash_ = self.cache.insert(new_image_path)
+        # deleted outside the cache or evicted by the manager
+        os.remove(os.path.join(self.cache.path, hash_))
+        self.assertTrue(self.cache.remove(hash_), 'remove should return True')
+        self.assertTrue(hash_ not in self.cache, hash_ + ' should not be in cache')
+
+    def test_remove_persists(self):
+        new_image_path = testutils.create_binary_file(self.cache.path)
+        stamp, hash_ = self.cache.insert(new_image_path)
+        self.cache.remove(hash_)
+        # a new instance reads the index from the info file
+        other = cache.AvatarCache(self.path, 'user@host.com')
+        self.assertTrue(hash_ not in other, hash_ + ' should not be in cache')
+        self.assertTrue((stamp, hash_) not in other.list(),
+                str((stamp, hash_)) + ' should not be in cache.list()')
+
+    def test_compact(self):
+        hashes = [self.cache.insert_raw(cStringIO.StringIO('compact %d' % num))[1]
+                for num in xrange(10)]
+        for hash_ in hashes[:5]:
+            self.cache.remove(hash_)
+        items = self.cache.list()
+        self.cache.compact()
+        self.assertEqual(self.cache.parse(), items)
+        self.assertEqual(self.cache.obsolete, 0)
+
+class FailingFile(object):
+    '''a file like object that fails after the first read'''
+    def __init__(self):
+        self.reads = 0
+
+    def read(self, size):
+        self.reads += 1
+        if self.reads > 1:
+            raise IOError('read failed')
+        return 'x' * size
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = cache.AvatarCache(self.path, 'store@host.com')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_failed_store(self):
+        before = os.listdir(self.cache.path)
+        self.assertRaises(IOError, self.cache.store, FailingFile())
+        self.assertEqual(os.listdir(self.cache.path), before)
+
+    def test_mode(self):
+        hash_ = self.cache.store(cStringIO.StringIO('mode'))
+        mode = os.stat(os.path.join(self.cache.path, hash_)).st_mode & 0777
+        self.assertEqual(mode, cache.Cache.FILE_MODE)
+
+class TestIndex(unittest.TestCase):
+    ENTRIES = 10000
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = cache.AvatarCache(self.path, 'many@host.com')
+        hashes = ['%040x' % num for num in xrange(self.ENTRIES)]
+        handle = file(self.cache.info_path, 'w')
+        handle.write(''.join(['%d %s\n' % (num, hash_)
+            for (num, hash_) in enumerate(hashes)]))
+        handle.close()
+        self.hashes = hashes
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_lookup_time(self):
+        start = time.time()
+        avatars = cache.AvatarCache(self.path, 'many@host.com')
+        load_time = time.time() - start
+
+        start = time.time()
+        for hash_ in self.hashes:
+            self.assertTrue(hash_ in avatars, hash_ + ' should be in cache')
+            self.assertFalse(hash_[::-1] + 'x' in avatars)
+        lookup_time = time.time() - start
+
+        start = time.time()
+        for num in xrange(100):
+            self.assertEqual(len(avatars.list()), self.ENTRIES)
+        list_time = time.time() - start
+
+        # the lookups and listings don't read the disk, the limits are far
+        # from the expected times so the test doesn't fail on slow machines
+        self.assertTrue(load_time < 1.0, 'load took %.3f seconds' % load_time)
+        self.assertTrue(lookup_time < 1.0,
+                '%d lookups took %.3f seconds' % (2 * self.ENTRIES, lookup_time))
+        self.assertTrue(list_time < 1.0,
+                '100 list() took %.3f seconds' % list_time)
+
 if __name__ == '__main__':
     unittest.main()
 
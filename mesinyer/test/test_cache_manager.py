@@ -2,6 +2,8 @@ import unittest
 
 import os
 import sys
+import shutil
+import tempfile
 import cStringIO
 sys.path.append(os.path.abspath('.'))
 
@@ -10,7 +12,11 @@ import testutils
 
 class TestCreate(unittest.TestCase):
     def setUp(self):
-        self.cache = cache.CacheManager('tmp')
+        self.path = tempfile.mkdtemp()
+        self.cache = cache.CacheManager(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
 
     def test_get_avatar_cache(self):
         # once to create the instance
@@ -28,6 +34,45 @@ class TestCreate(unittest.TestCase):
         emoticon_cache_1 = self.cache.get_emoticon_cache('some@user.com')
         self.assertTrue(emoticon_cache is emoticon_cache_1)
 
+    def test_dedup(self):
+        data = testutils.random_binary_data(4096)
+        first = self.cache.get_avatar_cache('first@user.com')
+        second = self.cache.get_avatar_cache('second@user.com')
+        stamp, hash_ = first.insert_raw(cStringIO.StringIO(data))
+        second.insert_raw(cStringIO.StringIO(data))
+        stats = self.cache.stats()
+        self.assertEqual(stats['files'], 1)
+        self.assertEqual(stats['bytes'], 4096)
+        self.assertEqual(stats['linked'], 1)
+        self.assertEqual(os.stat(os.path.join(first.path, hash_)).st_ino,
+                os.stat(os.path.join(second.path, hash_)).st_ino)
+
+    def test_evict(self):
+        manager = cache.CacheManager(self.path, max_files=3)
+        avatars = manager.get_avatar_cache('evict@user.com')
+        hashes = [avatars.insert_raw(cStringIO.StringIO('evict %d' % num))[1]
+                for num in xrange(3)]
+        # the first one is used so the second one is the least recently used
+        self.assertTrue(hashes[0] in avatars)
+        avatars.insert_raw(cStringIO.StringIO('evict 3'))
+        stats = manager.stats()
+        self.assertTrue(stats['files'] <= 3, str(stats))
+        self.assertTrue(stats['evictions'] > 0, str(stats))
+        self.assertTrue(hashes[0] in avatars, 'the used file was evicted')
+        self.assertTrue(hashes[1] not in avatars, 'the lru file was not evicted')
+        self.assertTrue(not os.path.exists(os.path.join(avatars.path, hashes[1])))
+
+    def test_stats(self):
+        emoticons = self.cache.get_emoticon_cache('stats@user.com')
+        emoticon, hash_ = emoticons.insert_raw((':)',
+            cStringIO.StringIO('stats')))
+        self.assertTrue(hash_ in emoticons)
+        self.assertFalse('nothere' in emoticons)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
 if __name__ == '__main__':
     unittest.main()
 
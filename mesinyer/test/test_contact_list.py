@@ -0,0 +1,104 @@
+import unittest
+
+import os
+import sys
+sys.path.append(os.path.abspath('.'))
+
+import e3
+from e3.base.Worker import EVENTS
+from gui import gtkui
+from gui.gtkui import ContactList
+
+class Session(object):
+    def __init__(self):
+        self.contacts = e3.ContactManager('me@emesene.org')
+        self.groups = {}
+        self.config = e3.common.Config()
+        self.signals = e3.common.Signals(EVENTS, e3.common.Mailbox())
+
+class TestRowIndex(unittest.TestCase):
+    def setUp(self):
+        gtkui.setup()
+        self.session = Session()
+
+        for num in xrange(3):
+            group = e3.Group('group %d' % num, str(num))
+            self.session.groups[group.identifier] = group
+
+        for num in xrange(12):
+            contact = e3.Contact('contact%d@emesene.org' % num, str(num),
+                'contact %d' % num)
+            self.session.contacts.contacts[contact.account] = contact
+
+            # the last ones are on no group, the first ones on two
+            if num < 9:
+                for identifier in set([str(num % 3), str(num % 2)]):
+                    group = self.session.groups[identifier]
+                    group.contacts.append(contact.account)
+                    contact.groups.append(identifier)
+
+        self.contact_list = ContactList.ContactList(self.session)
+        self.contact_list.fill()
+
+    def tearDown(self):
+        self.contact_list.destroy()
+
+    def check_index(self):
+        '''check that the index has a valid reference for each row of the
+        model and nothing else'''
+        model = self.contact_list._model
+        groups = {}
+        contacts = {}
+
+        for row in model:
+            if type(row[1]) == e3.Group:
+                groups[row[1].name] = row.path
+
+                for contact_row in row.iterchildren():
+                    contacts.setdefault(contact_row[1].account,
+                        {})[row[1].name] = contact_row.path
+            else:
+                contacts.setdefault(row[1].account, {})[None] = row.path
+
+        self.assertEqual(sorted(self.contact_list._group_rows.keys()),
+            sorted(groups.keys()))
+
+        for (name, reference) in self.contact_list._group_rows.iteritems():
+            self.assertTrue(reference.valid())
+            self.assertEqual(reference.get_path(), groups[name])
+
+        self.assertEqual(sorted(self.contact_list._contact_rows.keys()),
+            sorted(contacts.keys()))
+
+        for (account, rows) in self.contact_list._contact_rows.iteritems():
+            self.assertEqual(sorted(rows.keys()),
+                sorted(contacts[account].keys()))
+
+            for (name, reference) in rows.iteritems():
+                self.assertTrue(reference.valid())
+                self.assertEqual(reference.get_path(), contacts[account][name])
+
+    def test_fill(self):
+        self.check_index()
+
+    def test_remove_and_add_group(self):
+        group = self.session.groups['1']
+        self.contact_list.remove_group(group)
+        self.check_index()
+        self.assertEqual(self.contact_list._get_group_iter(group), None)
+
+        self.contact_list.add_group(group)
+
+        for account in group.contacts:
+            self.contact_list.add_contact(
+                self.session.contacts.contacts[account], group)
+
+        self.check_index()
+
+        contact = self.session.contacts.contacts[group.contacts[0]]
+        contact.status = e3.status.ONLINE
+        self.contact_list.update_contact(contact)
+        self.check_index()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+import os
+import sys
+sys.path.append(os.path.abspath('.'))
+
+import e3
+from e3.base import status
+
+class TestIndexes(unittest.TestCase):
+    def setUp(self):
+        self.manager = e3.ContactManager('me@emesene.org')
+
+        for (account, nick, group) in (('a@emesene.org', 'charlie', 'g1'),
+                ('b@emesene.org', 'alice', 'g1'),
+                ('c@emesene.org', 'bob', None)):
+            contact = e3.Contact(account, nick=nick)
+
+            if group:
+                contact.groups.append(group)
+
+            self.manager.contacts[account] = contact
+
+    def nicks(self, contacts):
+        return [contact.nick for contact in contacts]
+
+    def test_no_group(self):
+        self.assertEqual(self.nicks(self.manager.get_no_group()), ['bob'])
+        self.manager.contacts['a@emesene.org'].groups.remove('g1')
+        self.assertEqual(self.nicks(self.manager.get_no_group()),
+            ['bob', 'charlie'])
+
+    def test_by_status(self):
+        self.manager.contacts['a@emesene.org'].status = status.ONLINE
+        by_status = self.manager.get_sorted_list_by_status()
+        self.assertEqual(self.nicks(by_status[status.ONLINE]), ['charlie'])
+        self.assertEqual(self.nicks(by_status[status.OFFLINE]),
+            ['alice', 'bob'])
+        self.assertEqual(len(self.manager.get_online_list()), 1)
+
+    def test_by_group(self):
+        by_group = self.manager.get_sorted_list_by_group(['g1', 'g2'])
+        self.assertEqual(self.nicks(by_group['g1']), ['alice', 'charlie'])
+        self.assertEqual(by_group['g2'], [])
+
+        contact = e3.Contact('d@emesene.org', nick='aaron')
+        contact.groups = ['g2']
+        self.manager.contacts[contact.account] = contact
+        by_group = self.manager.get_sorted_list_by_group(['g1', 'g2'])
+        self.assertEqual(self.nicks(by_group['g2']), ['aaron'])
+
+    def test_sort_key(self):
+        contact = self.manager.contacts['b@emesene.org']
+        key = contact.sort_key
+        contact.alias = 'zed'
+        self.assertNotEqual(contact.sort_key, key)
+        self.assertEqual(contact.sort_key[1], 'zed')
+
+    def test_rename(self):
+        by_status = self.manager.get_sorted_list_by_status()
+        self.assertEqual(self.nicks(by_status[status.OFFLINE]),
+            ['alice', 'bob', 'charlie'])
+
+        self.manager.contacts['b@emesene.org'].nick = 'zed'
+        by_status = self.manager.get_sorted_list_by_status()
+        self.assertEqual(self.nicks(by_status[status.OFFLINE]),
+            ['bob', 'charlie', 'zed'])
+        by_group = self.manager.get_sorted_list_by_group(['g1'])
+        self.assertEqual(self.nicks(by_group['g1']), ['charlie', 'zed'])
+
+        self.manager.contacts['a@emesene.org'].groups.remove('g1')
+        self.assertEqual(self.nicks(self.manager.get_no_group()),
+            ['bob', 'charlie'])
+        self.manager.contacts['a@emesene.org'].alias = 'aaron'
+        self.assertEqual(self.nicks(self.manager.get_no_group()),
+            ['charlie', 'bob'])
+
+    def test_remove(self):
+        contact = self.manager.contacts['a@emesene.org']
+        del self.manager.contacts['a@emesene.org']
+        by_group = self.manager.get_sorted_list_by_group(['g1'])
+        self.assertEqual(self.nicks(by_group['g1']), ['alice'])
+
+        # a removed contact doesn't change the indexes anymore
+        contact.groups = []
+        self.assertEqual(self.nicks(self.manager.get_no_group()), ['bob'])
+
+        self.manager.contacts['b@emesene.org'] = e3.Contact('b@emesene.org',
+            nick='zed')
+        by_status = self.manager.get_sorted_list_by_status()
+        self.assertEqual(self.nicks(by_status[status.OFFLINE]),
+            ['bob', 'zed'])
+
+    def test_other_manager(self):
+        other = e3.ContactManager('other@emesene.org')
+        contact = e3.Contact('d@emesene.org', nick='dave')
+        other.contacts[contact.account] = contact
+        entries = self.manager._by_status[status.OFFLINE]
+
+        contact.status = status.ONLINE
+        self.assertTrue(self.manager._by_status[status.OFFLINE] is entries)
+        self.assertEqual(self.nicks(other.get_online_list()), ['dave'])
+        self.assertEqual(self.manager.get_online_list(), [])
+
+if __name__ == '__main__':
+    unittest.main()
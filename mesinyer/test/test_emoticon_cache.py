@@ -2,6 +2,8 @@ import unittest
 
 import os
 import sys
+import shutil
+import tempfile
 import cStringIO
 sys.path.append(os.path.abspath('.'))
 
@@ -10,9 +12,13 @@ import testutils
 
 class TestCreate(unittest.TestCase):
     def setUp(self):
-        self.cache = cache.EmoticonCache('tmp', 'user@host.com')
+        self.path = tempfile.mkdtemp()
+        self.cache = cache.EmoticonCache(self.path, 'user@host.com')
         self.image_path = testutils.create_binary_file(self.cache.path)
 
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
     def test_insert(self):
         response = self.cache.insert(('<;)', self.image_path))
         self.assertNotEqual(response, None, 'cache.insert should return a tuple')
@@ -40,6 +46,28 @@ class TestCreate(unittest.TestCase):
         self.assertTrue((emoticon, hash_) not in items,
                 str((emoticon, hash_)) + ' should not be in cache.list(): ' + str(items))
 
+    def test_reload_dash_shortcut(self):
+        image = cStringIO.StringIO(testutils.random_binary_data(4096))
+        emoticon, hash_ = self.cache.insert_raw(('-_-', image))
+        # a new instance reads the index from the info file
+        other = cache.EmoticonCache(self.path, 'user@host.com')
+        items = other.list()
+        self.assertTrue(('-_-', hash_) in items,
+                str(('-_-', hash_)) + ' should be in cache.list(): ' + str(items))
+
+    def test_replace_shortcut(self):
+        manager = cache.CacheManager(self.path)
+        emoticons = manager.get_emoticon_cache('replace@host.com')
+        emoticon, old_hash = emoticons.insert_raw((':P',
+            cStringIO.StringIO('old')))
+        emoticon, new_hash = emoticons.insert_raw((':P',
+            cStringIO.StringIO('new')))
+        self.assertTrue(old_hash not in emoticons, old_hash + ' should not be in cache')
+        self.assertFalse(os.path.exists(os.path.join(emoticons.path, old_hash)))
+        stats = manager.stats()
+        self.assertEqual(stats['files'], 1)
+        self.assertEqual(stats['bytes'], len('new'))
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,589 @@
+import unittest
+
+import os
+import sys
+import time
+import json
+import tempfile
+import sqlite3.dbapi2 as sqlite
+sys.path.append(os.path.abspath('.'))
+
+from e3.base import LogExporter
+from e3.base.Logger import Logger as BaseLogger
+from e3.base.Logger import Account, LoggerProcess
+
+DB_PATH = os.path.join('tmp', 'test_logger.db')
+
+BASELINE_TABLES = (BaseLogger.CREATE_D_TIME, BaseLogger.CREATE_D_INFO,
+    BaseLogger.CREATE_D_EVENT, BaseLogger.CREATE_D_ACCOUNT,
+    BaseLogger.CREATE_GROUP, BaseLogger.CREATE_ACCOUNT_BY_GROUP,
+    BaseLogger.CREATE_FACT_EVENT, BaseLogger.CREATE_LAST_ACCOUNT)
+
+def remove_database():
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+
+def create_baseline():
+    '''create a database with the schema before the migrations and some
+    messages between two accounts'''
+    connection = sqlite.connect(DB_PATH)
+
+    for statement in BASELINE_TABLES:
+        connection.execute(statement)
+
+    for event in BaseLogger.EVENTS:
+        connection.execute(BaseLogger.INSERT_EVENT, (event,))
+
+    id_message = BaseLogger.EVENTS.index('message') + 1
+    connection.execute(BaseLogger.INSERT_ACCOUNT, (u'a@emesene.org', u'1', 1))
+    connection.execute(BaseLogger.INSERT_ACCOUNT, (u'b@emesene.org', u'2', 1))
+    connection.execute(BaseLogger.INSERT_INFO, (1, u'a', u'', u''))
+    connection.execute(BaseLogger.INSERT_INFO, (2, u'b', u'', u''))
+
+    for num in xrange(50):
+        connection.execute(BaseLogger.INSERT_TIME,
+            (2009, 1, 1, 3, 10, num / 60, num % 60))
+        src = num % 2 + 1
+        dest = 2 - num % 2
+        connection.execute(BaseLogger.INSERT_FACT_EVENT, (num + 1, id_message,
+            src, dest, src, dest, 0, u'message %d' % num, 1000.0 + num))
+
+    connection.execute(BaseLogger.INSERT_LAST_ACCOUNT,
+        (1, 1, u'a@emesene.org', 0, u'a', u'', u''))
+    connection.execute(BaseLogger.INSERT_LAST_ACCOUNT,
+        (2, 2, u'b@emesene.org', 0, u'b', u'', u''))
+    connection.commit()
+    connection.close()
+
+def select_all(connection, query):
+    return connection.execute(query).fetchall()
+
+class TestMigration(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        create_baseline()
+
+    def tearDown(self):
+        remove_database()
+
+    def test_rows_survive(self):
+        connection = sqlite.connect(DB_PATH)
+        facts = select_all(connection, '''SELECT id_time, id_event,
+            id_src_info, id_dest_info, id_src_acc, id_dest_acc, status,
+            payload, tmstp FROM fact_event ORDER BY id_time;''')
+        tables = [select_all(connection, 'SELECT * FROM %s;' % (table,))
+            for table in ('d_time', 'd_info', 'd_account', 'd_event',
+                'last_account')]
+        connection.close()
+
+        logger = BaseLogger(DB_PATH)
+        version = logger.connection.execute('PRAGMA user_version;').fetchone()
+        self.assertEqual(version[0], len(BaseLogger.MIGRATIONS))
+        self.assertEqual(select_all(logger.connection, '''SELECT id_time,
+            id_event, id_src_info, id_dest_info, id_src_acc, id_dest_acc,
+            status, payload, tmstp FROM fact_event ORDER BY id_fact;'''),
+            facts)
+        self.assertEqual(select_all(logger.connection,
+            'SELECT COUNT(*) FROM fact_event WHERE id_fact = id_time;'),
+            [(len(facts),)])
+        self.assertEqual([select_all(logger.connection,
+            'SELECT * FROM %s;' % (table,)) for table in ('d_time', 'd_info',
+                'd_account', 'd_event', 'last_account')], tables)
+
+        chats = logger.get_chats('a@emesene.org', 'b@emesene.org', 100)
+        self.assertEqual(len(chats), len(facts))
+        logger.close()
+
+class TestCompact(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        self.logger = BaseLogger(DB_PATH)
+
+    def tearDown(self):
+        self.logger.close()
+        remove_database()
+
+    def facts(self):
+        '''return the facts with the values of their dimensions'''
+        return select_all(self.logger.connection, '''SELECT f.id_fact,
+            f.payload, s.id_account, s.nick, s.message, s.path, d.id_account,
+            d.nick, d.message, d.path, t.year, t.month, t.day, t.hour,
+            t.minute, t.seconds
+            FROM fact_event f, d_info s, d_info d, d_time t
+            WHERE f.id_src_info = s.id_info AND f.id_dest_info = d.id_info AND
+                f.id_time = t.id_time
+            ORDER BY f.id_fact;''')
+
+    def test_merge(self):
+        logger = self.logger
+        infos = ((1, u'a', u'', None), (1, u'a', u'', None), (1, u'a', u'', u''),
+            (1, None, u'', None), (1, None, u'', None), (2, u'b', u'', u''))
+
+        for info in infos:
+            logger.execute(BaseLogger.INSERT_INFO, info)
+
+        for num in xrange(2):
+            logger.execute(BaseLogger.INSERT_TIME, (2009, 1, 1, 3, 10, 0, 0))
+
+        for num in xrange(30):
+            logger.execute(BaseLogger.INSERT_FACT_EVENT, (num % 2 + 1, 5,
+                num % len(infos) + 1, (num + 1) % len(infos) + 1, 1, 2, 0,
+                u'message %d' % num, 1000.0 + num))
+
+        logger.commit()
+        facts = self.facts()
+        self.assertEqual(len(facts), 30)
+
+        logger.compact()
+
+        self.assertEqual(self.facts(), facts)
+        # (1, 'a', '', NULL) and (1, NULL, '', NULL) were duplicated, a NULL
+        # path is not equal to an empty one
+        self.assertEqual(select_all(logger.connection,
+            'SELECT COUNT(*) FROM d_info;'), [(4,)])
+        self.assertEqual(select_all(logger.connection,
+            'SELECT COUNT(*) FROM d_time;'), [(1,)])
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        self.logger = BaseLogger(DB_PATH)
+        self.cache_size = BaseLogger.CACHE_SIZE
+        BaseLogger.CACHE_SIZE = 2
+
+    def tearDown(self):
+        BaseLogger.CACHE_SIZE = self.cache_size
+        self.logger.close()
+        remove_database()
+
+    def test_lru(self):
+        logger = self.logger
+        first = logger.insert_time(2009, 1, 1, 3, 10, 0, 0)
+        logger.insert_time(2009, 1, 1, 3, 10, 0, 1)
+        # use the first one, the second one is the least recently used
+        self.assertEqual(logger.insert_time(2009, 1, 1, 3, 10, 0, 0), first)
+        logger.insert_time(2009, 1, 1, 3, 10, 0, 2)
+
+        self.assertEqual(len(logger.time_cache), 2)
+        self.assertTrue((2009, 1, 1, 10, 0, 0) in logger.time_cache)
+        self.assertFalse((2009, 1, 1, 10, 0, 1) in logger.time_cache)
+
+    def test_lru_many_uses(self):
+        logger = self.logger
+        first = logger.insert_time(2009, 1, 1, 3, 10, 0, 0)
+        logger.insert_time(2009, 1, 1, 3, 10, 0, 1)
+        # use the first one many times so the order of use is rebuilt
+        for num in xrange(100):
+            self.assertEqual(logger.insert_time(2009, 1, 1, 3, 10, 0, 0), first)
+        logger.insert_time(2009, 1, 1, 3, 10, 0, 2)
+
+        self.assertEqual(len(logger.time_cache), 2)
+        self.assertTrue(len(logger.time_cache.order) < 100)
+        self.assertTrue((2009, 1, 1, 10, 0, 0) in logger.time_cache)
+        self.assertFalse((2009, 1, 1, 10, 0, 1) in logger.time_cache)
+
+def fill_chats(logger, count):
+    '''log count messages between two accounts, the timestamps are tied in
+    groups of five'''
+    me = Account(None, None, 'a@emesene.org', 1, 'a', '', '')
+    other = Account(None, None, 'b@emesene.org', 1, 'b', '', '')
+
+    for num in xrange(count):
+        if num % 2:
+            logger.add_event('message', 1, u'message %d' % num, me, other)
+        else:
+            logger.add_event('message', 1, u'message %d' % num, other, me)
+
+    logger.execute('UPDATE fact_event SET tmstp = 1000.0 + id_fact / 5;')
+    logger.commit()
+
+class TestPages(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        self.logger = BaseLogger(DB_PATH)
+        fill_chats(self.logger, 23)
+
+    def tearDown(self):
+        self.logger.close()
+        remove_database()
+
+    def test_tied_timestamps(self):
+        payloads = []
+        before = None
+
+        while True:
+            (rows, before) = self.logger.get_chats_page('a@emesene.org',
+                'b@emesene.org', None, None, before, 4)
+            self.assertTrue(len(rows) <= 4)
+            payloads.extend([row[2] for row in rows])
+
+            if before is None:
+                break
+
+        self.assertEqual(len(payloads), 23)
+        self.assertEqual(sorted(payloads),
+            sorted([u'message %d' % num for num in xrange(23)]))
+
+class TestProcess(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        self.process = LoggerProcess(DB_PATH)
+        self.process.start()
+        self.results = []
+
+    def tearDown(self):
+        self.process.quit()
+        self.process.join()
+        remove_database()
+
+    def test_read_after_write(self):
+        me = Account(None, None, 'a@emesene.org', 1, 'a', '', '')
+        other = Account(None, None, 'b@emesene.org', 1, 'b', '', '')
+        self.process.log('message', 1, u'hello', me, other)
+        self.process.get_chats('a@emesene.org', 'b@emesene.org', 10,
+            self.results.append)
+
+        end = time.time() + 5
+
+        while not self.results and time.time() < end:
+            self.process.check()
+            time.sleep(0.01)
+
+        self.assertEqual(len(self.results), 1)
+        self.assertEqual([row[2] for row in self.results[0]], [u'hello'])
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        logger = BaseLogger(DB_PATH)
+        fill_chats(logger, 23)
+        logger.close()
+
+        self.process = LoggerProcess(DB_PATH)
+        self.process.start()
+        self.pages = []
+
+    def tearDown(self):
+        self.process.quit()
+        self.process.join()
+        remove_database()
+
+    def run_process(self, done, timeout=5):
+        '''handle the results of the process until done returns True or
+        timeout seconds passed, check that only one page is read at a
+        time'''
+        end = time.time() + timeout
+
+        while not done() and time.time() < end:
+            self.assertTrue(self.process.output.qsize() <= 1)
+            self.assertTrue(self.process.reads.qsize() <= 1)
+            self.process.check()
+            time.sleep(0.01)
+
+    def test_stream(self):
+        self.process.stream_chats('a@emesene.org', 'b@emesene.org', None,
+            None, 4, self.pages.append)
+        self.run_process(lambda: self.pages and self.pages[-1][1] is None)
+
+        payloads = [row[2] for (rows, before) in self.pages for row in rows]
+        self.assertEqual(len(self.pages), 6)
+        self.assertEqual(sorted(payloads),
+            sorted([u'message %d' % num for num in xrange(23)]))
+
+    def test_cancel(self):
+        def on_page(page):
+            self.pages.append(page)
+            stream.cancel()
+
+        stream = self.process.stream_chats('a@emesene.org', 'b@emesene.org',
+            None, None, 4, on_page)
+        self.run_process(lambda: False, 0.5)
+
+        self.assertEqual(len(self.pages), 1)
+
+TEXT_HEADER = u'text/plain; charset=UTF-8\r\nX-MMS-IM-Format: FN=Arial\r\n\r\n'
+NUDGE = u'text/x-msnmsgr-datacast\r\n\r\nID: 1\r\n\r\n'
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        self.create_search = BaseLogger.CREATE_SEARCH
+        self.search_batch = BaseLogger.SEARCH_BATCH
+
+    def tearDown(self):
+        BaseLogger.CREATE_SEARCH = self.create_search
+        BaseLogger.SEARCH_BATCH = self.search_batch
+        remove_database()
+
+    def fill(self, logger):
+        me = Account(None, None, 'a@emesene.org', 1, 'a', '', '')
+        other = Account(None, None, 'b@emesene.org', 1, 'b', '', '')
+        logger.add_event('message', 1, TEXT_HEADER + u'hello world', me,
+            other)
+        logger.add_event('message', 1, TEXT_HEADER + u'hello hello again',
+            other, me)
+        logger.add_event('message', 1, TEXT_HEADER + u'goodbye world', me,
+            other)
+        logger.add_event('message', 1, NUDGE, other, me)
+        logger.commit()
+
+    def texts(self, rows):
+        return [LogExporter.get_message_text(row[2]) for row in rows]
+
+    def reopen(self):
+        logger = BaseLogger(DB_PATH)
+        self.fill(logger)
+        logger.close()
+
+        return BaseLogger(DB_PATH)
+
+    def test_ranked(self):
+        logger = self.reopen()
+        self.assertEqual(self.texts(logger.search('a@emesene.org', u'hello',
+            10)), [u'hello hello again', u'hello world'])
+        self.assertEqual(self.texts(logger.search('b@emesene.org',
+            u'WORLD goodbye', 10)), [u'goodbye world'])
+        self.assertEqual(len(logger.search('a@emesene.org', u'hello', 1)), 1)
+        self.assertEqual(logger.search('nobody@emesene.org', u'hello', 10),
+            None)
+        logger.close()
+
+    def test_header(self):
+        logger = self.reopen()
+
+        for query in (u'Arial', u'charset', u'plain', u'datacast'):
+            self.assertEqual(logger.search('a@emesene.org', query, 10), [])
+
+        logger.close()
+
+    def test_operators(self):
+        logger = self.reopen()
+
+        for query in (u'AND OR "', u'x*', u'hello AND', u'"hello',
+                u'world -hello', u'NEAR(hello world)', u'" * ^'):
+            rows = logger.search('a@emesene.org', query, 10)
+            self.assertTrue(isinstance(rows, list), query)
+
+        self.assertEqual(self.texts(logger.search('a@emesene.org',
+            u'hello*', 10)), [u'hello hello again', u'hello world'])
+        logger.close()
+
+    def test_fallback(self):
+        BaseLogger.CREATE_SEARCH = ('CREATE VIRTUAL TABLE search_event '
+            'USING nonexistent(body);',) + self.create_search[1:]
+        logger = self.reopen()
+        self.assertTrue(logger.searchable)
+        self.assertEqual(self.texts(logger.search('a@emesene.org',
+            u'goodbye', 10)), [u'goodbye world'])
+        logger.close()
+
+    def test_no_fts(self):
+        BaseLogger.CREATE_SEARCH = ('CREATE VIRTUAL TABLE search_event '
+            'USING nonexistent(body);',)
+        logger = self.reopen()
+        self.assertFalse(logger.searchable)
+        self.assertEqual(logger.search('a@emesene.org', u'hello', 10), None)
+        logger.close()
+
+    def test_backfill(self):
+        # log the messages on a database without the search index
+        logger = BaseLogger(DB_PATH)
+        logger.execute('DROP TABLE search_event;')
+        logger.execute('DROP TABLE IF EXISTS search_backfill;')
+        logger.searchable = False
+        self.fill(logger)
+        logger.close()
+
+        BaseLogger.SEARCH_BATCH = 2
+        logger = BaseLogger(DB_PATH)
+        self.assertTrue(logger.indexing)
+        self.assertEqual(logger.search('a@emesene.org', u'hello', 10), [])
+
+        calls = 1
+
+        while logger.index_events():
+            calls += 1
+
+        self.assertEqual(calls, 3)
+        self.assertFalse(logger.indexing)
+        self.assertEqual(self.texts(logger.search('a@emesene.org', u'hello',
+            10)), [u'hello hello again', u'hello world'])
+        logger.close()
+
+        # the index is complete, it's not filled again
+        logger = BaseLogger(DB_PATH)
+        self.assertFalse(logger.indexing)
+        self.assertEqual(len(logger.search('a@emesene.org', u'world', 10)),
+            2)
+        logger.close()
+
+    def test_process(self):
+        self.reopen().close()
+        process = LoggerProcess(DB_PATH)
+        process.start()
+        results = []
+
+        try:
+            process.search('a@emesene.org', u'world', 10, results.append)
+            end = time.time() + 5
+
+            while not results and time.time() < end:
+                process.check()
+                time.sleep(0.01)
+        finally:
+            process.quit()
+            process.join()
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(sorted(self.texts(results[0])),
+            [u'goodbye world', u'hello world'])
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        if not os.path.exists('tmp'):
+            os.mkdir('tmp')
+
+        remove_database()
+        self.logger = BaseLogger(DB_PATH)
+        me = Account(None, None, 'a@emesene.org', 1, u'<a>', '', '')
+        other = Account(None, None, 'b@emesene.org', 1, u'b, "bee"', '', '')
+        third = Account(None, None, 'c@emesene.org', 1, u'c', '', '')
+        self.logger.add_event('message', 1, TEXT_HEADER + u'hi & <bye>', me,
+            other)
+        self.logger.add_event('message', 1,
+            TEXT_HEADER + u'one, "two"\r\nthree', other, me)
+        self.logger.add_event('message', 1, NUDGE, other, me)
+        self.logger.add_event('message', 1, TEXT_HEADER + u'not for b', me,
+            third)
+        self.logger.execute('UPDATE fact_event SET tmstp = 86400 + id_fact;')
+        self.logger.commit()
+
+        (handle, self.path) = tempfile.mkstemp()
+        os.close(handle)
+        self.progress_rows = LogExporter.PROGRESS_ROWS
+
+    def tearDown(self):
+        LogExporter.PROGRESS_ROWS = self.progress_rows
+        self.logger.close()
+        os.remove(self.path)
+        remove_database()
+
+    def export(self, format_, src='a@emesene.org', dest='b@emesene.org',
+            progress=None):
+        count = self.logger.export_chats(src, dest, None, None, self.path,
+            format_, progress)
+        return (count, file(self.path, 'rb').read().decode('utf-8'))
+
+    def test_txt(self):
+        (count, text) = self.export('txt')
+        self.assertEqual(count, 3)
+        self.assertEqual(text.split(u'\n'), [
+            u'[1970-01-02 00:00:01] <a>: hi & <bye>',
+            u'[1970-01-02 00:00:02] b, "bee": one, "two"\r',
+            u'three',
+            u'[1970-01-02 00:00:03] b, "bee": ' + LogExporter.NUDGE_TEXT,
+            u''])
+
+    def test_html(self):
+        (count, text) = self.export('html')
+        self.assertTrue(text.startswith(LogExporter.HtmlExporter.HEADER))
+        self.assertTrue(text.endswith(LogExporter.HtmlExporter.FOOTER))
+        self.assertTrue(u'<span class="nick">&lt;a&gt;</span>: '
+            u'hi &amp; &lt;bye&gt;</p>' in text, text)
+        self.assertFalse(u'<bye>' in text)
+        self.assertTrue(u'&lt;&lt;nudge&gt;&gt;' in text)
+
+    def test_csv(self):
+        (count, text) = self.export('csv')
+        self.assertEqual(text.split(u'\r\n'), [
+            u'time,from,nick,to,text',
+            u'1970-01-02 00:00:01,a@emesene.org,<a>,b@emesene.org,'
+                u'hi & <bye>',
+            u'1970-01-02 00:00:02,b@emesene.org,"b, ""bee""",a@emesene.org,'
+                u'"one, ""two""',
+            u'three"',
+            u'1970-01-02 00:00:03,b@emesene.org,"b, ""bee""",a@emesene.org,'
+                + LogExporter.NUDGE_TEXT,
+            u''])
+
+    def test_jsonl(self):
+        (count, text) = self.export('jsonl')
+        lines = text.splitlines()
+        self.assertEqual(len(lines), 3)
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(rows[0], {'time': 86401.0, 'from': 'a@emesene.org',
+            'nick': '<a>', 'to': 'b@emesene.org', 'text': 'hi & <bye>'})
+        self.assertEqual(rows[1]['text'], u'one, "two"\r\nthree')
+        self.assertEqual(rows[2]['text'], LogExporter.NUDGE_TEXT)
+
+    def test_all_contacts(self):
+        (count, text) = self.export('jsonl', None, None)
+        rows = [json.loads(line) for line in text.splitlines()]
+        self.assertEqual(count, 4)
+        self.assertEqual([(row['from'], row['to']) for row in rows], [
+            ('a@emesene.org', 'b@emesene.org'),
+            ('b@emesene.org', 'a@emesene.org'),
+            ('b@emesene.org', 'a@emesene.org'),
+            ('a@emesene.org', 'c@emesene.org')])
+
+    def test_unknown_contact(self):
+        (count, text) = self.export('txt', 'a@emesene.org',
+            'nobody@emesene.org')
+        self.assertEqual((count, text), (0, u''))
+
+    def test_progress(self):
+        LogExporter.PROGRESS_ROWS = 2
+        calls = []
+        (count, text) = self.export('csv', None, None,
+            lambda *args: calls.append(args))
+        self.assertEqual(calls, [(2, 4), (4, 4), (4, 4)])
+
+    def test_process(self):
+        self.logger.close()
+        process = LoggerProcess(DB_PATH)
+        process.start()
+        calls = []
+        results = []
+
+        try:
+            process.export_chats('a@emesene.org', 'b@emesene.org', None,
+                None, self.path, 'txt', lambda *args: calls.append(args),
+                results.append)
+            end = time.time() + 5
+
+            while not results and time.time() < end:
+                process.check()
+                time.sleep(0.01)
+        finally:
+            process.quit()
+            process.join()
+            self.logger = BaseLogger(DB_PATH)
+
+        self.assertEqual(results, [3])
+        self.assertEqual(calls, [(3, 3)])
+        self.assertEqual(len(file(self.path).read().splitlines()), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import os
+import sys
+import random
+import hashlib
+sys.path.append(os.path.abspath('.'))
+
+from papyon.msnp2p.transport.TLP import MessageBlob, MessageChunk
+
+CHUNK_SIZE = 1250
+
+def get_chunks(data):
+    '''return the chunks of a blob with data as they are received'''
+    blob = MessageBlob(2, data, session_id=5)
+    chunks = []
+
+    while not blob.is_complete():
+        chunks.append(MessageChunk.parse(str(blob.get_chunk(CHUNK_SIZE))))
+
+    return chunks
+
+def receive(chunks):
+    '''return a blob with chunks appended'''
+    header = chunks[0].header
+    blob = MessageBlob(2, '', header.blob_size, header.session_id,
+        header.blob_id)
+
+    for chunk in chunks:
+        blob.append_chunk(chunk)
+
+    return blob
+
+class TestReceive(unittest.TestCase):
+    def setUp(self):
+        self.data = os.urandom(MessageBlob.SPOOL_SIZE * 3 + 17)
+        self.chunks = get_chunks(self.data)
+
+    def spooled(self, blob):
+        '''return True if the data of blob is on a file'''
+        name = getattr(blob.data, 'name', None)
+        return name is not None and os.path.exists(name)
+
+    def check(self, blob, data):
+        self.assertTrue(blob.is_complete())
+        self.assertEqual(blob.digest, hashlib.sha1(data).digest())
+        self.assertEqual(blob.read_data(), data)
+        # the digest doesn't move the position of the data
+        self.assertEqual(blob.digest, hashlib.sha1(data).digest())
+
+    def test_in_order(self):
+        blob = receive(self.chunks)
+        self.assertTrue(self.spooled(blob))
+        self.assertEqual(blob._digest_size, len(self.data))
+        self.check(blob, self.data)
+
+    def test_out_of_order(self):
+        random.seed(0)
+        random.shuffle(self.chunks)
+        blob = receive(self.chunks)
+        self.assertTrue(self.spooled(blob))
+        self.assertTrue(blob._digest_size < len(self.data))
+        self.check(blob, self.data)
+
+    def test_small(self):
+        data = self.data[:MessageBlob.SPOOL_SIZE]
+        blob = receive(get_chunks(data))
+        self.assertFalse(self.spooled(blob))
+        self.check(blob, data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+import os
+import sys
+import time
+sys.path.append(os.path.abspath('.'))
+
+from papyon.msnp2p.SLP import SLPMessage, SLPRequestMessage, \
+    SLPResponseMessage, SLPSessionRequestBody, SLPSessionCloseBody
+from papyon.msnp2p.constants import SLPRequestMethod
+from papyon.msnp2p.session import P2PSession
+from papyon.msnp2p.session_manager import P2PSessionManager
+from papyon.msnp2p.transport.TLP import MessageBlob
+
+SESSIONS = 1000
+BLOBS = 10000
+PEERS = 10
+
+class SwitchboardManager(object):
+    def register_handler(self, handler_class, *args):
+        pass
+
+class Client(object):
+    def __init__(self):
+        self._switchboard_manager = SwitchboardManager()
+
+class Peer(object):
+    def __init__(self, account):
+        self.account = account
+
+class Session(P2PSession):
+    def __init__(self, session_manager, peer):
+        P2PSession.__init__(self, session_manager, peer)
+        self.blobs = 0
+
+    def _on_blob_received(self, blob):
+        self.blobs += 1
+
+def accept_blob(session):
+    message = SLPResponseMessage(200, to=session.peer.account,
+        frm='me@emesene.org', cseq=1, call_id=session.call_id)
+    message.body = SLPSessionRequestBody(session_id=session.id)
+    return MessageBlob(0, str(message), session_id=0)
+
+def bye_blob(session):
+    message = SLPRequestMessage(SLPRequestMethod.BYE,
+        'MSNMSGR:' + session.peer.account, to=session.peer.account,
+        frm='me@emesene.org', cseq=0, call_id=session.call_id)
+    message.body = SLPSessionCloseBody()
+    return MessageBlob(0, str(message), session_id=0)
+
+def data_blob(session):
+    return MessageBlob(1, 'data', session_id=session.id)
+
+class TestRouting(unittest.TestCase):
+    def setUp(self):
+        self.manager = P2PSessionManager(Client())
+        self.peers = [Peer('peer%d@emesene.org' % num)
+            for num in xrange(PEERS)]
+        self.sessions = [Session(self.manager, self.peers[num % PEERS])
+            for num in xrange(SESSIONS)]
+
+    def test_peek(self):
+        session = self.sessions[0]
+
+        for blob in (accept_blob(session), bye_blob(session)):
+            data = blob.read_data()
+            message = SLPMessage.build(data)
+            self.assertEqual(SLPMessage.peek(data),
+                (message.call_id, message.body.session_id))
+
+    def test_route(self):
+        builders = (data_blob, accept_blob, bye_blob)
+        blobs = [builders[num % 3](self.sessions[num % SESSIONS])
+            for num in xrange(BLOBS)]
+
+        start = time.time()
+
+        for blob in blobs:
+            self.manager._on_blob_received(blob)
+
+        elapsed = time.time() - start
+        sys.stderr.write('routed %d blobs across %d sessions in %.3f '
+            'seconds\n' % (BLOBS, SESSIONS, elapsed))
+
+        for session in self.sessions:
+            self.assertEqual(session.blobs, BLOBS / SESSIONS)
+
+    def test_unregister(self):
+        session = self.sessions[0]
+        self.assertTrue(self.manager._search_session_by_call(session.call_id)
+            is session)
+        self.assertEqual(len(self.manager._search_sessions_by_peer(
+            session.peer)), SESSIONS / PEERS)
+
+        self.manager._unregister_session(session)
+        self.assertEqual(self.manager._search_session_by_call(
+            session.call_id), None)
+        self.assertEqual(self.manager._get_session(session.id), None)
+        self.assertFalse(session in
+            self.manager._search_sessions_by_peer(session.peer))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,227 @@
 '''utility module'''
 import os
 import gtk
+import time
+import Queue
 import pango
+import gobject
+import threading
 
 import e3
 
-pixbufs = {}
+class PixbufCache(object):
+    '''a cache of the pixbufs loaded from files, the least recently used
+    pixbufs are dropped when the pixbufs use more than max_bytes, a pixbuf
+    is loaded again if the file changed (checked at most every
+    CHECK_INTERVAL seconds), get_async decodes and scales the pixbufs on
+    another thread'''
+
+    MAX_BYTES = 16 * 1024 * 1024
+    # when the budget is exceeded pixbufs are dropped until they use less
+    # than this fraction of it
+    LOW_WATER = 0.75
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        '''constructor'''
+        self.max_bytes = max_bytes
+
+        # (path, size, animated) -> [pixbuf, signature of the file, bytes,
+        # last use, last check], the pixbuf is None if it couldn't be
+        # loaded
+        self.items = {}
+        self.bytes = 0
+        self.tick = 0
+
+        # (path, size, animated) -> callbacks waiting for the pixbuf
+        self.pending = {}
+        self.requests = Queue.Queue()
+        self.worker = None
+
+        # counters, see stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path, size=None, animated=False):
+        '''return the pixbuf of the image at path scaled to size if not None,
+        load it if it's not on the cache, return None if it can't be
+        loaded'''
+        key = (os.path.abspath(path), size, animated)
+        item = self.__lookup(key)
+
+        if item is not None:
+            return item[0]
+
+        signature = get_signature(key[0])
+
+        if signature is None:
+            return None
+
+        return self.__add(key, load_pixbuf(*key), signature)
+
+    def get_async(self, path, size, callback, animated=False):
+        '''return the pixbuf of the image at path scaled to size if it's on
+        the cache, otherwise return None, load it on other thread and call
+        callback with it from the main loop'''
+        key = (os.path.abspath(path), size, animated)
+        item = self.__lookup(key)
+
+        if item is not None:
+            return item[0]
+
+        if key in self.pending:
+            self.pending[key].append(callback)
+            return None
+
+        if get_signature(key[0]) is None:
+            return None
+
+        self.pending[key] = [callback]
+        self.requests.put(key)
+
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.__load_requests)
+            self.worker.setDaemon(True)
+            self.worker.start()
+
+        return None
+
+    def __load_requests(self):
+        '''load the requested pixbufs, runs on the worker thread'''
+        while True:
+            key = self.requests.get()
+            signature = get_signature(key[0])
+            pixbuf = load_pixbuf(*key)
+            gobject.idle_add(self.__on_loaded, key, pixbuf, signature)
+
+    def __on_loaded(self, key, pixbuf, signature):
+        '''called on the main loop when a pixbuf was loaded'''
+        if signature is not None:
+            self.__add(key, pixbuf, signature)
+
+        for callback in self.pending.pop(key, ()):
+            callback(pixbuf)
+
+        return False
+
+    def __lookup(self, key):
+        '''return the item of key if it's on the cache and the file didn't
+        change, None otherwise'''
+        item = self.items.get(key, None)
+        now = time.time()
+
+        if item is not None and now - item[4] > self.CHECK_INTERVAL:
+            if get_signature(key[0]) == item[1]:
+                item[4] = now
+            else:
+                self.__remove(key)
+                item = None
+
+        if item is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.tick += 1
+        item[3] = self.tick
+
+        return item
+
+    def __add(self, key, pixbuf, signature):
+        '''add pixbuf to the cache, return it'''
+        if key in self.items:
+            self.__remove(key)
+
+        size = get_pixbuf_size(pixbuf)
+        self.tick += 1
+        self.items[key] = [pixbuf, signature, size, self.tick, time.time()]
+        self.bytes += size
+
+        if self.bytes > self.max_bytes:
+            self.__evict()
+
+        return pixbuf
+
+    def __remove(self, key):
+        '''remove key from the cache'''
+        item = self.items.pop(key)
+        self.bytes -= item[2]
+
+    def __evict(self):
+        '''remove the least recently used pixbufs until they use less than
+        LOW_WATER of the budget'''
+        items = [(item[3], key) for (key, item) in self.items.iteritems()]
+        items.sort()
+
+        for (tick, key) in items:
+            if self.bytes <= self.max_bytes * self.LOW_WATER:
+                break
+
+            self.__remove(key)
+            self.evictions += 1
+
+    def clear(self):
+        '''remove all the pixbufs'''
+        self.items.clear()
+        self.bytes = 0
+
+    def stats(self):
+        '''return a dict with the number of hits and misses, the hit rate,
+        the number and size in bytes of the cached pixbufs and the number of
+        evicted pixbufs'''
+        lookups = self.hits + self.misses
+
+        if lookups:
+            hit_rate = float(self.hits) / lookups
+        else:
+            hit_rate = 0.0
+
+        return {'hits': self.hits, 'misses': self.misses,
+            'hit_rate': hit_rate, 'pixbufs': len(self.items),
+            'bytes': self.bytes, 'evictions': self.evictions}
+
+def get_signature(path):
+    '''return a value that changes when the file at path changes, None if
+    it's not a readable file'''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    if not os.path.isfile(path) or not os.access(path, os.R_OK):
+        return None
+
+    return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+def load_pixbuf(path, size=None, animated=False):
+    '''load the image at path and scale it to size if not None, return None
+    if it can't be loaded'''
+    try:
+        if animated:
+            return gtk.gdk.PixbufAnimation(path)
+
+        pixbuf = gtk.gdk.pixbuf_new_from_file(path)
+    except gobject.GError:
+        return None
+
+    if size is not None:
+        width, height = size
+        pixbuf = pixbuf.scale_simple(width, height, gtk.gdk.INTERP_BILINEAR)
+
+    return pixbuf
+
+def get_pixbuf_size(pixbuf):
+    '''return the number of bytes used by pixbuf'''
+    if pixbuf is None:
+        return 0
+
+    if isinstance(pixbuf, gtk.gdk.PixbufAnimation):
+        return pixbuf.get_width() * pixbuf.get_height() * 4
+
+    return pixbuf.get_rowstride() * pixbuf.get_height()
+
+pixbufs = PixbufCache()
 
 def safe_gtk_image_load(path, size=None):
     '''try to return a gtk image from path, if fails, return a broken image'''
@@ -18,28 +234,7 @@ def safe_gtk_image_load(path, size=None):
 
 def safe_gtk_pixbuf_load(path, size=None, animated=False):
     '''try to return a gtk pixbuf from path, if fails, return None'''
-    path = os.path.abspath(path)
-
-    if animated:
-        creator = gtk.gdk.PixbufAnimation
-    else:
-        creator = gtk.gdk.pixbuf_new_from_file
-
-    if file_readable(path):
-        if (path, size) in pixbufs:
-            return pixbufs[(path, size)]
-        else:
-            pixbuf = creator(path)
-
-            if size is not None:
-                width, height = size
-                pixbuf = pixbuf.scale_simple(width, height,
-                        gtk.gdk.INTERP_BILINEAR)
-
-            pixbufs[(path, size)] = pixbuf
-            return pixbuf
-    else:
-        return None
+    return pixbufs.get(path, size, animated)
 
 def scale_nicely(pixbuf):
     '''scale a pixbuf'''